@@ -0,0 +1,60 @@
+"""
+Compares the load and scan time of the MatrixMarket and binary CSR corpus formats.
+
+Usage:
+    python -m benchmarks.bench_csr [num_docs] [doc_length] [vocab_size]
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+from gensim.corpora import MmCorpus
+
+from src.storage.csr import CsrCorpus, convert_mm
+
+def random_corpus(num_docs, doc_length, vocab_size, seed=42):
+    rng = random.Random(seed)
+    for _ in range(num_docs):
+        ids = sorted(set(rng.randrange(vocab_size) for _ in range(doc_length)))
+        yield [(i, float(rng.randint(1, 5))) for i in ids]
+
+def timeit(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+def scan(corpus):
+    nnz = 0
+    for doc in corpus:
+        nnz += len(doc)
+    return nnz
+
+def lookup(corpus, n=1000):
+    rng = random.Random(7)
+    for _ in range(n):
+        corpus[rng.randrange(len(corpus))]
+
+def main(num_docs=20000, doc_length=100, vocab_size=50000):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        mm_path = os.path.join(tmpdir, "corpus.mm")
+        csr_path = os.path.join(tmpdir, "corpus.csr")
+        MmCorpus.serialize(mm_path, random_corpus(num_docs, doc_length, vocab_size))
+        elapsed, _ = timeit(lambda: convert_mm(mm_path, csr_path))
+        print("corpus: {} docs, converted to csr in {:.3f}s".format(num_docs, elapsed))
+
+        print("{:<8}{:>12}{:>12}{:>16}{:>12}".format("format", "load (s)", "scan (s)", "1k lookups (s)", "to_csr (s)"))
+        for name, cls in [("mm", MmCorpus), ("csr", CsrCorpus)]:
+            path = mm_path if name == "mm" else csr_path
+            load, corpus = timeit(lambda: cls(path))
+            scan_time, _ = timeit(lambda: scan(corpus))
+            lookups, _ = timeit(lambda: lookup(corpus))
+            if name == "csr":
+                handoff, _ = timeit(lambda: corpus.to_csr())
+                handoff = "{:.4f}".format(handoff)
+            else:
+                handoff = "-"
+            print("{:<8}{:>12.4f}{:>12.4f}{:>16.4f}{:>12}".format(name, load, scan_time, lookups, handoff))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
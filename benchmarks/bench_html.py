@@ -0,0 +1,65 @@
+"""
+Compares the throughput of extracting text from HTML documents with the
+BeautifulSoup tree (parse_text) and the single-pass event extractor
+(parse_text_fast), and checks that both return the same text for every document.
+Also times lead extraction (parse_lead) with a token budget, with and without
+boilerplate filtering, and reports the tokens kept. Documents are synthetic news
+articles with navigation, scripts, nested markup and entities around the extracted
+tags, followed by a long comment section.
+
+Usage:
+    python -m benchmarks.bench_html [num_documents] [paragraphs] [max_tokens]
+"""
+import sys
+import time
+import random
+from functools import partial
+
+from src.parser.html import parse_lead, parse_text, parse_text_fast
+
+def random_article(rng, paragraphs=10, words=60, comments=50):
+    vocab = ["word{}".format(i) for i in range(5000)] + ["&amp;", "&#8217;", "<b>bold</b>", "<a href='#'>link</a>"]
+    nav = "".join("<li><a href='/s{0}'>Section {0}</a></li>".format(i) for i in range(15))
+    body = "".join(
+        "<p class='body'>{}</p>".format(" ".join(rng.choices(vocab, k=words))) for _ in range(paragraphs)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>t</title><script>var x = '<p>';</script>"
+        "<style>p {{ color: red; }}</style></head><body><nav><ul>{}</ul></nav>"
+        "<article><h1>Headline</h1><h2>Subtitle</h2><div>{}</div></article>"
+        "<section class='comments'>{}</section>"
+        "<footer><p>Copyright</p><!-- end --></footer></body></html>"
+    ).format(nav, body, "".join(
+        "<li><a href='/u{}'>user</a> <p>{}</p></li>".format(i, " ".join(rng.choices(vocab, k=20))) for i in range(comments)
+    ))
+
+def measure(parse, documents):
+    start = time.perf_counter()
+    texts = [parse(html) for html in documents]
+    return time.perf_counter() - start, texts
+
+def main(num_documents=500, paragraphs=10, max_tokens=200):
+    rng = random.Random(42)
+    documents = [random_article(rng, paragraphs=paragraphs) for _ in range(num_documents)]
+    size = sum(len(html) for html in documents) / 2**20
+    print("{} documents, {:.1f} MB of HTML".format(num_documents, size))
+
+    baseline, expected = measure(parse_text, documents)
+    elapsed, texts = measure(parse_text_fast, documents)
+    assert texts == expected, "parse_text_fast() returned different text"
+    print("{:<18}{:>12}{:>12}{:>10}".format("extractor", "time (s)", "docs/s", "speedup"))
+    print("{:<18}{:>12.3f}{:>12.0f}{:>10.2f}".format("parse_text", baseline, num_documents / baseline, 1.0))
+    print("{:<18}{:>12.3f}{:>12.0f}{:>10.2f}".format("parse_text_fast", elapsed, num_documents / elapsed, baseline / elapsed))
+
+    tokens = sum(len(text.split()) for text in expected)
+    print("\n{:<18}{:>12}{:>12}{:>10}{:>12}".format("lead extraction", "time (s)", "docs/s", "speedup", "tokens kept"))
+    for name, boilerplate in [("budget", False), ("budget+boiler", True)]:
+        parse = partial(parse_lead, max_tokens=max_tokens, boilerplate=boilerplate)
+        elapsed, texts = measure(parse, documents)
+        kept = sum(len(text.split()) for text in texts) / tokens
+        print("{:<18}{:>12.3f}{:>12.0f}{:>10.2f}{:>11.1%}".format(
+            name, elapsed, num_documents / elapsed, baseline / elapsed, kept
+        ))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
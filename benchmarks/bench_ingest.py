@@ -0,0 +1,45 @@
+"""
+Compares the throughput of serial doc2bow ingestion with parallel ingestion across
+an increasing number of worker processes.
+
+Usage:
+    python -m benchmarks.bench_ingest [num_docs] [doc_length] [vocab_size] [max_workers] [chunksize]
+"""
+import os
+import sys
+import time
+import random
+from gensim.corpora import Dictionary
+
+from src.dictionary.parallel import parallel_doc2bow
+
+def random_documents(num_docs, doc_length, vocab_size, seed=42):
+    rng = random.Random(seed)
+    vocab = ["token{}".format(i) for i in range(vocab_size)]
+    # Zipfian token frequencies like natural text
+    weights = [1 / (i + 1) for i in range(vocab_size)]
+    return [rng.choices(vocab, weights=weights, k=doc_length) for _ in range(num_docs)]
+
+def ingest(documents, workers, chunksize):
+    dictionary = Dictionary()
+    start = time.perf_counter()
+    for _ in parallel_doc2bow(dictionary, documents, workers=workers, chunksize=chunksize):
+        pass
+    return time.perf_counter() - start, dictionary
+
+def main(num_docs=50000, doc_length=200, vocab_size=100000, max_workers=None, chunksize=1000):
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    documents = random_documents(num_docs, doc_length, vocab_size)
+    print("corpus: {} docs of {} tokens, chunksize {}".format(num_docs, doc_length, chunksize))
+
+    baseline, expected = ingest(documents, 1, chunksize)
+    print("{:<10}{:>12}{:>14}{:>10}".format("workers", "time (s)", "docs/s", "speedup"))
+    print("{:<10}{:>12.3f}{:>14.0f}{:>10.2f}".format("serial", baseline, num_docs / baseline, 1.0))
+    for workers in range(2, max_workers + 1):
+        elapsed, dictionary = ingest(documents, workers, chunksize)
+        assert dictionary.token2id == expected.token2id and dictionary.dfs == expected.dfs
+        print("{:<10}{:>12.3f}{:>14.0f}{:>10.2f}".format(workers, elapsed, num_docs / elapsed, baseline / elapsed))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
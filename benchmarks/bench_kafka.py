@@ -0,0 +1,102 @@
+"""
+Compares the throughput of reading, parsing and tokenizing HTML messages from a
+multi-partition topic serially with read_batches() and in parallel with
+read_parallel() across an increasing number of workers. Messages are served by an
+in-process fake consumer so that no broker is required.
+
+Usage:
+    python -m benchmarks.bench_kafka [num_messages] [num_partitions] [max_workers] [max_records]
+"""
+import os
+import sys
+import time
+import random
+from collections import defaultdict, namedtuple
+from bs4 import BeautifulSoup
+from kafka.structs import TopicPartition
+
+from src.parser.html import TAGS
+from src.reader.kafka import TopicReader
+
+Message = namedtuple("Message", ["topic", "partition", "offset", "value"])
+
+class FakeConsumer():
+    """
+    In-process stand-in for KafkaConsumer serving messages from partition logs.
+    """
+    def __init__(self, topic, logs):
+        self.topic = topic
+        self.logs = logs
+        self.positions = defaultdict(int)
+
+    def subscribe(self, topics, listener=None):
+        pass
+
+    def poll(self, timeout_ms=0, max_records=None):
+        records = {}
+        remaining = max_records
+        for p, log in self.logs.items():
+            messages = log[self.positions[p]:self.positions[p] + remaining]
+            if len(messages) > 0:
+                records[TopicPartition(self.topic, p)] = messages
+                self.positions[p] += len(messages)
+                remaining -= len(messages)
+            if remaining == 0:
+                break
+        return records
+
+    def commit(self, offsets):
+        pass
+
+def random_article(rng, paragraphs=10, words=80):
+    vocab = ["word{}".format(i) for i in range(5000)]
+    body = "".join("<p>{}</p>".format(" ".join(rng.choices(vocab, k=words))) for _ in range(paragraphs))
+    return "<html><head><title>t</title></head><body><h1>headline</h1><div>{}</div></body></html>".format(body)
+
+def parse_and_tokenize(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    return " ".join(tag.text.strip() for tag in soup.find_all(TAGS)).lower().split()
+
+def make_logs(topic, num_messages, num_partitions):
+    rng = random.Random(42)
+    logs = defaultdict(list)
+    for i in range(num_messages):
+        p = i % num_partitions
+        logs[p].append(Message(topic, p, len(logs[p]), random_article(rng)))
+    return logs
+
+def run_serial(logs, max_records):
+    reader = TopicReader("localhost:9092", "bench", auto_commit=False, consumer=FakeConsumer("bench", logs))
+    count = 0
+    for batch in reader.read_batches(max_records=max_records, stop_when_idle=True):
+        count += len([parse_and_tokenize(html) for html in batch])
+        reader.commit()
+    return count
+
+def run_parallel(logs, workers, max_records):
+    reader = TopicReader("localhost:9092", "bench", auto_commit=False, consumer=FakeConsumer("bench", logs))
+    count = 0
+    for batch in reader.read_parallel(parse_and_tokenize, workers=workers, max_records=max_records, stop_when_idle=True):
+        count += len(batch)
+        reader.commit()
+    return count
+
+def main(num_messages=2000, num_partitions=8, max_workers=None, max_records=50):
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    logs = make_logs("bench", num_messages, num_partitions)
+    print("topic: {} messages in {} partitions, {} records per poll".format(num_messages, num_partitions, max_records))
+
+    start = time.perf_counter()
+    assert run_serial(logs, max_records) == num_messages
+    baseline = time.perf_counter() - start
+    print("{:<10}{:>12}{:>14}{:>10}".format("workers", "time (s)", "msgs/s", "speedup"))
+    print("{:<10}{:>12.3f}{:>14.0f}{:>10.2f}".format("serial", baseline, num_messages / baseline, 1.0))
+    for workers in range(1, max_workers + 1):
+        start = time.perf_counter()
+        assert run_parallel(logs, workers, max_records) == num_messages
+        elapsed = time.perf_counter() - start
+        print("{:<10}{:>12.3f}{:>14.0f}{:>10.2f}".format(workers, elapsed, num_messages / elapsed, baseline / elapsed))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
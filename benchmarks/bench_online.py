@@ -0,0 +1,57 @@
+"""
+Compares the latency of updating a SklearnEngine with a batch of new documents by
+searching the topic range again on the batch (the default) and by advancing every
+candidate model with partial_fit() (online=True).
+
+Usage:
+    python -m benchmarks.bench_online [num_docs] [doc_length] [vocab_size] [min_topics] [max_topics] [batch_size]
+"""
+import sys
+import time
+import random
+import contextlib
+from io import StringIO
+from sklearn.feature_extraction.text import CountVectorizer
+
+from src.analyzer.engines.sklearn import SklearnEngine
+
+def random_texts(num_docs, doc_length, vocab_size, seed=42):
+    rng = random.Random(seed)
+    vocab = ["token{}".format(i) for i in range(vocab_size)]
+    # Zipfian token frequencies like natural text
+    weights = [1 / (i + 1) for i in range(vocab_size)]
+    return [" ".join(rng.choices(vocab, weights=weights, k=doc_length)) for _ in range(num_docs)]
+
+def update_latencies(engine, corpus, batches):
+    # The engines print their progress, which is not part of the comparison.
+    with contextlib.redirect_stdout(StringIO()):
+        engine.fit(corpus)
+        latencies = []
+        for batch in batches:
+            start = time.perf_counter()
+            engine.update(batch)
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+def main(num_docs=2000, doc_length=100, vocab_size=2000, min_topics=5, max_topics=10, batch_size=100):
+    texts = random_texts(num_docs, doc_length, vocab_size)
+    vectorizer = CountVectorizer()
+    matrix = vectorizer.fit_transform(texts)
+    split = num_docs // 2
+    corpus = matrix[:split]
+    batches = [matrix[start:start + batch_size] for start in range(split, num_docs, batch_size)]
+
+    print("\ncorpus: {} docs of {} tokens, {} to {} topics, {} batches of {} docs".format(
+        split, doc_length, min_topics, max_topics, len(batches), batch_size
+    ))
+    print("{:<10}{:>16}{:>16}".format("update", "mean (ms)", "max (ms)"))
+    for online in [False, True]:
+        engine = SklearnEngine(vectorizer=vectorizer, min_topics=min_topics, max_topics=max_topics, online=online,
+                               max_iter=5, random_state=1)
+        latencies = update_latencies(engine, corpus, batches)
+        print("{:<10}{:>16.1f}{:>16.1f}".format(
+            "online" if online else "search", 1000 * sum(latencies) / len(latencies), 1000 * max(latencies)
+        ))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,52 @@
+"""
+Compares the time of fitting a topic-count sweep of LDA models with the serial loop
+and with the parallel sweep across an increasing number of worker processes, and
+checks that every sweep finds the same topics.
+
+Usage:
+    python -m benchmarks.bench_sweep [num_docs] [doc_length] [vocab_size] [min_topics] [max_topics] [max_workers]
+"""
+import os
+import sys
+import time
+import random
+from gensim.corpora import Dictionary
+
+from src.analyzer.engines.gensim import GensimEngine
+
+def random_documents(num_docs, doc_length, vocab_size, seed=42):
+    rng = random.Random(seed)
+    vocab = ["token{}".format(i) for i in range(vocab_size)]
+    # Zipfian token frequencies like natural text
+    weights = [1 / (i + 1) for i in range(vocab_size)]
+    return [rng.choices(vocab, weights=weights, k=doc_length) for _ in range(num_docs)]
+
+def sweep(dictionary, corpus, min_topics, max_topics, workers):
+    engine = GensimEngine(dictionary=dictionary, min_topics=min_topics, max_topics=max_topics, workers=workers,
+                          max_cores=workers, random_state=1)
+    start = time.perf_counter()
+    engine.fit(corpus)
+    return time.perf_counter() - start, engine.topics()
+
+def main(num_docs=5000, doc_length=100, vocab_size=5000, min_topics=5, max_topics=20, max_workers=None):
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    documents = random_documents(num_docs, doc_length, vocab_size)
+    dictionary = Dictionary(documents)
+    corpus = [dictionary.doc2bow(doc) for doc in documents]
+
+    results = [("serial",) + sweep(dictionary, corpus, min_topics, max_topics, 1)]
+    for workers in range(2, max_workers + 1):
+        results.append((workers,) + sweep(dictionary, corpus, min_topics, max_topics, workers))
+
+    print("\ncorpus: {} docs of {} tokens, {} to {} topics, {} cpus".format(
+        num_docs, doc_length, min_topics, max_topics, os.cpu_count()
+    ))
+    print("{:<10}{:>12}{:>10}".format("workers", "time (s)", "speedup"))
+    baseline, expected = results[0][1], results[0][2]
+    for workers, elapsed, topics in results:
+        assert topics == expected, "sweeps disagree"
+        print("{:<10}{:>12.3f}{:>10.2f}".format(workers, elapsed, baseline / elapsed))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,69 @@
+"""
+Compares the throughput of tokenizing parsed texts with an ad hoc per-token Python
+loop (regex split, lowercasing, stopword and length filters and lemmatization of
+every token) and with the Tokenizer, whose compiled regex and LRU cache normalize
+each distinct token once, and checks that both return the same tokens. Texts are
+drawn from a Zipfian vocabulary like natural language, and the lemmatizer is a
+suffix stripper standing in for a dictionary or model lookup.
+
+Usage:
+    python -m benchmarks.bench_tokenize [num_documents] [words] [vocab_size]
+"""
+import re
+import sys
+import time
+import random
+
+from src.parser.tokenizer import Tokenizer, MIN_LENGTH, MAX_LENGTH, STOPWORDS
+
+SUFFIXES = ["ing", "ed", "es", "s", "ly"]
+
+def lemmatize(token):
+    for suffix in SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+def adhoc_tokenize(text, lemmatize=None):
+    tokens = []
+    for token in re.split(r"[^\w'\-]+", text):
+        token = token.strip("'-").lower()
+        if len(token) < MIN_LENGTH or len(token) > MAX_LENGTH or token in STOPWORDS:
+            continue
+        if lemmatize is not None:
+            token = lemmatize(token)
+        tokens.append(token)
+    return tokens
+
+def random_texts(rng, num_documents, words, vocab_size):
+    vocab = ["Word{}ing".format(i) if i % 3 == 0 else "word{}".format(i) for i in range(vocab_size)]
+    vocab += sorted(STOPWORDS)
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    rng.shuffle(weights)
+    return [
+        " ".join(token + rng.choice(["", "", ",", "."]) for token in rng.choices(vocab, weights=weights, k=words))
+        for _ in range(num_documents)
+    ]
+
+def measure(tokenize, texts):
+    start = time.perf_counter()
+    documents = [tokenize(text) for text in texts]
+    return time.perf_counter() - start, documents
+
+def main(num_documents=5000, words=300, vocab_size=20000):
+    rng = random.Random(42)
+    texts = random_texts(rng, num_documents, words, vocab_size)
+    print("{} documents, {} tokens".format(num_documents, num_documents * words))
+    print("{:<22}{:>12}{:>12}{:>10}".format("tokenizer", "time (s)", "docs/s", "speedup"))
+    for name, lemma in [("", None), (" +lemma", lemmatize)]:
+        baseline, expected = measure(lambda text: adhoc_tokenize(text, lemma), texts)
+        tokenizer = Tokenizer(lemmatize=lemma)
+        elapsed, documents = measure(tokenizer.tokenize, texts)
+        assert documents == expected, "tokenizers disagree"
+        print("{:<22}{:>12.3f}{:>12.0f}{:>10.2f}".format("ad hoc" + name, baseline, num_documents / baseline, 1.0))
+        print("{:<22}{:>12.3f}{:>12.0f}{:>10.2f}".format("Tokenizer" + name, elapsed, num_documents / elapsed, baseline / elapsed))
+    info = tokenizer.cache_info()
+    print("cache hit rate: {:.1%}".format(info.hits / (info.hits + info.misses)))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
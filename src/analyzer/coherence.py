@@ -0,0 +1,119 @@
+import numpy as np
+from gensim import matutils
+from scipy.sparse import csr_matrix
+
+# The smoothing constant and number of top words per topic used by gensim's
+# CoherenceModel for u_mass coherence.
+EPSILON = 1e-12
+TOPN = 20
+
+def top_words(model, topn=TOPN):
+    """
+    Return the ids of the topn most probable words of each topic of the model, in the
+    same way as CoherenceModel.
+    """
+    return [matutils.argsort(topic, topn=topn, reverse=True) for topic in model.get_topics()]
+
+class CooccurrenceAccumulator():
+    """
+    CooccurrenceAccumulator incrementally counts the number of documents that contain
+    each tracked word and each pair of tracked words, so that the u_mass coherence of
+    any number of models can be computed from the counts instead of scanning the
+    whole corpus for each model as CoherenceModel does.
+
+    The tracked words are the top words of the models being scored. New documents are
+    counted with update(), which only scans the new documents; when the top words of
+    the models change, track() counts the new words with one scan of the corpus.
+    Documents that leave a bounded evaluation corpus are uncounted with remove().
+    Counts are kept in a dense matrix over the tracked words (its diagonal holds the
+    document counts), so memory is quadratic in the number of words tracked; words
+    that are no longer needed can be dropped with retain().
+    """
+    def __init__(self):
+        self.num_docs = 0
+        self.index = {}
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+
+    def _occurrences(self, documents):
+        """
+        Return a binary documents x tracked words csr_matrix of the tracked words that
+        each BoW document contains.
+        """
+        indptr = [0]
+        indices = []
+        for doc in documents:
+            indices.extend(sorted({self.index[id] for id, _ in doc if id in self.index}))
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.int64)
+        return csr_matrix((data, indices, indptr), shape=(len(indptr) - 1, len(self.index)))
+
+    def update(self, documents):
+        """
+        Count the tracked words and pairs of tracked words in a batch of new BoW
+        documents.
+        """
+        occurrences = self._occurrences(documents)
+        self.counts += (occurrences.T @ occurrences).toarray()
+        self.num_docs += occurrences.shape[0]
+
+    def remove(self, documents):
+        """
+        Uncount a batch of documents that were previously counted with update().
+        """
+        occurrences = self._occurrences(documents)
+        self.counts -= (occurrences.T @ occurrences).toarray()
+        self.num_docs -= occurrences.shape[0]
+
+    def retain(self, words):
+        """
+        Stop tracking every word that is not in the given word ids.
+        """
+        words = set(int(id) for id in words)
+        kept = [id for id in self.index if id in words]
+        rows = [self.index[id] for id in kept]
+        self.counts = self.counts[np.ix_(rows, rows)]
+        self.index = {id: i for i, id in enumerate(kept)}
+
+    def track(self, words, corpus):
+        """
+        Start tracking the given word ids. Words that are not tracked yet are counted
+        in the corpus, which must contain exactly the documents counted by update().
+        """
+        new = [id for id in dict.fromkeys(int(id) for id in words) if id not in self.index]
+        if len(new) == 0:
+            return
+        num_tracked = len(self.index)
+        for id in new:
+            self.index[id] = len(self.index)
+        occurrences = self._occurrences(corpus)
+        if occurrences.shape[0] != self.num_docs:
+            raise ValueError("corpus must contain the documents counted by the accumulator.")
+        cross = (occurrences[:, num_tracked:].T @ occurrences).toarray()
+        counts = np.zeros((len(self.index), len(self.index)), dtype=np.int64)
+        counts[:num_tracked, :num_tracked] = self.counts
+        counts[num_tracked:, :] = cross
+        counts[:, num_tracked:] = cross.T
+        self.counts = counts
+
+    def u_mass(self, topics):
+        """
+        Return the u_mass coherence of the topics (lists of tracked word ids ordered by
+        probability), which is the same as the coherence computed by CoherenceModel
+        on the counted documents.
+        """
+        coherences = []
+        for topic in topics:
+            rows = np.array([self.index[int(id)] for id in topic], dtype=np.int64)
+            # Each word is compared with every more probable word (s_one_pre).
+            prime, star = np.tril_indices(len(rows), k=-1)
+            prime, star = rows[prime], rows[star]
+            star_counts = self.counts[star, star]
+            co_counts = self.counts[prime, star]
+            sims = np.zeros(len(star), dtype=np.float64)
+            if self.num_docs > 0:
+                found = star_counts > 0
+                sims[found] = np.log(
+                    (co_counts[found] / self.num_docs + EPSILON) / (star_counts[found] / self.num_docs)
+                )
+            coherences.append(np.mean(sims))
+        return np.mean(coherences)
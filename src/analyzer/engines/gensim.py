@@ -1,30 +1,142 @@
+from src.analyzer.coherence import CooccurrenceAccumulator, top_words
 from src.analyzer.engines.engine import ModelingEngine
+from src.analyzer.evaluation import SAMPLINGS, evaluation_corpus
+from src.analyzer.search import SEARCHES, successive_halving
+from src.corpus import OnlineTextCorpus
+from src.storage.csr import CsrCorpus
 
+import os
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from gensim.models.coherencemodel import CoherenceModel
 from gensim.models.ldamodel import LdaModel
 from gensim.models.tfidfmodel import TfidfModel
 from gensim.models import Nmf
+from gensim.matutils import Sparse2Corpus
+from scipy.sparse import issparse
+from itertools import chain, islice
+from threadpoolctl import threadpool_limits
+
+class _CorpusSlice():
+    """
+    A re-iterable view of the documents in [start, end) of a corpus, which may be
+    iterated more than once (e.g., for several passes).
+    """
+    def __init__(self, corpus, start, end):
+        self.corpus = corpus
+        self.start = start
+        self.end = end
+
+    def __iter__(self):
+        return islice(self.corpus, self.start, self.end)
+
+    def __len__(self):
+        return self.end - self.start
+
+def fit_model(model_class, corpus, dictionary, num_topics, **kwargs):
+    """
+    Fit a model with the given number of topics on the corpus and return it with its
+    evaluation results.
+    """
+    model = model_class(corpus=corpus, id2word=dictionary, num_topics=num_topics, **kwargs)
+    cm = CoherenceModel(model=model, corpus=corpus, dictionary=dictionary, coherence='u_mass')
+    results = {}
+    results['coherence'] = cm.get_coherence()
+    return model, results
+
+# The memory mapped corpus and dictionary of a sweep worker process, opened once by
+# _init_sweep_worker() rather than sent with each candidate.
+_sweep = {}
+
+def _init_sweep_worker(path, dictionary, threads):
+    _sweep["corpus"] = CsrCorpus(path)
+    _sweep["dictionary"] = dictionary
+    _sweep["threads"] = threads
+
+def _fit_candidate(model_class, num_topics, kwargs):
+    """
+    Fit a candidate model of a sweep in a worker process, limiting the threads used by
+    numpy so that the sweep stays within its core budget.
+    """
+    with threadpool_limits(limits=_sweep["threads"]):
+        return fit_model(model_class, _sweep["corpus"], _sweep["dictionary"], num_topics, **kwargs)
 
 class GensimEngine(ModelingEngine):
     """
     GensimEngine implements the methods for fitting and evaluating gensim models on a
     corpus.
+
+    The candidate models of the topic range are independent, so if workers > 1 they
+    are fitted in a pool of worker processes. The corpus is serialized once to a
+    memory mapped CsrCorpus that every worker opens, rather than being pickled for
+    each candidate, and the largest candidates are started first since they take the
+    longest. max_cores (default: the number of CPUs) caps the total cores used by the
+    sweep: at most max_cores workers are started, and the numpy threads of each are
+    limited to their share of the cores.
+
+    If search is "halving" then the topic range is searched with successive halving
+    instead: every candidate is trained on a small leading sample of the corpus and
+    only the best 1/halving_factor by u_mass coherence keep training (models are updated with
+    the following documents), until the best candidate has been trained on the whole
+    corpus. Only that model is kept, and the scores of every rung are recorded in
+    search_. The halving search runs in this process.
+
+    The corpus may be streamed from disk (e.g., an MmCorpus or OnlineTextCorpus) and
+    is never copied into memory. The coherence of updated models is evaluated on
+    every document seen, so the documents passed to update() are kept in memory,
+    unless eval_size is set: then it is evaluated on a fixed size corpus of the
+    eval_size most recent documents (eval_sampling="window") or a uniform sample of
+    every document seen (eval_sampling="reservoir"), so that memory stays flat however
+    many batches are processed.
+
+    update() converts new documents with the dictionary and, if update_dictionary is
+    True, adds their tokens and statistics to it. By default (None) the dictionary is
+    only updated if the engine was not fitted on an OnlineTextCorpus: a live corpus
+    that is also fed the new documents (e.g., by the corpus stage of an ingest
+    pipeline) counts them in the dictionary it shares with the engine itself, so
+    updating it again would count every document twice.
     """
-    def __init__(self, engine="lda", dictionary=None, min_topics=5, max_topics=10, **kwargs):
-        if self.engine not in ["lda", "nmf"]:
+    def __init__(self, engine="lda", dictionary=None, min_topics=5, max_topics=10, workers=1, max_cores=None,
+                 search="grid", halving_factor=3, eval_size=None, eval_sampling="window", eval_seed=None, update_dictionary=None, **kwargs):
+        if engine not in ["lda", "nmf"]:
             raise ValueError("engine must be either 'lda' or 'nmf'.")
+        if workers < 1 or (max_cores is not None and max_cores < 1):
+            raise ValueError("workers and max_cores must be at least 1.")
+        if search not in SEARCHES:
+            raise ValueError("search must be one of: " + ", ".join(SEARCHES))
+        if halving_factor < 2:
+            raise ValueError("halving_factor must be at least 2.")
+        if eval_size is not None and eval_size < 1:
+            raise ValueError("eval_size must be at least 1.")
+        if eval_sampling not in SAMPLINGS:
+            raise ValueError("eval_sampling must be one of: " + ", ".join(SAMPLINGS))
         self.engine = engine
         self.dictionary = dictionary
         self.engine_opts = kwargs
         self.min_topics = min_topics
         self.max_topics = max_topics
+        self.workers = workers
+        self.max_cores = max_cores
+        self.search = search
+        self.halving_factor = halving_factor
+        self.eval_size = eval_size
+        self.eval_sampling = eval_sampling
+        self.eval_seed = eval_seed
+        self.update_dictionary = update_dictionary
         self.models_ = {}
+        self.search_ = None
         self.corpus_ = None
+        self.cooccurrence_ = None
 
     def fit(self, corpus):
         """
-        Fits a set of models on the provided corpus.
+        Fits a set of models on the provided corpus. The corpus may be a stream of BoW
+        documents, a corpus streamed from disk (e.g., an OnlineTextCorpus) or a
+        documents x terms scipy.sparse matrix (e.g., from OnlineTextCorpus.to_csr()).
         """
+        if issparse(corpus):
+            corpus = Sparse2Corpus(corpus, documents_columns=False)
         if self.engine == "lda":
             self._fit_models(LdaModel, corpus, **self.engine_opts)
         elif self.engine == "nmf":
@@ -32,33 +144,113 @@ class GensimEngine(ModelingEngine):
             self._fit_models(Nmf, tfidf[corpus], **self.engine_opts)
         else:
             raise ValueError("engine must be either lda or nmf.")
-        self.corpus_ = corpus
+        self.corpus_ = evaluation_corpus(corpus, self.eval_size, self.eval_sampling, seed=self.eval_seed)
+        self.cooccurrence_ = None
+        self.update_dictionary_ = self.update_dictionary
+        if self.update_dictionary_ is None:
+            self.update_dictionary_ = not isinstance(corpus, OnlineTextCorpus)
 
     def _fit_models(self, model_class, corpus, **kwargs):
         """
         Fits several models with different numbers of topics on the given corpus.
         """
-        for num_topics in range(self.min_topics, self.max_topics + 1):
+        topic_range = range(self.min_topics, self.max_topics + 1)
+        if self.search == "halving":
+            self._halving_models(model_class, corpus, topic_range, **kwargs)
+            return
+        max_cores = self.max_cores or os.cpu_count() or 1
+        workers = min(self.workers, max_cores, len(topic_range))
+        if workers > 1:
+            self._sweep_models(model_class, corpus, topic_range, workers, max_cores, **kwargs)
+            return
+        for num_topics in topic_range:
             print("fitting {} model with {} topics".format(model_class.__name__, num_topics))
-            model = model_class(corpus=corpus, id2word=self.dictionary, num_topics=num_topics, **kwargs)
-            cm = CoherenceModel(model=model, corpus=corpus, dictionary=self.dictionary, coherence='u_mass')
-            results = {}
-            results['coherence'] = cm.get_coherence()
+            model, results = fit_model(model_class, corpus, self.dictionary, num_topics, **kwargs)
             print("coherence: {}".format(results['coherence']))
-            self.models_[num_topics] = {}
-            self.models_[num_topics]['model'] = model
-            self.models_[num_topics]['results'] = results
+            self._add_model(num_topics, model, results)
+
+    def _sweep_models(self, model_class, corpus, topic_range, workers, max_cores, **kwargs):
+        """
+        Fits the models of the topic range in a pool of worker processes that share a
+        memory mapped copy of the corpus.
+        """
+        print("fitting {} models with {} to {} topics in {} processes".format(
+            model_class.__name__, topic_range[0], topic_range[-1], workers
+        ))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "corpus.csr")
+            CsrCorpus.serialize(path, corpus, dtype=np.float64)
+            initargs = (path, self.dictionary, max(1, max_cores // workers))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker, initargs=initargs) as pool:
+                futures = {
+                    num_topics: pool.submit(_fit_candidate, model_class, num_topics, kwargs)
+                    for num_topics in reversed(topic_range)
+                }
+                for num_topics in topic_range:
+                    model, results = futures[num_topics].result()
+                    print("{} topics coherence: {}".format(num_topics, results['coherence']))
+                    self._add_model(num_topics, model, results)
+
+    def _halving_models(self, model_class, corpus, topic_range, **kwargs):
+        """
+        Searches the topic range with successive halving on leading samples of the
+        corpus and keeps the best model.
+        """
+        def train(num_topics, model, start, end):
+            print("fitting {} model with {} topics on {} documents".format(model_class.__name__, num_topics, end))
+            if model is None:
+                return model_class(corpus=_CorpusSlice(corpus, 0, end), id2word=self.dictionary, num_topics=num_topics, **kwargs)
+            model.update(_CorpusSlice(corpus, start, end))
+            return model
+
+        def score(num_topics, model, end):
+            cm = CoherenceModel(model=model, corpus=_CorpusSlice(corpus, 0, end), dictionary=self.dictionary, coherence='u_mass')
+            return cm.get_coherence()
+
+        best, self.search_ = successive_halving(list(topic_range), len(corpus), train, score, eta=self.halving_factor)
+        for num_topics, (model, coherence) in best.items():
+            print("{} topics coherence: {}".format(num_topics, coherence))
+            self._add_model(num_topics, model, {'coherence': coherence})
+
+    def _add_model(self, num_topics, model, results):
+        self.models_[num_topics] = {}
+        self.models_[num_topics]['model'] = model
+        self.models_[num_topics]['results'] = results
 
     def update(self, documents):
         """
-        Updates the set of models with a stream of new corpus documents.
+        Updates the set of models with a stream of new corpus documents. The u_mass
+        coherence of every model is rescored from a co-occurrence accumulator shared
+        by the models, which only needs to count the documents added to (or removed
+        from) the evaluation corpus, and the new top words of the models.
         """
-        bow = [self.dictionary.doc2bow(doc, allow_update=True) for doc in documents]
-        self.corpus_.append(bow)
+        bow = [self.dictionary.doc2bow(doc, allow_update=self.update_dictionary_) for doc in documents]
+        added, removed = self.corpus_.add(bow)
         for _, m in self.models_.items():
             m['model'].update(bow)
-            cm = CoherenceModel(model=m['model'], corpus=self.corpus_, dictionary=self.dictionary, coherence='u_mass')
-            m['results']['coherence'] = cm.get_coherence()
+        self._score_models(added, removed)
+
+    def _score_models(self, added, removed):
+        """
+        Rescores the coherence of the models after the documents were added to and
+        removed from the evaluation corpus.
+        """
+        topics = {k: top_words(m['model']) for k, m in self.models_.items()}
+        words = set(int(id) for topic in chain.from_iterable(topics.values()) for id in topic)
+        if self.cooccurrence_ is None:
+            self.cooccurrence_ = CooccurrenceAccumulator()
+            self.cooccurrence_.track(words, [])
+            self.cooccurrence_.update(self.corpus_)
+        else:
+            self.cooccurrence_.update(added)
+            self.cooccurrence_.remove(removed)
+            # Drop words that have left the top words once they make up half of the
+            # tracked words, so the counts stay proportional to the current top words.
+            if len(self.cooccurrence_.index) > 2 * len(words):
+                self.cooccurrence_.retain(words)
+            self.cooccurrence_.track(words, self.corpus_)
+        for k, m in self.models_.items():
+            m['results']['coherence'] = self.cooccurrence_.u_mass(topics[k])
 
     def topics(self):
         """
@@ -1,19 +1,63 @@
+import numpy as np
+from scipy.sparse import issparse
 from sklearn.base import BaseEstimator, TransformerMixin
 from src.analyzer.engines.engine import ModelingEngine
+from src.analyzer.search import SEARCHES, successive_halving
 
-from sklearn.model_selection import GridSearchCV
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import GridSearchCV, HalvingGridSearchCV
 from sklearn.decomposition import LatentDirichletAllocation
 from sklearn.decomposition import NMF
 
+try:
+    from sklearn.decomposition import MiniBatchNMF
+except ImportError:
+    # MiniBatchNMF was added in scikit-learn 1.1.
+    MiniBatchNMF = None
+
+def squared_error(model, documents):
+    """
+    Return the squared Frobenius norm of the error of reconstructing the documents x
+    terms matrix with the NMF model, without forming the dense reconstruction.
+    """
+    W = model.transform(documents)
+    H = model.components_
+    norm = documents.multiply(documents).sum() if issparse(documents) else np.square(documents).sum()
+    cross = np.sum(np.asarray(documents @ H.T) * W)
+    return float(norm - 2 * cross + np.sum((W.T @ W) * (H @ H.T)))
+
 class SklearnEngine(ModelingEngine, BaseEstimator, TransformerMixin):
     """
     SklearnEngine implements the methods for fitting and evaluating sklearn models on a
     corpus. This class implements the fit(), transform(), and predict() methods in
     order to support use in sklearn pipelines.
+
+    If search is "halving" then the topic range is searched with successive halving
+    rather than fitting every candidate on the whole corpus: LDA models are searched
+    with HalvingGridSearchCV, which scores every candidate on a small sample of the
+    documents and only refits the best 1/halving_factor on samples halving_factor
+    times larger, and NMF models are searched the same way by their reconstruction
+    error, see successive_halving().
+
+    If online is True then every candidate model is kept and update() advances them
+    all with partial_fit() on each batch (MiniBatchNMF for NMF, which requires
+    scikit-learn >= 1.1) instead of searching again. Each batch is scored by every
+    candidate before it trains on it, so the scores_ of the candidates (the per-word
+    log-likelihood for LDA and the negative mean squared reconstruction error per
+    document for NMF, both seeded with the score on the fitted corpus) are running
+    held-out estimates, and model_ is the candidate with the best score. A full
+    search can be run at any time by calling fit() again.
     """
-    def __init__(self, engine="lda", vectorizer=None, min_topics=5, max_topics=10, **kwargs):
-        if self.engine not in ["lda", "nmf"]:
+    def __init__(self, engine="lda", vectorizer=None, min_topics=5, max_topics=10, search="grid", halving_factor=3, online=False,
+                 **kwargs):
+        if engine not in ["lda", "nmf"]:
             raise ValueError("engine must be either 'lda' or 'nmf'")
+        if online and engine == "nmf" and MiniBatchNMF is None:
+            raise ValueError("online nmf requires MiniBatchNMF (scikit-learn >= 1.1)")
+        if search not in SEARCHES:
+            raise ValueError("search must be one of: " + ", ".join(SEARCHES))
+        if halving_factor < 2:
+            raise ValueError("halving_factor must be at least 2.")
         self.engine = engine
         # TODO: Can we make the vectorizer part of the pipeline so we don't have to
         #       pass it in here?
@@ -21,13 +65,18 @@ class SklearnEngine(ModelingEngine, BaseEstimator, TransformerMixin):
         self.engine_opts = kwargs
         self.min_topics = min_topics
         self.max_topics = max_topics
+        self.search = search
+        self.halving_factor = halving_factor
+        self.online = online
 
     def fit(self, corpus):
         """
         Fits a set of models on the provided corpus, this conforms to a fit() method in
         the sklearn API.
         """
-        if self.engine == "lda":
+        if self.online:
+            self._fit_online(corpus, **self.engine_opts)
+        elif self.engine == "lda":
             self._fit_lda(corpus, **self.engine_opts)
         elif self.engine == "nmf":
             self._fit_nmf(corpus, **self.engine_opts)
@@ -43,7 +92,10 @@ class SklearnEngine(ModelingEngine, BaseEstimator, TransformerMixin):
         print("fitting lda models on topic range {} to {}".format(self.min_topics, self.max_topics))
         grid_params = {'n_components': list(range(self.min_topics, self.max_topics + 1))}
         model = LatentDirichletAllocation(learning_method="online", **kwargs)
-        self.grid_ = GridSearchCV(model, param_grid=grid_params)
+        if self.search == "halving":
+            self.grid_ = HalvingGridSearchCV(model, param_grid=grid_params, factor=self.halving_factor)
+        else:
+            self.grid_ = GridSearchCV(model, param_grid=grid_params)
         self.grid_.fit(corpus)
         self.model_ = self.grid_.best_estimator_
         print("best model params: {}".format(self.grid_.best_params_))
@@ -55,6 +107,9 @@ class SklearnEngine(ModelingEngine, BaseEstimator, TransformerMixin):
         Fits a set of models on the provided corpus.
         """
         print("fitting nmf models on topic range {} to {}".format(self.min_topics, self.max_topics))
+        if self.search == "halving":
+            self._halving_nmf(corpus, **kwargs)
+            return
         min_error = float("inf")
         for num_topics in range(self.min_topics, self.max_topics + 1):
             model = NMF(n_components=num_topics, **kwargs)
@@ -66,6 +121,78 @@ class SklearnEngine(ModelingEngine, BaseEstimator, TransformerMixin):
         print("best model params: {}".format(self.model_.get_params()))
         print("best model score: {}".format(self.model_.reconstruction_err_))
 
+    def _halving_nmf(self, corpus, **kwargs):
+        """
+        Searches the topic range with successive halving on leading samples of the
+        corpus, refitting the remaining candidates on each larger sample.
+        """
+        def train(num_topics, model, start, end):
+            model = NMF(n_components=num_topics, **kwargs)
+            model.fit(corpus[:end])
+            print("num topics: {} documents: {} error {}".format(num_topics, end, model.reconstruction_err_))
+            return model
+
+        def score(num_topics, model, end):
+            return -model.reconstruction_err_
+
+        topic_range = list(range(self.min_topics, self.max_topics + 1))
+        best, self.search_ = successive_halving(topic_range, corpus.shape[0], train, score, eta=self.halving_factor)
+        self.model_, _ = next(iter(best.values()))
+        print("best model params: {}".format(self.model_.get_params()))
+        print("best model score: {}".format(self.model_.reconstruction_err_))
+
+    def _fit_online(self, corpus, **kwargs):
+        """
+        Fits every candidate model on the provided corpus and keeps them for online
+        updates.
+        """
+        print("fitting online {} models on topic range {} to {}".format(self.engine, self.min_topics, self.max_topics))
+        self.models_ = {}
+        self.scores_ = {}
+        self._totals = {}
+        for num_topics in range(self.min_topics, self.max_topics + 1):
+            if self.engine == "lda":
+                model = LatentDirichletAllocation(n_components=num_topics, learning_method="online", **kwargs)
+            else:
+                model = MiniBatchNMF(n_components=num_topics, **kwargs)
+            model.fit(corpus)
+            self.models_[num_topics] = model
+            self._totals[num_topics] = (0.0, 0)
+            self._add_score(num_topics, corpus)
+        self._select_model()
+        print("best model params: {}".format(self.model_.get_params()))
+        print("best model score: {}".format(self.scores_[self.model_.n_components]))
+
+    def _add_score(self, num_topics, documents):
+        """
+        Adds the score of the candidate model on the documents to its running score.
+        """
+        model = self.models_[num_topics]
+        total, weight = self._totals[num_topics]
+        if self.engine == "lda":
+            total += model.score(documents)
+            weight += documents.sum()
+        else:
+            total -= squared_error(model, documents)
+            weight += documents.shape[0]
+        self._totals[num_topics] = (total, weight)
+        self.scores_[num_topics] = total / weight if weight > 0 else 0.0
+
+    def _select_model(self):
+        """
+        Selects the candidate model with the best running score.
+        """
+        self.model_ = self.models_[max(self.scores_, key=self.scores_.get)]
+
+    def _update_online(self, documents):
+        """
+        Scores the batch with every candidate model and then advances them on it.
+        """
+        for num_topics, model in self.models_.items():
+            self._add_score(num_topics, documents)
+            model.partial_fit(documents)
+        self._select_model()
+
     def transform(self, documents):
         """
         Implementation of the standard transform() method of the sklearn API.
@@ -76,6 +203,9 @@ class SklearnEngine(ModelingEngine, BaseEstimator, TransformerMixin):
         """
         Updates the set of models with a stream of new corpus documents.
         """
+        if self.online:
+            self._update_online(documents)
+            return
         self.grid_.fit(documents)
         self.model_ = self.grid_.best_estimator_
 
@@ -90,7 +220,10 @@ class SklearnEngine(ModelingEngine, BaseEstimator, TransformerMixin):
         Return the discovered topics and evaluation metrics for the set of current models.
         """
         topics = {}
-        feature_names = self.vectorizer.get_feature_names()
+        if hasattr(self.vectorizer, "get_feature_names_out"):
+            feature_names = self.vectorizer.get_feature_names_out()
+        else:
+            feature_names = self.vectorizer.get_feature_names()
         for idx, topic in enumerate(self.model_.components_):
             top_features_idx = topic.argsort()[:-10:-1]
             top_features = [(feature_names[i], topic[i]) for i in top_features_idx]
@@ -0,0 +1,125 @@
+import random
+from collections import deque
+from itertools import chain, islice
+
+SAMPLINGS = ["window", "reservoir"]
+
+class GrowingCorpus():
+    """
+    GrowingCorpus is the evaluation corpus of every document seen by an engine: the
+    corpus it was fitted on, which may be streamed from disk (e.g., an MmCorpus or
+    OnlineTextCorpus) and is not copied, followed by the documents added since, which
+    are held in memory.
+
+    Only the documents the corpus held when it was fitted are read from it, since a
+    live corpus such as an OnlineTextCorpus may have the added documents appended to
+    it as well (e.g., by the corpus stage of an ingest pipeline).
+    """
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self.length = len(corpus) if hasattr(corpus, "__len__") else sum(1 for _ in corpus)
+        self.added = []
+
+    def add(self, documents):
+        """
+        Add the documents, returning the documents added to and removed from the
+        corpus.
+        """
+        documents = list(documents)
+        self.added.extend(documents)
+        return documents, []
+
+    def __iter__(self):
+        return chain(islice(self.corpus, self.length), self.added)
+
+    def __len__(self):
+        return self.length + len(self.added)
+
+class SlidingWindowCorpus():
+    """
+    SlidingWindowCorpus is a fixed size evaluation corpus of the most recent size
+    documents seen by an engine.
+    """
+    def __init__(self, size, corpus=()):
+        if size < 1:
+            raise ValueError("size must be at least 1.")
+        self.size = size
+        self.documents = deque(maxlen=size)
+        self.add(corpus)
+
+    def add(self, documents):
+        """
+        Add the documents, evicting the oldest documents once the window is full, and
+        return the documents added to and removed from the window. Documents that are
+        evicted by later documents of the same batch are in both lists.
+        """
+        added = []
+        removed = []
+        for doc in documents:
+            if len(self.documents) == self.size:
+                removed.append(self.documents[0])
+            self.documents.append(doc)
+            added.append(doc)
+        return added, removed
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    def __len__(self):
+        return len(self.documents)
+
+class ReservoirCorpus():
+    """
+    ReservoirCorpus is a fixed size evaluation corpus of a uniform random sample of
+    all documents seen by an engine, maintained with reservoir sampling (Algorithm R):
+    the n-th document replaces a random sampled document with probability size / n.
+    """
+    def __init__(self, size, corpus=(), seed=None):
+        if size < 1:
+            raise ValueError("size must be at least 1.")
+        self.size = size
+        self.seen = 0
+        self.documents = []
+        self.rng = random.Random(seed)
+        self.add(corpus)
+
+    def add(self, documents):
+        """
+        Offer the documents to the sample, returning the documents added to and
+        removed from it. Documents that are replaced by later documents of the same
+        batch are in both lists.
+        """
+        added = []
+        removed = []
+        for doc in documents:
+            self.seen += 1
+            if len(self.documents) < self.size:
+                self.documents.append(doc)
+                added.append(doc)
+                continue
+            i = self.rng.randrange(self.seen)
+            if i < self.size:
+                removed.append(self.documents[i])
+                self.documents[i] = doc
+                added.append(doc)
+        return added, removed
+
+    def __iter__(self):
+        return iter(self.documents)
+
+    def __len__(self):
+        return len(self.documents)
+
+def evaluation_corpus(corpus, size=None, sampling="window", seed=None):
+    """
+    Return the evaluation corpus for an engine fitted on the corpus: every document
+    if size is None, otherwise a sliding window of the size most recent documents or
+    a reservoir sample of size documents, seeded with one pass over the corpus.
+    """
+    if sampling not in SAMPLINGS:
+        raise ValueError("sampling must be one of: " + ", ".join(SAMPLINGS))
+    if size is None:
+        return GrowingCorpus(corpus)
+    if sampling == "window":
+        return SlidingWindowCorpus(size, corpus)
+    return ReservoirCorpus(size, corpus, seed=seed)
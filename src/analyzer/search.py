@@ -0,0 +1,56 @@
+import math
+
+SEARCHES = ["grid", "halving"]
+
+def halving_budgets(num_candidates, num_docs, eta=3):
+    """
+    Return the number of leading documents of the corpus that the candidates of each
+    rung of successive halving are trained on. The last rung uses the whole corpus
+    and each earlier rung uses 1/eta of the documents of the next, with enough rungs
+    for one candidate to remain after keeping the best 1/eta at each rung.
+    """
+    rungs = 0
+    while eta ** rungs < num_candidates:
+        rungs += 1
+    return [max(1, math.ceil(num_docs / eta ** (rungs - i))) for i in range(rungs + 1)]
+
+def successive_halving(candidates, num_docs, train, score, eta=3):
+    """
+    Search for the best candidate (e.g., number of topics) with successive halving.
+    Every candidate is trained briefly on a small leading sample of the corpus and
+    scored, and only the best 1/eta of them are trained further on a sample eta times
+    larger, until the last candidate has been trained on the whole corpus. Most of
+    the compute therefore goes to the promising candidates.
+
+    train(candidate, state, start, end) returns the state (e.g., the model) of the
+    candidate after training it on the documents in [start, end), continuing from
+    its state after training on [0, start) (None in the first rung). score(candidate,
+    state, end) returns the score of the trained candidate on the documents in
+    [0, end), where higher is better.
+
+    Returns a dict of the remaining candidate to its (state, score) and the history
+    of the search, a list of the number of documents and the scores of each rung.
+    """
+    if eta < 2:
+        raise ValueError("eta must be at least 2.")
+    if len(candidates) == 0:
+        return {}, []
+    states = {candidate: None for candidate in candidates}
+    budgets = halving_budgets(len(candidates), num_docs, eta)
+    history = []
+    start = 0
+    for i, end in enumerate(budgets):
+        scores = {}
+        for candidate in states:
+            if states[candidate] is None or end > start:
+                states[candidate] = train(candidate, states[candidate], start, end)
+            scores[candidate] = score(candidate, states[candidate], end)
+        history.append({"documents": end, "scores": scores})
+        start = end
+        if i < len(budgets) - 1:
+            # Candidates that could not be scored (NaN) are ranked last, ties keep
+            # the candidate order.
+            ranked = sorted(states, key=lambda c: -math.inf if math.isnan(scores[c]) else scores[c], reverse=True)
+            keep = set(ranked[:math.ceil(len(states) / eta)])
+            states = {candidate: state for candidate, state in states.items() if candidate in keep}
+    return {candidate: (state, scores[candidate]) for candidate, state in states.items()}, history
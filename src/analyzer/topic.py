@@ -3,17 +3,25 @@ from src.analyzer.engines.sklearn import SklearnEngine
 
 class TopicAnalyzer():
     """
-    TopicAnalyzer supports fitting various topic models on a gensim corpus.
+    TopicAnalyzer supports fitting various topic models on a gensim corpus. The
+    number of topics is chosen from min_topics to max_topics by fitting every
+    candidate (search="grid"), or with successive halving (search="halving"), which
+    trains every candidate on a small sample and only keeps training the best
+    1/halving_factor of them. Other keyword arguments (e.g., the eta prior of gensim's
+    LdaModel) are passed on to the engine and its models.
     """
-    def __init__(self, engine="gensim", type="lda", dictionary=None, min_topics=5, max_topics=10, **kwargs):
+    def __init__(self, engine="gensim", type="lda", dictionary=None, min_topics=5, max_topics=10, search="grid", halving_factor=3,
+                 **kwargs):
         if engine == "gensim":
             if dictionary is None:
                 raise ValueError("must provide a Dictionary or HashDictionary for gensim engine")
-            self.engine = GensimEngine(engine=type, dictionary=dictionary, min_topics=min_topics, max_topics=max_topics, **kwargs)
+            self.engine = GensimEngine(engine=type, dictionary=dictionary, min_topics=min_topics, max_topics=max_topics, search=search,
+                                       halving_factor=halving_factor, **kwargs)
         elif engine == "sklearn":
             if dictionary is None:
                 raise ValueError("must provide a CountVectorizer or HashVectorizer for sklearn engine")
-            self.engine = SklearnEngine(engine=type, vectorizer=dictionary, min_topics=min_topics, max_topics=max_topics, **kwargs)
+            self.engine = SklearnEngine(engine=type, vectorizer=dictionary, min_topics=min_topics, max_topics=max_topics, search=search,
+                                       halving_factor=halving_factor, **kwargs)
         else:
             raise ValueError("engine must be either 'gensim' or 'sklearn'.")
 
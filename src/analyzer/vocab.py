@@ -1,13 +1,23 @@
 from collections import Counter
 from gensim.corpora import Dictionary
+from src.storage.vocab import LazyDictionary
+from src.dictionary.sketch import SketchDictionary
 
 class VocabAnalyzer():
     """
-    VocabAnalyzer computes vocab statistics given a gensim Dictionary.
+    VocabAnalyzer computes vocab statistics given a gensim Dictionary, a
+    LazyDictionary view of one, or a SketchDictionary.
+
+    Statistics computed from a SketchDictionary are estimates: word counts and the
+    counts of the most common words may be overestimated, by at most the bounds
+    reported in the "error_bounds" entry of the results (see
+    SketchDictionary.error_bounds()), and the number of unique words is a linear
+    counting estimate. The number of rare words cannot be estimated from a sketch and
+    is reported as None.
     """
 
     def __init__(self, dictionary):
-        if not isinstance(dictionary, Dictionary):
+        if not isinstance(dictionary, (Dictionary, LazyDictionary, SketchDictionary)):
             raise ValueError("dictionary must be a gensim Dictionary.")
         self.dictionary = dictionary
 
@@ -15,6 +25,9 @@ class VocabAnalyzer():
         """
         Compute overall vocab statistics for the corpus and return the results.
         """
+        if isinstance(self.dictionary, SketchDictionary):
+            return self._sketch_corpus_statistics()
+
         stats = {}
         stats["num_docs"] = self.dictionary.num_docs
         stats["num_words"] = self.dictionary.num_pos
@@ -35,10 +48,38 @@ class VocabAnalyzer():
         stats["rare_words"] = len(rare_tokens)
         return stats
 
+    def _sketch_corpus_statistics(self):
+        """
+        Estimate overall vocab statistics from a SketchDictionary.
+        """
+        stats = {}
+        stats["num_docs"] = self.dictionary.num_docs
+        stats["num_words"] = self.dictionary.num_pos
+        stats["unique_words"] = self.dictionary.num_unique()
+        if self.dictionary.num_docs > 0:
+            stats["words_per_doc"] = self.dictionary.num_pos / self.dictionary.num_docs
+        else:
+            stats["words_per_doc"] = 0
+        stats["most_common"] = self.dictionary.most_common(10)
+        stats["rare_words"] = None
+        stats["error_bounds"] = self.dictionary.error_bounds()
+        return stats
+
     def word_statistics(self, word):
         """
         Compute vocab statistics for the given word.
         """
+        if isinstance(self.dictionary, SketchDictionary):
+            # A count-min sketch never underestimates, so a zero count means the word
+            # has never been seen.
+            if self.dictionary.df(word) == 0:
+                return None
+            stats = {}
+            stats["corpus_count"] = self.dictionary.cf(word)
+            stats["doc_count"] = self.dictionary.df(word)
+            stats["error_bounds"] = self.dictionary.error_bounds()
+            return stats
+
         if word not in self.dictionary.token2id:
             return None
         
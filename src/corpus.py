@@ -1,81 +1,430 @@
 import os
+import copy
 import shutil
+import threading
+from itertools import chain
 from gensim.corpora import Dictionary
 from gensim.corpora import MmCorpus
 from gensim.corpora import HashDictionary
 
+from src.storage.wal import WriteAheadLog
+from src.dedup.minhash import MinHashLSH
+from src.dictionary.sketch import SketchDictionary
+from src.dictionary.parallel import parallel_doc2bow
+from src.dictionary.remap import DROPPED, compose_remaps, prune_dictionary, read_remap, remove_tokens, write_remap
+from src.storage.vocab import LazyDictionary, has_vocab, write_vocab
+from src.storage.files import read_json, write_json
+from src.storage.segment import FORMATS, SEGMENT_DIR, SegmentedCorpus, adopt_segment, compact_segment, find_merge
+from src.storage.segment import merge_segments, new_segment_name, read_ids, remove_segment, segment_generation, segment_name
+from src.storage.segment import write_segment
+
 CORPUS_DIR = "corpus"
 DICT_NAME = "dict"
 MATRIX_NAME = "corpus.mm"
+VERSION_NAME = "version.json"
+VOCAB_DIR = "vocab"
+MANIFEST_NAME = "MANIFEST.json"
+WAL_DIR = "wal"
+REMAP_DIR = "remaps"
+REMAP_EXT = ".bin"
+DEDUP_DIR = "dedup"
+DEDUP_MODES = ("drop", "flag")
 
 class OnlineTextCorpus():
     """
     OnlineTextCorpus is a wrapper around gensim corpus data structures which is
     expected to be updated on an event-driven basis (e.g., when new data is received).
     The corpus is frequently checkpointed to disk to allow for data recovery.
+
+    The corpus is stored as an ordered list of immutable segments, one per batch of
+    added documents, and each checkpoint version records the list of segments that
+    make up the corpus at that version. Adding documents only writes the new batch,
+    and old checkpoints share segments rather than holding full copies of the corpus.
+    Adjacent segments of similar size are merged in the background once merge_factor
+    of them accumulate, which keeps the number of segments logarithmic in the size of
+    the corpus.
+
+    Segments are written as MatrixMarket files by default, or with format="csr" as
+    memory mapped binary CSR arrays which support O(1) document lookup and can be
+    handed directly to the modeling engines as a scipy.sparse.csr_matrix.
+
+    If wal is True, add_documents() only appends the new BoW documents and dictionary
+    updates to a write-ahead log and returns; checkpoints are written by a background
+    worker once checkpoint_docs documents have been logged or checkpoint_interval
+    seconds have elapsed. load() replays the log on top of the latest checkpoint. The
+    worker keeps its own copy of the dictionary so that checkpoints never block
+    ingestion, which doubles the memory used by the dictionary, and updates a further
+    copy while a checkpoint is written so that a failed checkpoint can be retried.
+
+    The current version, its segments, document count and vocabulary size are kept in
+    an atomically updated manifest so that load() does not need to scan the corpus
+    directory. Every vocab_interval checkpoints, and on close(), the vocabulary is
+    also written as memory mapped arrays, which load() opens as a read-only
+    LazyDictionary instead of unpickling the full Dictionary; the full Dictionary is
+    only materialized once documents are added. Writing the arrays sorts the whole
+    vocabulary, so it is not done on every checkpoint.
+
+    Documents can be added with external ids, which are stored alongside each segment
+    and indexed in memory as id -> (segment, offset) for O(1) lookup. Adding a document
+    with an existing id replaces it. Deleted or replaced documents are marked with
+    tombstones which iteration skips, and compact() rewrites the affected segments
+    without the deleted rows and removes them from the dictionary statistics, along
+    with any tokens that no longer occur in the corpus.
+
+    prune() bounds the size of the vocabulary by filtering extreme tokens from the
+    dictionary. Rather than rebuilding the corpus with the new token ids, each prune
+    starts a new dictionary generation and records an old -> new id remap table. Each
+    segment records the generation it was written with; older segments are remapped
+    as they are read and are rewritten with the current ids when they are merged or
+    compacted.
+
+    For never-ending streams, sketch_memory sets a fixed memory budget in bytes for a
+    SketchDictionary, which hashes token ids like HashDictionary but estimates token
+    statistics with bounded memory sketches instead of growing per-token maps. It
+    implies hash_dictionary. Sketch statistics are not reduced by compact().
+
+    If dedup_threshold is set, added documents are checked against a MinHash LSH index
+    of the documents in the corpus before they are converted to BoW, and documents
+    whose estimated Jaccard similarity to an indexed document is at least the
+    threshold are dropped, or with dedup_mode="flag" only flagged. The index is
+    persisted incrementally in the corpus directory with each checkpoint and exposes
+    hit rate counters with dedup.stats(). Deleted documents remain in the index.
     """
-    def __init__(self, dir, hash_dictionary=False, num_checkpoints=5):
+    def __init__(self, dir, hash_dictionary=False, num_checkpoints=5, merge_factor=10, background_merge=True, format="mm",
+                 wal=False, checkpoint_docs=1000, checkpoint_interval=60, sketch_memory=None, dedup_threshold=None,
+                 dedup_mode="drop", vocab_interval=10):
         if num_checkpoints < 1:
             raise ValueError("num_checkpoints must be at least 1.")
+        if merge_factor < 2:
+            raise ValueError("merge_factor must be at least 2.")
+        if format not in FORMATS:
+            raise ValueError("format must be one of: " + ", ".join(FORMATS))
+        if checkpoint_docs < 1 or checkpoint_interval <= 0:
+            raise ValueError("checkpoint_docs and checkpoint_interval must be positive.")
+        if vocab_interval < 1:
+            raise ValueError("vocab_interval must be at least 1.")
+        if sketch_memory is not None and sketch_memory <= 0:
+            raise ValueError("sketch_memory must be positive.")
+        if dedup_threshold is not None and not 0 < dedup_threshold <= 1:
+            raise ValueError("dedup_threshold must be in (0, 1].")
+        if dedup_mode not in DEDUP_MODES:
+            raise ValueError("dedup_mode must be one of: " + ", ".join(DEDUP_MODES))
         self.dir = dir
-        self.hash_dictionary = hash_dictionary
+        self.hash_dictionary = hash_dictionary or sketch_memory is not None
+        self.sketch_memory = sketch_memory
+        self.dedup_threshold = dedup_threshold
+        self.dedup_mode = dedup_mode
         self.num_checkpoints = num_checkpoints
+        self.merge_factor = merge_factor
+        self.background_merge = background_merge
+        self.format = format
+        self.use_wal = wal
+        self.checkpoint_docs = checkpoint_docs
+        self.checkpoint_interval = checkpoint_interval
+        self.vocab_interval = vocab_interval
         self.dictionary = None
         self.mm = None
+        self.segments = []
         self.version = 0
+        self.wal = None
+        self.wal_seq = 0
+        self.num_terms = 0
+        self.tombstones = {}
+        self.generation = 0
+        self.dedup = None
+        self.dedup_rows = 0
+        self._index = None
+        self._remap_cache = {}
+        self._opened = {}
+        self._lock = threading.RLock()
+        self._checkpoint_lock = threading.RLock()
+        self._pending = set()
+        self._merger = None
+        self._records = []
+        self._unflushed = 0
+        self._shadow = None
+        self._checkpointer = None
+        self._trigger = threading.Event()
+        self._closing = False
+        self._error = None
 
-    def _corpus_path(self):
-        return os.path.join(self.dir, CORPUS_DIR + "_" + str(self.version))
+    def _corpus_path(self, version=None):
+        if version is None:
+            version = self.version
+        return os.path.join(self.dir, CORPUS_DIR + "_" + str(version))
 
-    def _dict_path(self):
-        return os.path.join(self._corpus_path(), DICT_NAME)
+    def _dict_path(self, version=None):
+        return os.path.join(self._corpus_path(version), DICT_NAME)
 
     def _matrix_path(self):
         return os.path.join(self._corpus_path(), MATRIX_NAME)
 
+    def _version_path(self, version=None):
+        return os.path.join(self._corpus_path(version), VERSION_NAME)
+
+    def _vocab_path(self, version=None):
+        return os.path.join(self._corpus_path(version), VOCAB_DIR)
+
+    def _manifest_path(self):
+        return os.path.join(self.dir, MANIFEST_NAME)
+
+    def _dedup_path(self):
+        return os.path.join(self.dir, DEDUP_DIR)
+
+    def _remap_path(self, generation):
+        return os.path.join(self.dir, REMAP_DIR, str(generation) + REMAP_EXT)
+
     def _dictionary(self):
-        if self.hash_dictionary:
+        if self.sketch_memory is not None:
+            return SketchDictionary
+        elif self.hash_dictionary:
             return HashDictionary
         else:
             return Dictionary
 
-    def _load_corpus(self):
+    def _new_dictionary(self):
+        if self.sketch_memory is not None:
+            return SketchDictionary(memory=self.sketch_memory)
+        return self._dictionary()()
+
+    def _versions(self):
         """
-        Load the dictionary into memory and set the path to the streamed corpus.
+        Return the checkpoint versions that currently exist on disk.
         """
-        self.dictionary = self._dictionary().load(self._dict_path())
-        self.mm = MmCorpus(self._matrix_path())
+        versions = []
+        for f in os.listdir(self.dir):
+            if f.startswith(CORPUS_DIR + "_") and os.path.isdir(os.path.join(self.dir, f)):
+                versions.append(int(f.split("_")[1]))
+        return versions
+
+    def _read_version(self, version):
+        """
+        Read the metadata of the given version: the list of segments that make up the
+        corpus and the last write-ahead log record included in the checkpoint.
+        Checkpoints written before the corpus was segmented hold a single matrix,
+        which is treated as a segment in place.
+        """
+        meta = read_json(self._version_path(version))
+        if meta is not None:
+            return meta
+        meta = {"segments": [], "wal_seq": 0}
+        matrix = os.path.join(self._corpus_path(version), MATRIX_NAME)
+        if os.path.exists(matrix):
+            name = os.path.relpath(matrix, self.dir)
+            meta["segments"].append({"name": name, "num_docs": len(MmCorpus(matrix))})
+        return meta
+
+    def _load_corpus(self, meta=None):
+        """
+        Open the dictionary and set the path to the streamed corpus. If the vocabulary
+        arrays were checkpointed then the dictionary is opened lazily, otherwise it is
+        loaded into memory.
+        """
+        if not self.hash_dictionary and has_vocab(self._vocab_path()):
+            self.dictionary = LazyDictionary(self._vocab_path())
+        else:
+            self.dictionary = self._dictionary().load(self._dict_path())
+        if meta is None:
+            meta = self._read_version(self.version)
+        self.num_terms = len(self.dictionary)
+        self.segments = meta["segments"]
+        self.tombstones = meta.get("tombstones", {})
+        self.generation = meta.get("generation", 0)
+        self.dedup_rows = meta.get("dedup_rows", 0)
+        self.wal_seq = meta["wal_seq"]
+        self._index = None
+        self.mm = self._segmented_corpus()
+
+    def _remap(self, generation):
+        """
+        Return the remap table from the token ids of the given dictionary generation
+        to the ids of the current generation, or None if they are the same.
+        """
+        if generation == self.generation:
+            return None
+        key = (generation, self.generation)
+        if key not in self._remap_cache:
+            remap = read_remap(self._remap_path(generation + 1))
+            for g in range(generation + 2, self.generation + 1):
+                remap = compose_remaps(remap, read_remap(self._remap_path(g)))
+            self._remap_cache[key] = remap
+        return self._remap_cache[key]
+
+    def _remaps(self, segments):
+        """
+        Return the remap tables of the segments that were written with an older
+        dictionary generation by segment name.
+        """
+        remaps = {}
+        for segment in segments:
+            remap = self._remap(segment_generation(segment))
+            if remap is not None:
+                remaps[segment["name"]] = remap
+        return remaps
+
+    def _segmented_corpus(self):
+        """
+        Return the streamed corpus of the current segments, reusing the segments that
+        were already opened so that each checkpoint only opens the new segments.
+        """
+        names = set(s["name"] for s in self.segments)
+        self._opened = {name: corpus for name, corpus in self._opened.items() if name in names}
+        return SegmentedCorpus(self.dir, self.segments, self.tombstones, self._remaps(self.segments), opened=self._opened)
 
     def get_dictionary(self):
         """
         Return the current dictionary, loading the most recent version from disk if
-        necessary.
+        necessary. After load() this is a read-only LazyDictionary view until
+        documents are added to the corpus.
         """
         if self.dictionary is None:
             self.load()
         return self.dictionary
 
+    def _writable_dictionary(self):
+        """
+        Materialize the dictionary if it is a lazily loaded view so that it can be
+        updated.
+        """
+        if isinstance(self.dictionary, LazyDictionary):
+            self.dictionary = self.dictionary.materialize()
+        return self.dictionary
+
     def load(self):
         """
-        Load the latest version of the corpus from disk.
+        Load the latest version of the corpus from disk. If the write-ahead log is
+        enabled then any logged documents that are not yet checkpointed are replayed.
         """
+        manifest = read_json(self._manifest_path())
         if self.version > 0:
             self._load_corpus()
+        elif manifest is not None:
+            self.version = manifest["version"]
+            self._load_corpus(meta=manifest)
         else:
             # Search for the latest version of the corpus.
-            latest_version = 0
-            for f in os.listdir(self.dir):
-                if f.startswith(CORPUS_DIR + "_"):
-                    version = int(f.split("_")[1])
-                    if version > latest_version:
-                        latest_version = version
+            latest_version = max(self._versions(), default=0)
             if latest_version > 0:
                 self.version = latest_version
                 self._load_corpus()
             else:
-                self.dictionary = self._dictionary()()
+                self.dictionary = self._new_dictionary()
+                self.segments = []
+                self.tombstones = {}
+                self.generation = 0
+                self.dedup_rows = 0
+                self.wal_seq = 0
+                self.num_terms = 0
+                self._index = None
+                self.mm = SegmentedCorpus(self.dir, self.segments)
                 self.version = 0
 
+        if self.dedup_threshold is not None:
+            if os.path.isdir(self._dedup_path()):
+                self.dedup = MinHashLSH.load(self._dedup_path(), self.dedup_rows, threshold=self.dedup_threshold)
+            else:
+                self.dedup = MinHashLSH(threshold=self.dedup_threshold)
+
+        if self.use_wal:
+            self._replay()
+
+    def _replay(self):
+        """
+        Open the write-ahead log and apply the records following the loaded checkpoint.
+        """
+        with self._lock:
+            if self.wal is None:
+                self.wal = WriteAheadLog(os.path.join(self.dir, WAL_DIR))
+            self._writable_dictionary()
+            self._shadow = copy.deepcopy(self.dictionary)
+            self._records = []
+            self._unflushed = 0
+            for seq, record in self.wal.replay(after=self.wal_seq):
+                bows = self._apply_record(self.dictionary, record)
+                self._records.append((seq, record, bows))
+                self._unflushed += len(bows)
+                if self.dedup is not None:
+                    for signature in record.get("signatures", []):
+                        self.dedup.insert(signature)
+
+    def _doc2bow(self, documents, workers=1, chunksize=1000):
+        """
+        Convert the documents to BoW, updating the dictionary, and return a generator
+        of (bow, missing) where missing lists the (token, id) pairs added to the
+        dictionary by the document. With more than one worker the documents are
+        counted in a process pool and merged into the dictionary in order. Hashing
+        dictionaries do not need to assign ids, so they are always converted serially.
+        """
+        if self.hash_dictionary:
+            return ((self.dictionary.doc2bow(doc, allow_update=True), []) for doc in documents)
+        return parallel_doc2bow(self.dictionary, documents, workers=workers, chunksize=chunksize)
+
+    def _deduplicate(self, documents, ids=None):
+        """
+        Check the documents against the near-duplicate index and return the documents
+        and ids to add, whether each document is a duplicate and the signatures added
+        to the index. Documents that are not duplicates are indexed as they are
+        checked so that copies within the batch are also detected.
+        """
+        kept = []
+        kept_ids = [] if ids is not None else None
+        flags = []
+        signatures = []
+        for i, doc in enumerate(documents):
+            signature = self.dedup.signature(doc)
+            duplicate = self.dedup.query(signature) is not None
+            flags.append(duplicate)
+            if not duplicate and signature is not None:
+                self.dedup.insert(signature)
+                signatures.append(signature)
+            if duplicate and self.dedup_mode == "drop":
+                continue
+            kept.append(doc)
+            if ids is not None:
+                kept_ids.append(ids[i])
+        return kept, kept_ids, flags, signatures
+
+    def _make_record(self, documents, ids=None, workers=1, chunksize=1000):
+        """
+        Convert the documents to BoW, updating the dictionary, and return a log record
+        along with the BoW documents. Dictionary updates are logged as the new token
+        ids; the remaining statistics are recovered from the BoW documents. The debug
+        statistics of a HashDictionary cannot be recovered from BoW, so the tokenized
+        documents are logged instead.
+        """
+        if self.hash_dictionary:
+            documents = list(documents)
+            bows = [bow for bow, _ in self._doc2bow(documents)]
+            record = {"documents": documents}
+        else:
+            tokens = []
+            bows = []
+            for bow, missing in self._doc2bow(documents, workers=workers, chunksize=chunksize):
+                bows.append(bow)
+                tokens.extend(missing)
+            record = {"tokens": tokens, "bows": bows}
+        if ids is not None:
+            record["ids"] = ids
+        return record, bows
+
+    def _apply_record(self, dictionary, record):
+        """
+        Apply the dictionary updates of a log record and return its BoW documents.
+        """
+        if "documents" in record:
+            return [dictionary.doc2bow(doc, allow_update=True) for doc in record["documents"]]
+
+        for token, id in record["tokens"]:
+            dictionary.token2id[token] = id
+        for bow in record["bows"]:
+            dictionary.num_docs += 1
+            dictionary.num_nnz += len(bow)
+            for id, count in bow:
+                dictionary.num_pos += count
+                dictionary.cfs[id] = dictionary.cfs.get(id, 0) + count
+                dictionary.dfs[id] = dictionary.dfs.get(id, 0) + 1
+        return record["bows"]
+
     def iter_corpus(self, documents=[]):
         """
         Returns a generator which iterates through the current corpus and then the
@@ -87,27 +436,559 @@ class OnlineTextCorpus():
         if self.mm is not None:
             for doc in self.mm:
                 yield doc
+        with self._lock:
+            records = list(self._records)
+        for _, _, bows in records:
+            for doc in bows:
+                yield doc
         for doc in documents:
-            yield self.dictionary.doc2bow(doc, allow_update=True)
+            yield self._writable_dictionary().doc2bow(doc, allow_update=True)
 
-    def add_documents(self, documents):
+    def __iter__(self):
+        """
+        Iterate through the BoW documents of the corpus, including logged documents
+        that are not yet checkpointed, so that the corpus can be streamed from disk to
+        the modeling engines like any gensim corpus.
+        """
+        if self.dictionary is None or self.mm is None:
+            self.load()
+        return self.iter_corpus()
+
+    def __len__(self):
+        if self.dictionary is None or self.mm is None:
+            self.load()
+        with self._lock:
+            return len(self.mm) + sum(len(bows) for _, _, bows in self._records)
+
+    def add_documents(self, documents, ids=None, workers=1, chunksize=1000):
         """
         Add a stream of documents to the corpus, incrementing the version number and
-        checkpointing the results.
+        checkpointing the results. Only the new documents are written to disk. If the
+        write-ahead log is enabled then the documents are durably logged and the
+        checkpoint is left to the background worker.
+
+        If ids are given, they are the external ids of the documents (None for
+        documents without an id) and any existing documents with the same ids are
+        replaced. When the write-ahead log is enabled, replaced documents are deleted
+        at the next checkpoint.
+
+        For large backfills, workers > 1 converts chunks of chunksize documents to BoW
+        in a process pool; the resulting dictionary and corpus are identical to adding
+        the documents serially.
+
+        If near-duplicate detection is enabled, returns a list with True for each
+        document that was a near-duplicate (and was dropped unless dedup_mode is
+        "flag"), otherwise returns None.
         """
         if self.dictionary is None or self.mm is None:
             self.load()
-        self.version += 1
-
-        # Save the new version of the corpus to a new directory.
-        # FIXME: This requires a full scan of the current corpus which does not scale.
-        os.makedirs(self._corpus_path(), exist_ok=True)
-        MmCorpus.serialize(self._matrix_path(), self.iter_corpus(documents=documents))
-        self.mm = MmCorpus(self._matrix_path())
-        self.dictionary.save(self._dict_path())
-        for f in os.listdir(self.dir):
+        self._writable_dictionary()
+        if ids is not None or self.dedup is not None:
+            documents = list(documents)
+        if ids is not None:
+            ids = list(ids)
+            if len(ids) != len(documents):
+                raise ValueError("ids must have the same length as documents.")
+        flags = None
+
+        if self.use_wal:
+            with self._lock:
+                self._raise_error()
+                if self.dedup is not None:
+                    documents, ids, flags, signatures = self._deduplicate(documents, ids)
+                record, bows = self._make_record(documents, ids=ids, workers=workers, chunksize=chunksize)
+                if self.dedup is not None and len(signatures) > 0:
+                    record["signatures"] = signatures
+                seq = self.wal.append(record)
+                self._records.append((seq, record, bows))
+                self._unflushed += len(bows)
+                if self._unflushed >= self.checkpoint_docs:
+                    self._trigger.set()
+                if self._checkpointer is None:
+                    self._checkpointer = threading.Thread(target=self._run_checkpointer, daemon=True)
+                    self._checkpointer.start()
+            return flags
+
+        with self._checkpoint_lock:
+            self._raise_error()
+            signatures = []
+            if self.dedup is not None:
+                documents, ids, flags, signatures = self._deduplicate(documents, ids)
+            name = self._reserve_segment()
+            bows = (bow for bow, _ in self._doc2bow(documents, workers=workers, chunksize=chunksize))
+            segment = write_segment(self.dir, name, bows, ids=ids, generation=self.generation)
+            self._checkpoint(self.dictionary, segment, name, signatures=len(signatures))
+        self._schedule_merge()
+        return flags
+
+    def _raise_error(self):
+        """
+        Raise the error of a failed background checkpoint or merge, if any.
+        """
+        if self._error is not None:
+            raise ValueError("Error checkpointing corpus: " + str(self._error))
+
+    def _run_checkpointer(self):
+        """
+        Checkpoint logged documents whenever the count or time trigger fires.
+        """
+        while not self._closing:
+            self._trigger.wait(self.checkpoint_interval)
+            self._trigger.clear()
+            try:
+                self.checkpoint()
+            except Exception as e:
+                self._error = e
+                return
+
+    def checkpoint(self):
+        """
+        Write the logged documents that are not yet part of a checkpoint to a new
+        version and truncate the write-ahead log.
+        """
+        with self._checkpoint_lock:
+            with self._lock:
+                records = list(self._records)
+            if len(records) == 0:
+                return
+
+            # The records are applied to a copy of the checkpointed dictionary which
+            # only replaces it once the checkpoint has been written, so that a failed
+            # checkpoint can be retried without counting the records twice.
+            shadow = copy.deepcopy(self._shadow)
+            for _, record, _ in records:
+                self._apply_record(shadow, record)
+            name = self._reserve_segment()
+            ids = None
+            if any("ids" in record for _, record, _ in records):
+                ids = list(chain.from_iterable(record.get("ids", [None] * len(bows)) for _, record, bows in records))
+            bows = chain.from_iterable(bows for _, _, bows in records)
+            segment = write_segment(self.dir, name, bows, ids=ids, generation=self.generation)
+            signatures = sum(len(record.get("signatures", [])) for _, record, _ in records)
+            self._checkpoint(shadow, segment, name, records=records, signatures=signatures)
+            self._shadow = shadow
+            with self._lock:
+                self.wal.truncate(self.wal_seq)
+        self._schedule_merge()
+
+    def _reserve_segment(self):
+        """
+        Allocate a name for a segment that is about to be written, protecting it from
+        garbage collection until it has been published.
+        """
+        with self._lock:
+            name = new_segment_name(self.format)
+            self._pending.add(name)
+            return name
+
+    def _checkpoint(self, dictionary, segment, reserved, records=[], signatures=0):
+        """
+        Save the dictionary and the current segments plus the new segment as a new
+        version, then remove versions and segments that are no longer retained. The
+        dictionary is saved without holding the lock so that ingestion is not blocked.
+        Log records included in the new segment are marked as checkpointed, along with
+        the number of signatures they added to the near-duplicate index. Must be
+        called with the checkpoint lock held.
+        """
+        version = self.version + 1
+        os.makedirs(self._corpus_path(version), exist_ok=True)
+        dictionary.save(self._dict_path(version))
+        if not self.hash_dictionary and version % self.vocab_interval == 0:
+            write_vocab(self._vocab_path(version), dictionary)
+
+        with self._lock:
+            self._pending.discard(reserved)
+            for i, s in enumerate(self.segments):
+                if not s["name"].startswith(SEGMENT_DIR + "/"):
+                    name = new_segment_name(self.format)
+                    adopt_segment(self.dir, name, s["name"])
+                    self.segments[i] = {"name": name, "num_docs": s["num_docs"]}
+            if segment is not None:
+                if segment.get("ids", False):
+                    self._id_index()
+                self.segments.append(segment)
+                self._add_to_index(segment)
+            if len(records) > 0:
+                del self._records[:len(records)]
+                self._unflushed -= sum(len(bows) for _, _, bows in records)
+                self.wal_seq = records[-1][0]
+            if self.dedup is not None:
+                self.dedup_rows += signatures
+                self.dedup.save(self._dedup_path(), self.dedup_rows)
+            self.version = version
+            self.num_terms = len(dictionary)
+            self._publish()
+
             # Remove older corpus versions.
-            if os.path.isdir(os.path.join(self.dir, f)) and f.startswith(CORPUS_DIR + "_"):
-                version = int(f.split("_")[1])
-                if version <= self.version - self.num_checkpoints:
-                    shutil.rmtree(os.path.join(self.dir, f))
\ No newline at end of file
+            referenced = set(s["name"] for s in self.segments) | self._pending
+            generation = min([segment_generation(s) for s in self.segments], default=self.generation)
+            for v in self._versions():
+                if v <= self.version - self.num_checkpoints:
+                    shutil.rmtree(self._corpus_path(v))
+                else:
+                    segments = self._read_version(v)["segments"]
+                    referenced.update(s["name"] for s in segments)
+                    generation = min([generation] + [segment_generation(s) for s in segments])
+
+            # Remove segments which are not referenced by any retained version or
+            # reserved by a write in progress. Files that do not belong to a segment,
+            # such as the temporary files of an in-flight write, are left alone.
+            segment_dir = os.path.join(self.dir, SEGMENT_DIR)
+            if os.path.isdir(segment_dir):
+                for f in os.listdir(segment_dir):
+                    name = segment_name(f)
+                    if name is not None and name not in referenced:
+                        remove_segment(self.dir, name)
+
+            # Remove remap tables that no retained segment needs to be translated with.
+            remap_dir = os.path.join(self.dir, REMAP_DIR)
+            if os.path.isdir(remap_dir):
+                for f in os.listdir(remap_dir):
+                    if f.endswith(REMAP_EXT) and int(f[:-len(REMAP_EXT)]) <= generation:
+                        os.remove(os.path.join(remap_dir, f))
+
+    def _publish(self):
+        """
+        Write the metadata of the current version, update the manifest and swap in the
+        streamed corpus. Must be called with the lock held.
+        """
+        meta = {
+            "segments": self.segments,
+            "tombstones": self.tombstones,
+            "generation": self.generation,
+            "dedup_rows": self.dedup_rows,
+            "wal_seq": self.wal_seq,
+        }
+        write_json(self._version_path(), meta)
+        self.mm = self._segmented_corpus()
+        meta.update({"version": self.version, "num_docs": len(self.mm), "num_terms": self.num_terms})
+        write_json(self._manifest_path(), meta)
+
+    def _schedule_merge(self):
+        """
+        Start a merge if the merge policy requires one and no merge is running.
+        """
+        with self._lock:
+            if find_merge(self.segments, self.merge_factor) is None:
+                return
+            if self._merger is not None and self._merger.is_alive():
+                return
+            if self._error is not None:
+                return
+            if self.background_merge:
+                self._merger = threading.Thread(target=self._run_merger, daemon=True)
+                self._merger.start()
+                return
+        self.merge()
+
+    def _run_merger(self):
+        """
+        Run merges in the background, recording any error so that it is raised by the
+        next call to add_documents() or close().
+        """
+        try:
+            self.merge()
+        except Exception as e:
+            self._error = e
+
+    def merge(self):
+        """
+        Merge segments according to the size-tiered merge policy until no further
+        merges are required. The current version is updated to refer to the merged
+        segments; the merged-away segments are removed once no retained version refers
+        to them. If a merge fails then its partially written segment is removed.
+        """
+        while True:
+            with self._lock:
+                span = find_merge(self.segments, self.merge_factor)
+                if span is None:
+                    return
+                sources = self.segments[span[0]:span[1]]
+                remaps = self._remaps(sources)
+                generation = self.generation
+                name = self._reserve_segment()
+
+            published = False
+            try:
+                merged = merge_segments(self.dir, name, sources, remaps=remaps, generation=generation)
+                with self._lock:
+                    # Segments are only appended while a merge is running, so the
+                    # sources are still adjacent in the segment list unless the corpus
+                    # was reloaded.
+                    start = self.segments.index(sources[0]) if sources[0] in self.segments else -1
+                    if start < 0 or self.segments[start:start + len(sources)] != sources:
+                        return
+                    self.segments[start:start + len(sources)] = [merged]
+
+                    # Move the tombstones and index entries of the sources to the
+                    # merged segment.
+                    tombstones = []
+                    base = 0
+                    for source in sources:
+                        tombstones.extend(base + offset for offset in self.tombstones.pop(source["name"], []))
+                        if self._index is not None and source.get("ids", False):
+                            for offset, id in enumerate(read_ids(self.dir, source)):
+                                if id is not None and self._index.get(id) == (source["name"], offset):
+                                    self._index[id] = (merged["name"], base + offset)
+                        base += source["num_docs"]
+                    if len(tombstones) > 0:
+                        self.tombstones[merged["name"]] = tombstones
+                    self._publish()
+                    published = True
+            finally:
+                with self._lock:
+                    self._pending.discard(name)
+                    if not published:
+                        remove_segment(self.dir, name)
+
+    def _id_index(self):
+        """
+        Return the id -> (segment, offset) index of the live documents in the
+        segments, building it from the ids stored with the segments if necessary.
+        Must be called with the lock held.
+        """
+        if self._index is None:
+            self._index = {}
+            for segment in self.segments:
+                if not segment.get("ids", False):
+                    continue
+                deleted = set(self.tombstones.get(segment["name"], []))
+                for offset, id in enumerate(read_ids(self.dir, segment)):
+                    if id is not None and offset not in deleted:
+                        self._index[id] = (segment["name"], offset)
+        return self._index
+
+    def _add_to_index(self, segment):
+        """
+        Index the ids of a newly added segment, marking any documents they replace as
+        deleted. Must be called with the lock held.
+        """
+        if self._index is None or not segment.get("ids", False):
+            return
+        for offset, id in enumerate(read_ids(self.dir, segment)):
+            if id is None:
+                continue
+            replaced = self._index.get(id)
+            if replaced is not None:
+                self.tombstones.setdefault(replaced[0], []).append(replaced[1])
+            self._index[id] = (segment["name"], offset)
+
+    def _checkpoint_dictionary(self):
+        """
+        Return the dictionary that matches the checkpointed state of the corpus.
+        """
+        if self.use_wal:
+            return self._shadow
+        return self.dictionary
+
+    def get_document(self, id):
+        """
+        Return the BoW document with the given external id, or None if there is no
+        such document.
+        """
+        if self.dictionary is None or self.mm is None:
+            self.load()
+        with self._lock:
+            for _, record, bows in reversed(self._records):
+                ids = record.get("ids", [])
+                if id in ids:
+                    return bows[len(ids) - 1 - ids[::-1].index(id)]
+            location = self._id_index().get(id)
+            mm = self.mm
+        if location is None:
+            return None
+        return mm.document(*location)
+
+    def delete(self, ids):
+        """
+        Delete the documents with the given external ids by writing tombstones in a
+        new version. The rows are physically removed by compact(). Returns the number
+        of documents deleted. When the write-ahead log is enabled, logged documents are
+        checkpointed first so that they can be deleted.
+        """
+        if self.dictionary is None or self.mm is None:
+            self.load()
+        self._writable_dictionary()
+        with self._checkpoint_lock:
+            if self.use_wal:
+                self.checkpoint()
+            deleted = 0
+            with self._lock:
+                index = self._id_index()
+                for id in ids:
+                    location = index.pop(id, None)
+                    if location is not None:
+                        self.tombstones.setdefault(location[0], []).append(location[1])
+                        deleted += 1
+            if deleted > 0:
+                self._checkpoint(self._checkpoint_dictionary(), None, None)
+        return deleted
+
+    def compact(self):
+        """
+        Rewrite the segments that contain deleted documents without them and subtract
+        the deleted documents from the dictionary statistics, then checkpoint the
+        result. Returns the number of documents removed.
+        """
+        if self.dictionary is None or self.mm is None:
+            self.load()
+        self._writable_dictionary()
+        with self._checkpoint_lock:
+            if self.use_wal:
+                self.checkpoint()
+
+            # Merges replace segments, so wait for any running merge to complete. New
+            # merges are only scheduled after a checkpoint, which cannot happen while
+            # the checkpoint lock is held.
+            if self._merger is not None:
+                self._merger.join()
+
+            with self._lock:
+                targets = [(s, set(self.tombstones[s["name"]])) for s in self.segments if s["name"] in self.tombstones]
+                remaps = self._remaps(s for s, _ in targets)
+            if len(targets) == 0:
+                return 0
+
+            compacted = {}
+            reserved = []
+            removed = 0
+            unused = set()
+            dictionaries = [self.dictionary] if not self.use_wal else [self.dictionary, self._shadow]
+            for segment, deleted in targets:
+                reserved.append(self._reserve_segment())
+                compacted[segment["name"]], rows = compact_segment(
+                    self.dir, reserved[-1], segment, deleted, remap=remaps.get(segment["name"]), generation=self.generation
+                )
+                for dictionary in dictionaries:
+                    unused.update(self._remove_documents(dictionary, rows))
+                removed += len(rows)
+
+            with self._lock:
+                segments = []
+                for segment in self.segments:
+                    if segment["name"] not in compacted:
+                        segments.append(segment)
+                        continue
+                    del self.tombstones[segment["name"]]
+                    if compacted[segment["name"]] is not None:
+                        segments.append(compacted[segment["name"]])
+                self.segments = segments
+                self._pending.difference_update(reserved)
+                self._index = None
+
+                # Tokens that no longer occur in the corpus are removed from the
+                # dictionary in a new generation, like pruned tokens, so that the
+                # dictionary has no tokens without statistics. Logged documents are
+                # checkpointed first since they were converted with the current ids.
+                if not self.hash_dictionary and len(unused) > 0:
+                    if self.use_wal:
+                        self.checkpoint()
+                    unused = [id for id in unused if id not in self.dictionary.dfs]
+                    if len(unused) > 0:
+                        self._start_generation(remove_tokens(self.dictionary, unused))
+            self._checkpoint(self._checkpoint_dictionary(), None, None)
+        return removed
+
+    def _remove_documents(self, dictionary, bows):
+        """
+        Subtract the BoW documents from the document and collection frequencies of the
+        dictionary and return the ids of the tokens that no longer occur in any
+        document. Sketches cannot be decremented by hashed id, so only the document
+        statistics of a SketchDictionary are updated.
+        """
+        dfs = getattr(dictionary, "dfs", None)
+        cfs = getattr(dictionary, "cfs", None)
+        unused = set()
+        for bow in bows:
+            dictionary.num_docs -= 1
+            dictionary.num_nnz -= len(bow)
+            for id, count in bow:
+                dictionary.num_pos -= int(count)
+                for stats, value in [(dfs, 1), (cfs, int(count))]:
+                    if stats is None or id not in stats:
+                        continue
+                    stats[id] -= value
+                    if stats[id] <= 0:
+                        del stats[id]
+                        if stats is dfs:
+                            unused.add(id)
+        return unused
+
+    def prune(self, no_below=5, no_above=0.5, keep_n=100000, keep_tokens=None):
+        """
+        Remove tokens that appear in fewer than no_below documents or in more than the
+        no_above fraction of documents, keeping at most the keep_n most frequent tokens
+        (see Dictionary.filter_extremes), and checkpoint the pruned dictionary as a new
+        version. Stored segments are not rewritten: the old -> new id remap table is
+        saved and applied as older segments are read, merged or compacted. Returns the
+        number of tokens removed.
+
+        When the write-ahead log is enabled, logged documents are checkpointed first and
+        ingestion is blocked until the pruned dictionary has been checkpointed.
+        """
+        if self.hash_dictionary:
+            raise ValueError("a HashDictionary cannot be pruned.")
+        if self.dictionary is None or self.mm is None:
+            self.load()
+        self._writable_dictionary()
+        with self._checkpoint_lock, self._lock:
+            if self.use_wal:
+                self.checkpoint()
+            remap = prune_dictionary(self.dictionary, no_below=no_below, no_above=no_above, keep_n=keep_n, keep_tokens=keep_tokens)
+            self._start_generation(remap)
+            self._checkpoint(self._checkpoint_dictionary(), None, None)
+        return int((remap == DROPPED).sum())
+
+    def _start_generation(self, remap):
+        """
+        Start a new dictionary generation after the token ids of the dictionary were
+        changed with the given old -> new id remap table. Must be called with the
+        checkpoint lock and the lock held.
+        """
+        if self.use_wal:
+            self._shadow = copy.deepcopy(self.dictionary)
+
+        # The remap table must be durable before a version refers to the generation.
+        os.makedirs(os.path.join(self.dir, REMAP_DIR), exist_ok=True)
+        write_remap(self._remap_path(self.generation + 1), remap)
+        self.generation += 1
+
+    def to_csr(self):
+        """
+        Return the current corpus as a documents x terms scipy.sparse.csr_matrix.
+        """
+        if self.dictionary is None or self.mm is None:
+            self.load()
+        return self.mm.to_csr(len(self.dictionary))
+
+    def _write_vocab(self):
+        """
+        Write the vocabulary arrays of the current version if its checkpoint skipped
+        them.
+        """
+        with self._checkpoint_lock:
+            if self.hash_dictionary or self.version == 0 or has_vocab(self._vocab_path()):
+                return
+            write_vocab(self._vocab_path(), self._checkpoint_dictionary())
+
+    def close(self):
+        """
+        Checkpoint any logged documents, stop the background checkpoint worker, wait
+        for any background merges to complete and write the vocabulary arrays of the
+        current version.
+        """
+        checkpointer = self._checkpointer
+        if checkpointer is not None:
+            self._closing = True
+            self._trigger.set()
+            checkpointer.join()
+            self._checkpointer = None
+            self._closing = False
+        if self.wal is not None:
+            self.checkpoint()
+            self.wal.close()
+        merger = self._merger
+        if merger is not None:
+            merger.join()
+        self._raise_error()
+        self._write_vocab()
@@ -0,0 +1,209 @@
+import os
+import hashlib
+import numpy as np
+
+from src.storage.files import read_json, write_json
+
+META_NAME = "meta.json"
+SIGNATURES_NAME = "signatures.bin"
+
+SIGNATURE_DTYPE = np.uint32
+
+# The smallest prime larger than the 32-bit shingle hashes, for the permutations.
+PRIME = np.uint64((1 << 32) + 15)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+def shingles(document, size):
+    """
+    Return the set of word n-gram shingles of the tokenized document. Documents with
+    fewer tokens than the shingle size are a single shingle.
+    """
+    if len(document) == 0:
+        return set()
+    if len(document) < size:
+        return {" ".join(document)}
+    return {" ".join(document[i:i + size]) for i in range(len(document) - size + 1)}
+
+def optimal_bands(threshold, num_perm):
+    """
+    Return the (bands, rows) split of num_perm minhashes that minimizes the sum of the
+    false positive and false negative probability mass of the LSH candidate curve,
+    P(s) = 1 - (1 - s^rows)^bands, on either side of the Jaccard threshold.
+    """
+    similarity = np.linspace(0, 1, 1001)
+    step = similarity[1] - similarity[0]
+    below = similarity < threshold
+    best = None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            probability = 1 - (1 - similarity ** rows) ** bands
+            error = (probability[below].sum() + (1 - probability[~below]).sum()) * step
+            if best is None or error < best[0]:
+                best = (error, bands, rows)
+    return best[1], best[2]
+
+class MinHashLSH():
+    """
+    MinHashLSH is an incrementally updatable index of MinHash signatures of tokenized
+    documents used to detect near-duplicates. The Jaccard similarity of the word
+    shingles of two documents is estimated by the fraction of equal minhashes in
+    their signatures, and locality sensitive hashing over bands of the signatures
+    finds candidate matches without comparing against every indexed document.
+
+    Signatures are appended to a flat binary file in the index directory so that the
+    index can be persisted incrementally; the band hash tables are rebuilt on load.
+    The number of queries, duplicates found and LSH candidates checked are counted
+    for monitoring the hit rate.
+    """
+    def __init__(self, threshold=0.8, num_perm=128, shingle_size=3, seed=1):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1].")
+        if num_perm < 1 or shingle_size < 1:
+            raise ValueError("num_perm and shingle_size must be positive.")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+
+        self.signatures = np.zeros((16, num_perm), dtype=SIGNATURE_DTYPE)
+        self.num_rows = 0
+        self.saved_rows = 0
+        self.tables = [{} for _ in range(self.bands)]
+        self.queries = 0
+        self.duplicates = 0
+        self.candidates = 0
+
+    def signature(self, document):
+        """
+        Return the MinHash signature of the tokenized document, or None if it is
+        empty.
+        """
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+            for s in shingles(document, self.shingle_size)
+        ]
+        if len(hashes) == 0:
+            return None
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        permuted = (self.a[:, None] * hashes[None, :] + self.b[:, None]) % PRIME
+        return (permuted.min(axis=1) & MAX_HASH).astype(SIGNATURE_DTYPE)
+
+    def _band_keys(self, signature):
+        for i in range(self.bands):
+            yield hash(signature[i * self.rows:(i + 1) * self.rows].tobytes())
+
+    def query(self, signature):
+        """
+        Return the row of the indexed signature most similar to the signature if its
+        estimated Jaccard similarity is at least the threshold, otherwise None.
+        """
+        self.queries += 1
+        if signature is None:
+            return None
+        candidates = set()
+        for table, key in zip(self.tables, self._band_keys(signature)):
+            candidates.update(table.get(key, ()))
+        if len(candidates) == 0:
+            return None
+        self.candidates += len(candidates)
+        candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarity = (self.signatures[candidates] == signature).mean(axis=1)
+        best = int(np.argmax(similarity))
+        if similarity[best] < self.threshold:
+            return None
+        self.duplicates += 1
+        return int(candidates[best])
+
+    def insert(self, signature):
+        """
+        Add the signature to the index and return its row.
+        """
+        if self.num_rows == len(self.signatures):
+            grown = np.zeros((2 * len(self.signatures), self.num_perm), dtype=SIGNATURE_DTYPE)
+            grown[:self.num_rows] = self.signatures[:self.num_rows]
+            self.signatures = grown
+        row = self.num_rows
+        self.signatures[row] = signature
+        self.num_rows += 1
+        for table, key in zip(self.tables, self._band_keys(signature)):
+            table.setdefault(key, []).append(row)
+        return row
+
+    @property
+    def hit_rate(self):
+        """
+        The fraction of queried documents that were near-duplicates.
+        """
+        if self.queries == 0:
+            return 0.0
+        return self.duplicates / self.queries
+
+    def stats(self):
+        """
+        Return the query, duplicate and candidate counters and the hit rate.
+        """
+        return {
+            "queries": self.queries,
+            "duplicates": self.duplicates,
+            "candidates": self.candidates,
+            "hit_rate": self.hit_rate,
+            "indexed": self.num_rows,
+        }
+
+    def save(self, path, num_rows=None):
+        """
+        Durably append the signatures that have not been saved yet, up to num_rows
+        (default: all of them), to the index directory at the path.
+        """
+        if num_rows is None:
+            num_rows = self.num_rows
+        os.makedirs(path, exist_ok=True)
+        meta_path = os.path.join(path, META_NAME)
+        if read_json(meta_path) is None:
+            write_json(meta_path, {
+                "threshold": self.threshold,
+                "num_perm": self.num_perm,
+                "shingle_size": self.shingle_size,
+                "seed": self.seed,
+            })
+        if num_rows <= self.saved_rows:
+            return
+        with open(os.path.join(path, SIGNATURES_NAME), 'ab') as f:
+            # Discard any signatures appended after the last save that were not
+            # checkpointed (e.g., before a crash).
+            f.truncate(self.saved_rows * self.num_perm * np.dtype(SIGNATURE_DTYPE).itemsize)
+            f.write(self.signatures[self.saved_rows:num_rows].tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self.saved_rows = num_rows
+
+    @classmethod
+    def load(cls, path, num_rows, threshold=None):
+        """
+        Load an index saved to the path with its first num_rows signatures; any later
+        signatures (e.g., appended before a crash) are overwritten by the next save.
+        The threshold can be changed on load since it does not affect the signatures.
+        """
+        meta = read_json(os.path.join(path, META_NAME))
+        if meta is None:
+            raise ValueError("no minhash index found at " + str(path))
+        index = cls(
+            threshold=meta["threshold"] if threshold is None else threshold,
+            num_perm=meta["num_perm"],
+            shingle_size=meta["shingle_size"],
+            seed=meta["seed"],
+        )
+        signatures_path = os.path.join(path, SIGNATURES_NAME)
+        if num_rows > 0:
+            signatures = np.fromfile(signatures_path, dtype=SIGNATURE_DTYPE, count=num_rows * index.num_perm)
+            if len(signatures) < num_rows * index.num_perm:
+                raise ValueError("minhash index at " + str(path) + " is missing signatures")
+            for signature in signatures.reshape(num_rows, index.num_perm):
+                index.insert(signature)
+        index.saved_rows = num_rows
+        return index
@@ -0,0 +1,103 @@
+from collections import defaultdict
+
+from src.parallel import chunked, ordered_map
+
+def count_chunk(documents):
+    """
+    Build a partial vocabulary for a chunk of tokenized documents. This runs in a
+    worker process. Local token ids are assigned in the order the tokens first appear
+    in the chunk. Returns a dict with the new tokens of each document (sorted, the
+    local vocabulary is their concatenation), the documents in BoW format using local
+    ids, and the chunk's dfs, cfs, num_pos and num_nnz by local id so that the
+    statistics are merged once per chunk rather than once per document.
+    """
+    token2id = {}
+    missing = []
+    bows = []
+    dfs = []
+    cfs = []
+    num_pos = 0
+    for document in documents:
+        if isinstance(document, str):
+            raise TypeError("doc2bow expects an array of unicode tokens on input, not a single string")
+        counter = defaultdict(int)
+        for w in document:
+            counter[w if isinstance(w, str) else str(w, 'utf-8')] += 1
+        new_tokens = sorted(w for w in counter if w not in token2id)
+        for w in new_tokens:
+            token2id[w] = len(token2id)
+            dfs.append(0)
+            cfs.append(0)
+        bow = []
+        for w, freq in counter.items():
+            id = token2id[w]
+            dfs[id] += 1
+            cfs[id] += freq
+            num_pos += freq
+            bow.append((id, freq))
+        missing.append(new_tokens)
+        bows.append(bow)
+    return {
+        "missing": missing,
+        "bows": bows,
+        "dfs": dfs,
+        "cfs": cfs,
+        "num_pos": num_pos,
+        "num_nnz": sum(len(bow) for bow in bows),
+    }
+
+def merge_chunk(dictionary, chunk):
+    """
+    Merge the partial vocabulary of a chunk into the dictionary and return a list of
+    (bow, missing) for each document of the chunk, where missing is the list of
+    (token, id) pairs added to the dictionary by the document. Chunks must be merged
+    in stream order; new tokens are then assigned ids and the statistics are updated
+    exactly as if Dictionary.doc2bow(allow_update=True) had been called serially.
+    """
+    token2id = dictionary.token2id
+    local2global = []
+    results = []
+    for new_tokens, local_bow in zip(chunk["missing"], chunk["bows"]):
+        missing = []
+        for w in new_tokens:
+            if w not in token2id:
+                token2id[w] = len(token2id)
+                missing.append((w, token2id[w]))
+            local2global.append(token2id[w])
+        results.append((sorted([(local2global[id], freq) for id, freq in local_bow]), missing))
+
+    dfs, cfs = dictionary.dfs, dictionary.cfs
+    for id, df, cf in zip(local2global, chunk["dfs"], chunk["cfs"]):
+        dfs[id] = dfs.get(id, 0) + df
+        cfs[id] = cfs.get(id, 0) + cf
+    dictionary.num_docs += len(results)
+    dictionary.num_pos += chunk["num_pos"]
+    dictionary.num_nnz += chunk["num_nnz"]
+    return results
+
+def serial_doc2bow(dictionary, documents):
+    """
+    Convert the documents to BoW, updating the dictionary, and return a generator of
+    (bow, missing) for each document in the same form as parallel_doc2bow().
+    """
+    token2id = dictionary.token2id
+    for document in documents:
+        bow, missing = dictionary.doc2bow(document, allow_update=True, return_missing=True)
+        yield bow, [(w, token2id[w]) for w in sorted(missing)]
+
+def parallel_doc2bow(dictionary, documents, workers=2, chunksize=1000):
+    """
+    Convert a stream of documents to BoW, updating the gensim Dictionary, using a pool
+    of worker processes. Workers count tokens and build local vocabularies for chunks
+    of the stream, which are merged into the dictionary in order in this process, so
+    the resulting token ids, dfs, cfs, num_docs, num_pos and num_nnz are identical to
+    the serial path. Returns a generator of (bow, missing) for each document, see
+    merge_chunk().
+    """
+    if workers < 2:
+        for result in serial_doc2bow(dictionary, documents):
+            yield result
+        return
+    for results in ordered_map(count_chunk, chunked(documents, chunksize), workers):
+        for result in merge_chunk(dictionary, results):
+            yield result
@@ -0,0 +1,86 @@
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+
+# Remap tables store the new id of each old id, or DROPPED if the token was pruned.
+REMAP_DTYPE = np.int64
+DROPPED = -1
+
+def _remap_table(old_ids, dictionary):
+    """
+    Return the old -> new id remap table from the token -> id mapping of a dictionary
+    before it was filtered to its current ids.
+    """
+    remap = np.full(max(old_ids.values(), default=-1) + 1, DROPPED, dtype=REMAP_DTYPE)
+    for token, id in dictionary.token2id.items():
+        remap[old_ids[token]] = id
+    return remap
+
+def prune_dictionary(dictionary, no_below=5, no_above=0.5, keep_n=100000, keep_tokens=None):
+    """
+    Prune the dictionary in place with Dictionary.filter_extremes() and return the
+    old -> new id remap table. Pruning compacts the token ids, so the table is needed
+    to translate documents that were converted to BoW before the pruning.
+    """
+    old_ids = dict(dictionary.token2id)
+    dictionary.filter_extremes(no_below=no_below, no_above=no_above, keep_n=keep_n, keep_tokens=keep_tokens)
+    return _remap_table(old_ids, dictionary)
+
+def remove_tokens(dictionary, bad_ids):
+    """
+    Remove the tokens with the given ids from the dictionary in place with
+    Dictionary.filter_tokens() and return the old -> new id remap table.
+    """
+    old_ids = dict(dictionary.token2id)
+    dictionary.filter_tokens(bad_ids=bad_ids)
+    return _remap_table(old_ids, dictionary)
+
+def compose_remaps(first, second):
+    """
+    Return the remap table equivalent to applying the first remap and then the
+    second.
+    """
+    kept = first != DROPPED
+    composed = np.full(len(first), DROPPED, dtype=REMAP_DTYPE)
+    composed[kept] = second[first[kept]]
+    return composed
+
+def remap_document(document, remap):
+    """
+    Translate a BoW document with the remap table, dropping pruned tokens. Pruning
+    preserves the relative order of the remaining ids, so the result stays sorted.
+    """
+    result = []
+    for id, count in document:
+        id = remap[id]
+        if id != DROPPED:
+            result.append((int(id), count))
+    return result
+
+def remap_matrix(matrix, remap, num_terms):
+    """
+    Translate the columns of a documents x terms csr_matrix with the remap table,
+    returning a matrix with num_terms columns.
+    """
+    kept = np.flatnonzero(remap != DROPPED)
+    projection = csr_matrix(
+        (np.ones(len(kept), dtype=matrix.dtype), (kept, remap[kept])), shape=(len(remap), num_terms)
+    )
+    return (matrix[:, :len(remap)] @ projection).tocsr()
+
+def write_remap(path, remap):
+    """
+    Atomically write the remap table to the path as a flat binary array.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(np.asarray(remap, dtype=REMAP_DTYPE).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def read_remap(path):
+    """
+    Read a remap table written by write_remap().
+    """
+    return np.fromfile(path, dtype=REMAP_DTYPE)
@@ -0,0 +1,256 @@
+import heapq
+import math
+import zlib
+import hashlib
+import numpy as np
+from collections import Counter
+from gensim import utils
+
+# Estimated bytes used per token tracked by the heavy hitters (the token string, its
+# counters and the dict and heap entries), used to divide up the memory budget.
+TRACKED_TOKEN_BYTES = 256
+
+class CountMinSketch():
+    """
+    CountMinSketch estimates the counts of a stream of keys in a fixed depth x width
+    array of counters. Each key is counted in one hashed column per row and its count
+    is estimated as the minimum of those counters, which is never an underestimate.
+    With conservative updates the estimate of a key with true count f satisfies
+    f <= estimate <= f + epsilon * total with probability at least 1 - delta, where
+    epsilon = e / width, delta = exp(-depth) and total is the sum of all counts.
+    """
+    def __init__(self, width, depth):
+        if width < 1 or depth < 1:
+            raise ValueError("width and depth must be positive.")
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.counts = np.zeros((depth, width), dtype=np.int64)
+        self.rows = np.arange(depth, dtype=np.uint64)[:, None]
+
+    def _columns(self, hashes):
+        """
+        Return the depth x len(hashes) columns of the hashed keys. The row hashes are
+        derived from two halves of a 64-bit hash (Kirsch-Mitzenmacher).
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        h1 = hashes & np.uint64(0xffffffff)
+        h2 = hashes >> np.uint64(32)
+        return ((h1[None, :] + self.rows * h2[None, :]) % np.uint64(self.width)).astype(np.int64)
+
+    def update(self, hashes, counts):
+        """
+        Add the counts of the keys with the given hashes.
+        """
+        if len(hashes) == 0:
+            return
+        columns = self._columns(hashes)
+        rows = np.broadcast_to(np.arange(self.depth)[:, None], columns.shape)
+        counts = np.asarray(counts, dtype=np.int64)
+        target = self.counts[rows, columns].min(axis=0) + counts
+        np.maximum.at(self.counts, (rows, columns), np.broadcast_to(target, columns.shape))
+        self.total += int(counts.sum())
+
+    def estimate(self, hashes):
+        """
+        Return the estimated counts of the keys with the given hashes.
+        """
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        columns = self._columns(hashes)
+        return self.counts[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def cardinality(self):
+        """
+        Estimate the number of distinct keys counted with linear counting on the first
+        row. The estimate saturates once every column of the row is occupied.
+        """
+        empty = int(np.count_nonzero(self.counts[0] == 0))
+        return self.width * math.log(self.width / max(empty, 1))
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+class SpaceSaving():
+    """
+    SpaceSaving tracks the approximate top-k most frequent keys of a stream in space
+    proportional to k. When an untracked key arrives and all k slots are taken it
+    replaces the key with the minimum count and inherits that count as its error.
+    Every key with a true count greater than total / k is tracked, and the count of a
+    tracked key overestimates its true count by at most its error <= total / k.
+    """
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be positive.")
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        self._heap = []
+
+    def update(self, key, count=1):
+        """
+        Add the count of the key.
+        """
+        self.total += count
+        if key in self.counts:
+            self.counts[key] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+        else:
+            # The heap holds stale entries for keys whose counts have increased, so
+            # pop until an entry matches the current count of its key.
+            while True:
+                minimum, evicted = heapq.heappop(self._heap)
+                if self.counts.get(evicted) == minimum:
+                    break
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self.counts[key] = minimum + count
+            self.errors[key] = minimum
+        heapq.heappush(self._heap, (self.counts[key], key))
+        if len(self._heap) > 2 * self.capacity:
+            self._heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def most_common(self, n=None):
+        """
+        Return the n tracked keys with the highest counts as (key, count) pairs.
+        """
+        items = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        return items if n is None else items[:n]
+
+    @property
+    def max_error(self):
+        return self.total / self.capacity
+
+class SketchDictionary(utils.SaveLoad):
+    """
+    SketchDictionary is a bounded memory alternative to gensim's HashDictionary for
+    unbounded streams. Tokens are mapped to ids by hashing them into id_range buckets
+    exactly as HashDictionary does, so no token -> id mapping is stored. Collection
+    and document frequencies are estimated per token by count-min sketches and the
+    most frequent token strings are tracked by a space-saving heavy hitters summary,
+    all sized to fit the memory budget (in bytes) at construction; memory does not
+    grow with the stream. The num_docs, num_pos and num_nnz statistics are exact;
+    like HashDictionary, num_nnz counts the hashed ids of each document, so that it
+    can be decremented from the BoW documents when they are removed from a corpus.
+
+    Error bounds: cf(token) and df(token) never underestimate and, with probability
+    at least 1 - delta, overestimate by at most epsilon times the total number of
+    token occurrences and of (document, token) pairs counted by the sketches, where
+    epsilon = e / width and delta = exp(-depth) (see error_bounds()). The sketches
+    cannot be decremented, so these totals include removed documents. most_common()
+    is guaranteed to include every token whose count exceeds num_pos / top_k, and
+    overestimates counts by at most num_pos / top_k.
+    """
+    def __init__(self, documents=None, memory=2**24, id_range=32000, depth=5, top_k=None, myhash=zlib.adler32):
+        if top_k is None:
+            top_k = memory // 4 // TRACKED_TOKEN_BYTES
+        width = (memory - top_k * TRACKED_TOKEN_BYTES) // (2 * depth * np.dtype(np.int64).itemsize)
+        if top_k < 1 or width < 1:
+            raise ValueError("memory budget is too small for the sketch.")
+        self.memory = memory
+        self.id_range = id_range
+        self.myhash = myhash
+        self.num_docs = 0
+        self.num_pos = 0
+        self.num_nnz = 0
+        self.cf_sketch = CountMinSketch(width, depth)
+        self.df_sketch = CountMinSketch(width, depth)
+        self.heavy_hitters = SpaceSaving(top_k)
+        if documents is not None:
+            self.add_documents(documents)
+
+    @staticmethod
+    def _token_hash(token):
+        return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+    def restricted_hash(self, token):
+        """
+        Return the id of the token, in the same way as HashDictionary.
+        """
+        return self.myhash(utils.to_utf8(token)) % self.id_range
+
+    def __getitem__(self, id):
+        raise KeyError("SketchDictionary does not store id -> token mappings.")
+
+    def __len__(self):
+        return self.id_range
+
+    def keys(self):
+        return range(len(self))
+
+    def add_documents(self, documents):
+        """
+        Update the statistics from a stream of tokenized documents.
+        """
+        for document in documents:
+            self.doc2bow(document, allow_update=True)
+
+    def doc2bow(self, document, allow_update=False):
+        """
+        Convert a document into BoW format using hashed token ids, updating the
+        statistics if allow_update is True.
+        """
+        if isinstance(document, str):
+            raise TypeError("doc2bow expects an array of unicode tokens on input, not a single string")
+        counter = Counter(w if isinstance(w, str) else str(w, 'utf-8') for w in document)
+        result = Counter()
+        for token, freq in counter.items():
+            result[self.restricted_hash(token)] += freq
+
+        if allow_update:
+            hashes = [self._token_hash(token) for token in counter]
+            self.cf_sketch.update(hashes, list(counter.values()))
+            self.df_sketch.update(hashes, [1] * len(hashes))
+            for token, freq in counter.items():
+                self.heavy_hitters.update(token, freq)
+            self.num_docs += 1
+            self.num_pos += sum(counter.values())
+            self.num_nnz += len(result)
+        return sorted(result.items())
+
+    def cf(self, token):
+        """
+        Return the estimated number of occurrences of the token in the corpus.
+        """
+        return int(self.cf_sketch.estimate([self._token_hash(token)])[0])
+
+    def df(self, token):
+        """
+        Return the estimated number of documents the token appears in.
+        """
+        return int(self.df_sketch.estimate([self._token_hash(token)])[0])
+
+    def most_common(self, n=None):
+        """
+        Return the approximate n most frequent tokens as (token, count) pairs.
+        """
+        return self.heavy_hitters.most_common(n)
+
+    def num_unique(self):
+        """
+        Estimate the number of distinct tokens in the corpus.
+        """
+        return int(round(self.cf_sketch.cardinality()))
+
+    def error_bounds(self):
+        """
+        Return the error bounds of the estimates: cf and df estimates exceed the true
+        counts by at most cf_error and df_error with probability at least 1 - delta,
+        and most_common() counts exceed the true counts by at most top_k_error.
+        """
+        return {
+            "epsilon": self.cf_sketch.epsilon,
+            "delta": self.cf_sketch.delta,
+            "cf_error": self.cf_sketch.epsilon * self.cf_sketch.total,
+            "df_error": self.df_sketch.epsilon * self.df_sketch.total,
+            "top_k_error": self.heavy_hitters.max_error,
+        }
@@ -0,0 +1,43 @@
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+def chunked(iterable, chunksize):
+    """
+    Return a generator of lists of up to chunksize consecutive items from the iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunksize))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+def ordered_map(func, items, workers, max_in_flight=None, executor=None):
+    """
+    Apply func to each item in a pool of worker processes and return a generator of
+    the results in input order. Unlike Executor.map, items are only read from the
+    input as results are consumed, so at most max_in_flight items (default: twice the
+    number of workers) are queued or being processed at any time and memory stays
+    bounded on unbounded streams. func must be picklable (e.g., a module-level
+    function). An existing executor can be passed in to avoid starting a new pool.
+    """
+    if max_in_flight is None:
+        max_in_flight = 2 * workers
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1.")
+
+    pool = executor if executor is not None else ProcessPoolExecutor(max_workers=workers)
+    futures = deque()
+    try:
+        for item in items:
+            futures.append(pool.submit(func, item))
+            if len(futures) >= max_in_flight:
+                yield futures.popleft().result()
+        while len(futures) > 0:
+            yield futures.popleft().result()
+    finally:
+        for future in futures:
+            future.cancel()
+        if executor is None:
+            pool.shutdown(wait=True)
@@ -0,0 +1,157 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+
+# Writes are committed in batches since the cache does not need to be durable; a
+# crash only loses the most recent entries.
+COMMIT_INTERVAL = 1000
+
+def content_hash(content, namespace=""):
+    """
+    Return the 16-byte hash of the content (a string or bytes) under the namespace,
+    which separates the results of different parse functions for the same content.
+    """
+    h = hashlib.blake2b(namespace.encode("utf-8"), digest_size=16)
+    h.update(b"\0")
+    h.update(content if isinstance(content, bytes) else content.encode("utf-8", "surrogatepass"))
+    return h.digest()
+
+class ParseCache():
+    """
+    ParseCache is a persistent SQLite cache of parse results (e.g., the extracted
+    text or token list of a document) keyed by the hash of the document content, so
+    that documents replayed from a reader (e.g., after resetting Kafka offsets or
+    re-running a directory import) are not parsed again. Values are stored as JSON.
+
+    The cache is bounded to max_bytes of stored values; when it is exceeded the least
+    recently used entries are evicted. The number of hits, misses and evictions are
+    counted for monitoring the hit rate. The cache can be shared between threads.
+    """
+    def __init__(self, path, max_bytes=2**30):
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be at least 1.")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._pending = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, used INTEGER NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+        self.db.commit()
+        size, used = self.db.execute("SELECT COALESCE(SUM(size), 0), COALESCE(MAX(used), 0) FROM entries").fetchone()
+        self.size = size
+        self._clock = used
+
+    def __len__(self):
+        with self._lock:
+            return self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def _written(self):
+        self._pending += 1
+        if self._pending >= COMMIT_INTERVAL:
+            self.db.commit()
+            self._pending = 0
+
+    def get(self, key):
+        """
+        Return the cached value for the key, or None if it is not cached.
+        """
+        with self._lock:
+            row = self.db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute("UPDATE entries SET used = ? WHERE key = ?", (self._tick(), key))
+            self._written()
+            return json.loads(row[0])
+
+    def put(self, key, value):
+        """
+        Cache the value for the key, evicting the least recently used entries if the
+        cache is full. Values larger than the whole cache are not stored.
+        """
+        # Values are stored as UTF-8 JSON, so their size is measured in encoded bytes
+        # rather than characters.
+        value = json.dumps(value, ensure_ascii=False)
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            row = self.db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.size -= row[0]
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, used) VALUES (?, ?, ?, ?)",
+                (key, value, size, self._tick())
+            )
+            self.size += size
+            self._evict()
+            self._written()
+
+    def _evict(self):
+        """
+        Evict the least recently used entries until the cache fits in max_bytes.
+        """
+        while self.size > self.max_bytes:
+            rows = self.db.execute("SELECT key, size FROM entries ORDER BY used LIMIT 100").fetchall()
+            for key, size in rows:
+                if self.size <= self.max_bytes:
+                    break
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.size -= size
+                self.evictions += 1
+
+    @property
+    def hit_rate(self):
+        """
+        The fraction of lookups that were found in the cache.
+        """
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def stats(self):
+        """
+        Return the hit, miss and eviction counters, the hit rate and the size of the
+        cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+            "bytes": self.size,
+        }
+
+    def flush(self):
+        """
+        Commit any pending writes to the database.
+        """
+        with self._lock:
+            self.db.commit()
+            self._pending = 0
+
+    def close(self):
+        """
+        Commit any pending writes and close the database.
+        """
+        self.flush()
+        self.db.close()
@@ -1,38 +1,484 @@
+from src.parallel import chunked, ordered_map
+from src.parser.cache import content_hash
 from src.reader.reader import Reader
+from collections import deque
+from functools import partial
+import bs4
 from bs4 import BeautifulSoup
+from bs4.builder import HTMLParserTreeBuilder
+from bs4.dammit import EntitySubstitution, UnicodeDammit
+from html import unescape
+from html.parser import HTMLParser as EventParser
+import math
+import re
 
 TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'li']
 
+# The tree building rules of BeautifulSoup's html.parser builder, which the fast
+# extractor follows so that it finds the same text.
+_BUILDER = HTMLParserTreeBuilder()
+
+# Before bs4 4.15, the end of a <tag/> element crossed off an earlier redundant end
+# tag of a void element with the same name instead of closing the tag.
+_STARTEND_CHECKS_CLOSED = tuple(int(v) for v in bs4.__version__.split(".")[:2]) < (4, 15)
+
+# Strings made up of only these characters are collapsed by BeautifulSoup.
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+class _TextExtractor(EventParser):
+    """
+    Collects the text of the tags from the html.parser event stream without building
+    a tree. It tracks the stack of open tags exactly as BeautifulSoup does when it
+    builds the tree (unclosed tags stay open, end tags close every tag opened after
+    the most recent open tag of that name, void elements never contain anything, and
+    whitespace-only strings are collapsed outside of <pre> and <textarea>), and
+    appends each string to every open tag being extracted. Strings inside <script>,
+    <style> and other string container tags are not text, as in BeautifulSoup.
+    """
+    def __init__(self, tags):
+        super().__init__(convert_charrefs=False)
+        self.tags = set(tags)
+        self.texts = []
+        self.stack = []
+        self.open_counts = {}
+        self.extracting = []
+        self.preserve = 0
+        self.containers = 0
+        self.data = []
+        self.closed_empty = []
+        self.names = []
+        self.closed = []
+        self.sizes = []
+        self.link_sizes = []
+        self.links = 0
+
+    def _flush(self, text=True):
+        """
+        End the current string, adding it to the open tags being extracted unless
+        text is False (e.g., comments) or it is inside a string container.
+        """
+        if len(self.data) == 0:
+            return
+        data = "".join(self.data)
+        self.data = []
+        if self.preserve == 0 and data.strip(ASCII_SPACES) == "":
+            data = "\n" if "\n" in data else " "
+        if text and self.containers == 0:
+            for i in self.extracting:
+                self.texts[i].append(data)
+                self.sizes[i] += len(data)
+                if self.links > 0:
+                    self.link_sizes[i] += len(data)
+
+    def _push(self, tag):
+        index = None
+        if tag in self.tags:
+            index = len(self.texts)
+            self.texts.append([])
+            self.names.append(tag)
+            self.closed.append(False)
+            self.sizes.append(0)
+            self.link_sizes.append(0)
+            self.extracting.append(index)
+        if tag == "a":
+            self.links += 1
+        if tag in _BUILDER.preserve_whitespace_tags:
+            self.preserve += 1
+        if tag in _BUILDER.string_containers:
+            self.containers += 1
+        self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+        self.stack.append((tag, index))
+
+    def _pop(self):
+        tag, index = self.stack.pop()
+        if index is not None:
+            self.extracting.pop()
+            self.closed[index] = True
+        if tag == "a":
+            self.links -= 1
+        if tag in _BUILDER.preserve_whitespace_tags:
+            self.preserve -= 1
+        if tag in _BUILDER.string_containers:
+            self.containers -= 1
+        self.open_counts[tag] -= 1
+
+    def _end(self, tag):
+        self._flush()
+        while self.open_counts.get(tag, 0) > 0:
+            name, _ = self.stack[-1]
+            self._pop()
+            if name == tag:
+                break
+
+    def handle_starttag(self, tag, attrs, empty_element=True):
+        self._flush()
+        self._push(tag)
+        if empty_element and _BUILDER.can_be_empty_element(tag):
+            self._end(tag)
+            self.closed_empty.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, empty_element=False)
+        if _STARTEND_CHECKS_CLOSED:
+            self.handle_endtag(tag)
+        else:
+            self._end(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.closed_empty:
+            self.closed_empty.remove(tag)
+        else:
+            self._end(tag)
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_charref(self, name):
+        self.data.append(unescape("&#" + name + ";"))
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.data.append(character if character is not None else "&" + name)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith("CDATA["):
+            # CDATA sections are text even inside string containers.
+            self.data.append(data[len("CDATA["):])
+            containers, self.containers = self.containers, 0
+            self._flush()
+            self.containers = containers
+
+    def extract(self, html):
+        """
+        Return the text of each extracted tag, in document order.
+        """
+        self.feed(html)
+        self.close()
+        self._flush()
+        while len(self.stack) > 0:
+            self._pop()
+        return ["".join(text) for text in self.texts]
+
+def parse_text_fast(html):
+    """
+    Parse the same text from the provided HTML as parse_text(), in a single pass over
+    the html.parser event stream instead of building a BeautifulSoup tree. HTML that
+    is not a string (e.g., undecoded bytes) is parsed with BeautifulSoup.
+    """
+    if not isinstance(html, str):
+        return parse_text(html)
+    return " ".join(text.strip() for text in _TextExtractor(TAGS).extract(html)).strip()
+
+# HTML is fed to the lead extractor in chunks of this many characters, and the
+# budget is checked after each chunk.
+LEAD_CHUNK_SIZE = 4096
+
+# Default boilerplate thresholds: blocks with a larger fraction of their text inside
+# links, or non-heading blocks with fewer words per LINE_WIDTH characters, are
+# dropped (e.g., navigation, share buttons and comment counts).
+MAX_LINK_DENSITY = 0.33
+MIN_TEXT_DENSITY = 3
+LINE_WIDTH = 80
+
+HEADINGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+
+_TOKEN = re.compile(r"\S+")
+
+def _budget_cut(text, max_chars=None, max_tokens=None, final=False):
+    """
+    Return the index to cut the text at so that it fits the character and token
+    budgets, backing up to a word boundary, or None if it fits. Unless final is True
+    the text is a prefix of the final text, and None is also returned if the cut
+    depends on text that has not been parsed yet.
+    """
+    cut = None
+    bound = len(text)
+    if max_chars is not None:
+        if len(text) > max_chars:
+            cut = max_chars
+            while cut > 0 and not text[cut].isspace() and not text[cut - 1].isspace():
+                cut -= 1
+            if cut == 0:
+                cut = max_chars
+        elif not final:
+            # The final cut may back up to the start of the last, unfinished word.
+            while bound > 0 and not text[bound - 1].isspace():
+                bound -= 1
+    if max_tokens is not None:
+        match = None
+        for i, match in enumerate(_TOKEN.finditer(text)):
+            if i + 1 == max_tokens:
+                break
+        else:
+            match = None
+        if match is not None and (final or match.end() < len(text)):
+            cut = match.end() if cut is None else min(cut, match.end())
+    if cut is None or (not final and cut > bound):
+        return None
+    return cut
+
+class _LeadExtractor(_TextExtractor):
+    """
+    Extracts the leading text of the tags like _TextExtractor, but stops parsing as
+    soon as the text so far fills the character or token budget. If boilerplate is
+    True then blocks (extracted tags) are scored once they are closed, and blocks
+    with a link density (the fraction of their text inside links) above
+    max_link_density, or non-heading blocks with a text density (words per line of
+    LINE_WIDTH characters) below min_text_density, are dropped.
+    """
+    def __init__(self, tags, max_chars=None, max_tokens=None, boilerplate=False, max_link_density=MAX_LINK_DENSITY,
+                 min_text_density=MIN_TEXT_DENSITY):
+        super().__init__(tags)
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.boilerplate = boilerplate
+        self.max_link_density = max_link_density
+        self.min_text_density = min_text_density
+        self.lead = []
+        self.lead_size = 0
+        self.done = 0
+
+    def _keep(self, i):
+        """
+        Return the stripped text of the i-th block, or None if it is boilerplate.
+        """
+        text = "".join(self.texts[i]).strip()
+        if not self.boilerplate:
+            return text
+        if text == "" or self.link_sizes[i] > self.max_link_density * self.sizes[i]:
+            return None
+        if self.names[i] not in HEADINGS:
+            lines = math.ceil(len(text) / LINE_WIDTH)
+            if len(text.split()) / lines < self.min_text_density:
+                return None
+        return text
+
+    def _advance(self):
+        """
+        Add the blocks that have been closed, in document order, to the lead.
+        """
+        while self.done < len(self.texts) and self.closed[self.done]:
+            text = self._keep(self.done)
+            if text is not None:
+                self.lead.append(text)
+                self.lead_size += len(text) + 1
+            self.done += 1
+
+    def _full(self):
+        """
+        Return the leading text if it fills the budget, otherwise None.
+        """
+        self._advance()
+        size = self.lead_size
+        parts = list(self.lead)
+        if not self.boilerplate and self.done < len(self.texts):
+            # The text of the first open block can only grow at its end.
+            size += self.sizes[self.done]
+            parts.append("".join(self.texts[self.done]).lstrip())
+        if (self.max_chars is None or size <= self.max_chars) and (self.max_tokens is None or size <= self.max_tokens):
+            return None
+        text = " ".join(parts).lstrip()
+        cut = _budget_cut(text, self.max_chars, self.max_tokens)
+        if cut is None:
+            return None
+        return text[:cut].rstrip()
+
+    def extract(self, html):
+        """
+        Return the leading text of the extracted tags within the budget.
+        """
+        budget = self.max_chars is not None or self.max_tokens is not None
+        for start in range(0, len(html), LEAD_CHUNK_SIZE):
+            self.feed(html[start:start + LEAD_CHUNK_SIZE])
+            if budget:
+                text = self._full()
+                if text is not None:
+                    return text
+        self.close()
+        self._flush()
+        while len(self.stack) > 0:
+            self._pop()
+        self._advance()
+        text = " ".join(self.lead).strip()
+        cut = _budget_cut(text, self.max_chars, self.max_tokens, final=True)
+        return text if cut is None else text[:cut].rstrip()
+
+def parse_lead(html, max_chars=None, max_tokens=None, boilerplate=False, max_link_density=MAX_LINK_DENSITY,
+               min_text_density=MIN_TEXT_DENSITY):
+    """
+    Parse the leading text from the provided HTML, stopping as soon as it fills the
+    budget of max_chars characters or max_tokens whitespace separated tokens (cut at
+    a word boundary). Without boilerplate filtering the result is a prefix of
+    parse_text(). Most of the information in a news article is near the top, so
+    this skips the cost of parsing, converting and storing long tails such as
+    comment sections and footers. If boilerplate is True then link-heavy and
+    low text density blocks are dropped (see _LeadExtractor). Undecoded bytes (e.g.,
+    Kafka message values) are decoded like BeautifulSoup decodes them for
+    parse_text().
+    """
+    if isinstance(html, bytes):
+        html = UnicodeDammit(html, is_html=True).unicode_markup
+    if not isinstance(html, str):
+        raise TypeError("parse_lead expects an HTML string or bytes.")
+    extractor = _LeadExtractor(TAGS, max_chars=max_chars, max_tokens=max_tokens, boilerplate=boilerplate,
+                               max_link_density=max_link_density, min_text_density=min_text_density)
+    return extractor.extract(html)
+
+def parse_text(html):
+    """
+    Parse the text from the provided HTML. This is a module-level function so that it
+    can be sent to process pool workers. See parse_lead() to only parse the text near
+    the top of the document (e.g., for news articles).
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    text = ""
+    for tag in soup.find_all(TAGS):
+        text += tag.text.strip() + " "
+    return text.strip()
+
+def _parse_chunk(parse, documents):
+    """
+    Parse a chunk of HTML documents in a worker process, with None for each document
+    that fails to parse.
+    """
+    texts = []
+    for html in documents:
+        try:
+            texts.append(parse(html))
+        except Exception:
+            texts.append(None)
+    return texts
+
 class HTMLParser():
     """
-    HTMLParser parses text content from HTML files using the provided reader.
+    HTMLParser parses text content from HTML files using the provided reader. If fast
+    is True then the text is extracted with parse_text_fast(), which finds the same
+    text without building a BeautifulSoup tree for each document. If max_chars or
+    max_tokens is set, or boilerplate is True, then only the leading text within the
+    budget is extracted with parse_lead().
+
+    If a ParseCache is given then the texts are cached by the hash of the document
+    content, so documents that are read again (e.g., when a reader is replayed) are
+    not parsed again.
     """
-    def __init__(self, reader):
+    def __init__(self, reader, fast=False, max_chars=None, max_tokens=None, boilerplate=False, cache=None):
         if not isinstance(reader, Reader):
             raise ValueError("HTMLParser requires a Reader object.")
+        if (max_chars is not None and max_chars < 1) or (max_tokens is not None and max_tokens < 1):
+            raise ValueError("max_chars and max_tokens must be at least 1.")
         self.reader = reader
+        self.fast = fast
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.boilerplate = boilerplate
+        self.cache = cache
 
-    def parse(self):
+    def parse(self, workers=1, chunksize=100, max_in_flight=None):
         """
-        Return a generator that parses text content from the reader.
+        Return a generator that parses text content from the reader. If workers > 1
+        then chunks of chunksize documents are parsed in a pool of worker processes,
+        e.g., to use every core when backfilling a large directory. The texts are
+        still returned in the order the documents were read, with None for documents
+        that fail to parse, and at most max_in_flight chunks (default: twice the
+        number of workers) are read ahead so memory stays bounded. Only documents
+        that are not in the cache are sent to the workers.
         """
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        if chunksize < 1:
+            raise ValueError("chunksize must be at least 1.")
         try:
-            for html in self.reader.read():
-                try:
-                    yield self._parse_text(html)
-                except Exception as e:
-                    yield None
+            if workers == 1:
+                for html in self.reader.read():
+                    key = self._cache_key(html)
+                    text = None if key is None else self.cache.get(key)
+                    if text is None:
+                        try:
+                            text = self._parse_text(html)
+                        except Exception as e:
+                            text = None
+                        self._cache_put(key, text)
+                    yield text
+                return
+            # The cached texts of each chunk are queued in the order the chunks are
+            # submitted, which is the order their parsed misses are returned in.
+            cached = deque()
+            chunks = self._misses(chunked(self.reader.read(), chunksize), cached)
+            parse = partial(_parse_chunk, self._extractor())
+            for parsed in ordered_map(parse, chunks, workers, max_in_flight=max_in_flight):
+                keys, texts = cached.popleft()
+                parsed = iter(parsed)
+                for key, text in zip(keys, texts):
+                    if text is None:
+                        text = next(parsed)
+                        self._cache_put(key, text)
+                    yield text
         except Exception as e:
             raise ValueError("Error reading from reader: " + str(e))
+        finally:
+            if self.cache is not None:
+                self.cache.flush()
+
+    def _misses(self, chunks, cached):
+        """
+        Look up the documents of each chunk in the cache, queueing their keys and
+        cached texts (None for misses), and return a generator of the documents of
+        each chunk that must be parsed.
+        """
+        for chunk in chunks:
+            keys = [self._cache_key(html) for html in chunk]
+            texts = [None if key is None else self.cache.get(key) for key in keys]
+            cached.append((keys, texts))
+            yield [html for html, text in zip(chunk, texts) if text is None]
+
+    def _cache_key(self, html):
+        """
+        Return the cache key of the document, or None if there is no cache.
+        """
+        if self.cache is None or not isinstance(html, (str, bytes)):
+            return None
+        return content_hash(html, self._cache_namespace())
+
+    def _cache_put(self, key, text):
+        """
+        Cache the text of a document. Documents that failed to parse are not cached.
+        """
+        if key is not None and text is not None:
+            self.cache.put(key, text)
+
+    def _cache_namespace(self):
+        """
+        Return the namespace of the cache keys, which separates the texts extracted
+        with different options. parse_text() and parse_text_fast() share a namespace
+        since they extract the same text.
+        """
+        if self.max_chars is not None or self.max_tokens is not None or self.boilerplate:
+            return "lead:{}:{}:{}".format(self.max_chars, self.max_tokens, self.boilerplate)
+        return "text"
+
+    def _extractor(self):
+        """
+        Return the module-level function that parses the text of a document, which
+        can be sent to worker processes.
+        """
+        if self.max_chars is not None or self.max_tokens is not None or self.boilerplate:
+            return partial(parse_lead, max_chars=self.max_chars, max_tokens=self.max_tokens, boilerplate=self.boilerplate)
+        if self.fast:
+            return parse_text_fast
+        return parse_text
 
     def _parse_text(self, html):
         """
         Parse the text from the provided HTML.
-        TODO: We can be smarter about which text content to return (e.g., for news
-        articles, the most information-rich content is near the top of the article).
-        """
-        soup = BeautifulSoup(html, 'html.parser')
-        text = ""
-        for tag in soup.find_all(TAGS):
-            text += tag.text.strip() + " "
-        return text.strip()
\ No newline at end of file
+        """
+        return self._extractor()(html)
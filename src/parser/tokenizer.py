@@ -0,0 +1,123 @@
+import re
+import sys
+from functools import lru_cache
+from gensim.parsing.preprocessing import STOPWORDS
+
+# Runs of word characters, keeping inner apostrophes and hyphens (e.g., "don't",
+# "well-known") so that they are not split into fragments.
+TOKEN_PATTERN = r"\w+(?:['\-]\w+)*"
+
+# The same length limits as gensim.utils.simple_preprocess().
+MIN_LENGTH = 2
+MAX_LENGTH = 15
+
+CACHE_SIZE = 2**16
+
+class Tokenizer():
+    """
+    Tokenizer splits the texts returned by HTMLParser.parse() into the token lists
+    expected by OnlineTextCorpus.add_documents() and the topic engines, e.g.:
+
+        corpus.add_documents(tokenizer.stream(parser.parse()))
+
+    Tokens are matched with a compiled regex on the (optionally lowercased) text and
+    each distinct token is normalized once: tokens shorter than min_length or longer
+    than max_length, or in stopwords, are dropped, and the rest are passed through
+    lemmatize (any callable that returns the normalized form of a token, or an empty
+    string to drop it). The normalized forms are interned and kept in an LRU cache of
+    cache_size tokens, so the filters and the lemmatizer only run on cache misses and
+    repeated tokens share one string object across documents.
+
+    Parameters:
+        pattern: The regex that matches a token.
+        lowercase: Whether to lowercase the text before tokenizing.
+        stopwords: A set of tokens to drop (default: gensim's English stopwords).
+        min_length: The minimum length of a token.
+        max_length: The maximum length of a token.
+        lemmatize: An optional callable that maps a token to its normalized form.
+        cache_size: The number of normalized tokens to cache.
+    """
+    def __init__(self, pattern=TOKEN_PATTERN, lowercase=True, stopwords=STOPWORDS, min_length=MIN_LENGTH,
+                 max_length=MAX_LENGTH, lemmatize=None, cache_size=CACHE_SIZE):
+        if min_length < 1 or (max_length is not None and max_length < min_length):
+            raise ValueError("min_length must be at least 1 and at most max_length.")
+        if cache_size is not None and cache_size < 1:
+            raise ValueError("cache_size must be at least 1.")
+        if lemmatize is not None and not callable(lemmatize):
+            raise ValueError("lemmatize must be callable.")
+        self.pattern = pattern
+        self.lowercase = lowercase
+        self.stopwords = frozenset(stopwords or ())
+        self.min_length = min_length
+        self.max_length = max_length
+        self.lemmatize = lemmatize
+        self.cache_size = cache_size
+        self._compile()
+
+    def _compile(self):
+        self._findall = re.compile(self.pattern).findall
+        self._normalize = lru_cache(maxsize=self.cache_size)(self._normalize_token)
+
+    def __getstate__(self):
+        # The compiled regex and cache are rebuilt so the tokenizer can be sent to
+        # worker processes.
+        state = self.__dict__.copy()
+        del state["_findall"]
+        del state["_normalize"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._compile()
+
+    def _normalize_token(self, token):
+        """
+        Return the interned normalized form of the token, or None if it is dropped.
+        """
+        if len(token) < self.min_length or (self.max_length is not None and len(token) > self.max_length):
+            return None
+        if token in self.stopwords:
+            return None
+        if self.lemmatize is not None:
+            token = self.lemmatize(token)
+            if not token or token in self.stopwords:
+                return None
+        return sys.intern(token)
+
+    def tokenize(self, text):
+        """
+        Return the list of normalized tokens of the text.
+        """
+        if self.lowercase:
+            text = text.lower()
+        return [token for token in map(self._normalize, self._findall(text)) if token is not None]
+
+    __call__ = tokenize
+
+    def tokenize_batch(self, texts):
+        """
+        Return the token lists of a batch of texts, with None for texts that are None
+        (e.g., documents that failed to parse).
+        """
+        return [None if text is None else self.tokenize(text) for text in texts]
+
+    def stream(self, texts):
+        """
+        Return a generator of the token lists of a stream of texts, skipping texts
+        that are None.
+        """
+        for text in texts:
+            if text is not None:
+                yield self.tokenize(text)
+
+    def cache_info(self):
+        """
+        Return the hits, misses, maxsize and currsize of the normalized token cache.
+        """
+        return self._normalize.cache_info()
+
+    def clear_cache(self):
+        """
+        Clear the normalized token cache, e.g., after changing the stopwords.
+        """
+        self._normalize.cache_clear()
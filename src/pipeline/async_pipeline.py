@@ -0,0 +1,114 @@
+from src.parser.html import parse_text_fast
+from src.reader.adapters import SyncToAsyncReader
+from src.reader.reader import AsyncReader, Reader
+
+import asyncio
+from functools import partial
+
+def parse_tokens(html):
+    """
+    Parse the text from the HTML and split it into lowercase tokens.
+    """
+    return parse_text_fast(html).lower().split()
+
+def _parse_or_none(parse, data):
+    """
+    Apply the parse function to the data in an executor worker, returning None if
+    parsing fails like HTMLParser.parse().
+    """
+    try:
+        return parse(data)
+    except Exception:
+        return None
+
+class AsyncPipeline():
+    """
+    AsyncPipeline ingests documents from a reader into an OnlineTextCorpus inside a
+    single event loop, overlapping the I/O of the reader with parsing and corpus
+    updates. Each item read is submitted to the executor for parsing as soon as it
+    arrives (parse must be picklable, e.g., a module-level function, if executor is a
+    process pool), and the parsed documents are added to the corpus in batches of
+    batch_size in the event loop's default thread pool, in the order they were read.
+    At most max_pending items are read ahead of the corpus stage, so a slow stage
+    pauses the reader instead of buffering without bound.
+
+    Synchronous Readers are adapted with SyncToAsyncReader. Documents that fail to
+    parse are skipped and counted. Reader errors are raised from run() after the
+    documents read before the error have been added.
+    """
+    def __init__(self, reader, corpus, parse=parse_tokens, executor=None, batch_size=100, max_pending=16):
+        if isinstance(reader, Reader):
+            reader = SyncToAsyncReader(reader)
+        if not isinstance(reader, AsyncReader):
+            raise ValueError("AsyncPipeline requires a Reader or AsyncReader object.")
+        if batch_size < 1 or max_pending < 1:
+            raise ValueError("batch_size and max_pending must be at least 1.")
+        self.reader = reader
+        self.corpus = corpus
+        self.parse = parse
+        self.executor = executor
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.stats = {"read": 0, "failed": 0, "added": 0}
+
+    async def run(self):
+        """
+        Ingest the reader's stream into the corpus until it ends, and return the
+        numbers of items read, documents that failed to parse and documents added.
+        """
+        loop = asyncio.get_running_loop()
+        self.stats = {"read": 0, "failed": 0, "added": 0}
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        reading = asyncio.ensure_future(self._read(loop, queue))
+        try:
+            batch = []
+            while True:
+                future = await queue.get()
+                if future is None:
+                    break
+                document = await future
+                if document is None:
+                    self.stats["failed"] += 1
+                    continue
+                batch.append(document)
+                if len(batch) >= self.batch_size:
+                    await self._add(loop, batch)
+                    batch = []
+            if len(batch) > 0:
+                await self._add(loop, batch)
+            await reading
+        finally:
+            if not reading.done():
+                reading.cancel()
+                try:
+                    await reading
+                except asyncio.CancelledError:
+                    pass
+        return dict(self.stats)
+
+    async def _read(self, loop, queue):
+        """
+        Read items from the reader and queue a parse future for each, ending the queue
+        with None.
+        """
+        parse = partial(_parse_or_none, self.parse)
+        stream = self.reader.read()
+        try:
+            async for data in stream:
+                self.stats["read"] += 1
+                await queue.put(loop.run_in_executor(self.executor, parse, data))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await queue.put(None)
+            raise
+        finally:
+            await stream.aclose()
+        await queue.put(None)
+
+    async def _add(self, loop, batch):
+        """
+        Add a batch of parsed documents to the corpus without blocking the event loop.
+        """
+        await loop.run_in_executor(None, self.corpus.add_documents, batch)
+        self.stats["added"] += len(batch)
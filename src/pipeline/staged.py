@@ -0,0 +1,325 @@
+from src.pipeline.async_pipeline import _parse_or_none, parse_tokens
+from src.reader.reader import Reader
+
+import time
+import queue
+import threading
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+EXECUTORS = {"thread", "process"}
+
+# Time in seconds between checks for a stopped pipeline while blocked on a queue.
+POLL_INTERVAL = 0.1
+
+# Marks the end of the stream; each worker of a stage consumes one.
+_DONE = object()
+
+class _Stopped(Exception):
+    """
+    Raised in a worker blocked on a queue when the pipeline is stopped.
+    """
+
+class Stage():
+    """
+    Stage is one step of a StagedPipeline that applies func to the items produced by
+    the previous step and passes the results on to the next. Results that are None
+    are not passed on (e.g., documents that failed to parse).
+    Parameters:
+        name:
+            Name of the stage in the metrics.
+        func:
+            Function applied to each item, or to each list of items if batch_size is
+            set.
+        workers:
+            Number of workers applying func in parallel. Items are only kept in order
+            by stages with a single worker. Default: 1
+        executor:
+            "thread" to apply func in the worker threads, or "process" to apply it in
+            a process pool with one process per worker (func and the items must be
+            picklable) for CPU bound stages such as parsing. Default: "thread"
+        batch_size:
+            If set, items are grouped into lists of up to batch_size items, e.g., to
+            amortize the cost of OnlineTextCorpus.add_documents(). Default: None
+        batch_timeout:
+            Maximum time in seconds to wait to fill a batch once it has an item, so
+            that a slow stream still flushes regularly. Default: None (wait for a full
+            batch or the end of the stream)
+        queue_size:
+            Maximum number of items waiting for the stage; producers block when the
+            queue is full, which applies backpressure up to the reader. Default: 64
+    """
+    def __init__(self, name, func, workers=1, executor="thread", batch_size=None, batch_timeout=None, queue_size=64):
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        if executor not in EXECUTORS:
+            raise ValueError("executor must be one of: " + ", ".join(sorted(EXECUTORS)))
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("batch_size must be at least 1.")
+        if batch_timeout is not None and batch_timeout <= 0:
+            raise ValueError("batch_timeout must be positive.")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1.")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.executor = executor
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.queue = queue.Queue(maxsize=self.queue_size)
+        self.items = 0
+        self.batches = 0
+        self.emitted = 0
+        self.dropped = 0
+        self.busy = 0.0
+        self._active = self.workers
+
+    def _record(self, items, busy, emitted):
+        with self._lock:
+            self.items += items
+            self.batches += 1
+            self.busy += busy
+            if emitted:
+                self.emitted += 1
+            else:
+                self.dropped += 1
+
+class StagedPipeline():
+    """
+    StagedPipeline runs a Reader and a sequence of stages (e.g., parse, add the
+    documents to an OnlineTextCorpus, update a TopicAnalyzer) concurrently, linked by
+    bounded queues. The reader and each worker of each stage run in their own thread,
+    so a slow stage only stalls the others once the queues in front of it are full,
+    and memory is bounded by the queue sizes.
+
+    metrics() can be called while the pipeline is running (e.g., from a monitoring
+    thread) to see the depth of each queue and the throughput of each stage, which
+    shows which stage is the bottleneck and should be given more workers. If the
+    reader or a stage raises an error, the pipeline stops and run() raises it.
+    """
+    def __init__(self, reader, stages):
+        if not isinstance(reader, Reader):
+            raise ValueError("StagedPipeline requires a Reader object.")
+        if len(stages) == 0:
+            raise ValueError("StagedPipeline requires at least one stage.")
+        self.reader = reader
+        self.stages = list(stages)
+        self.read = 0
+        self._start = None
+        self._end = None
+        self._stop = threading.Event()
+        self._error = None
+
+    def run(self):
+        """
+        Run the pipeline until the reader's stream has passed through every stage, and
+        return the metrics.
+        """
+        self.read = 0
+        self._start = time.monotonic()
+        self._end = None
+        self._stop = threading.Event()
+        self._error = None
+        pools = {}
+        threads = [threading.Thread(target=self._read, daemon=True)]
+        for i, stage in enumerate(self.stages):
+            stage._reset()
+            if stage.executor == "process":
+                pools[i] = ProcessPoolExecutor(max_workers=stage.workers)
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(i, pools.get(i)), daemon=True))
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            self._stop.set()
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+            self._end = time.monotonic()
+        if self._error is not None:
+            name, error = self._error
+            raise ValueError("Error in pipeline stage " + name + ": " + str(error))
+        return self.metrics()
+
+    def metrics(self):
+        """
+        Return the number of items read and, for each stage, its queue depth, the
+        numbers of items and batches processed, results passed on and dropped, the
+        time spent processing and the throughput in items per second.
+        """
+        if self._start is None:
+            elapsed = 0.0
+        else:
+            elapsed = (self._end or time.monotonic()) - self._start
+        stages = {}
+        for stage in self.stages:
+            with stage._lock:
+                stages[stage.name] = {
+                    "workers": stage.workers,
+                    "queue_depth": stage.queue.qsize(),
+                    "queue_size": stage.queue_size,
+                    "items": stage.items,
+                    "batches": stage.batches,
+                    "emitted": stage.emitted,
+                    "dropped": stage.dropped,
+                    "busy_seconds": stage.busy,
+                    "throughput": stage.items / elapsed if elapsed > 0 else 0.0,
+                }
+        return {"read": self.read, "elapsed_seconds": elapsed, "stages": stages}
+
+    def _fail(self, name, error):
+        """
+        Record the first error and stop every thread.
+        """
+        if self._error is None:
+            self._error = (name, error)
+        self._stop.set()
+
+    def _put(self, stage, item):
+        """
+        Queue the item for the stage, blocking while its queue is full.
+        """
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            try:
+                stage.queue.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, stage, deadline=None):
+        """
+        Return the next item queued for the stage, blocking until one arrives or, if a
+        deadline is given, raising queue.Empty once it has passed.
+        """
+        while True:
+            if self._stop.is_set():
+                raise _Stopped()
+            timeout = POLL_INTERVAL
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    raise queue.Empty()
+            try:
+                return stage.queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+
+    def _next(self, stage):
+        """
+        Return the next item or batch of items for the stage (or None if there is
+        none) and whether the end of the stream was reached.
+        """
+        item = self._get(stage)
+        if item is _DONE:
+            return None, True
+        if stage.batch_size is None:
+            return item, False
+        batch = [item]
+        deadline = None
+        if stage.batch_timeout is not None:
+            deadline = time.monotonic() + stage.batch_timeout
+        while len(batch) < stage.batch_size:
+            try:
+                item = self._get(stage, deadline)
+            except queue.Empty:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _read(self):
+        """
+        Read the stream into the first stage's queue, followed by an end of stream
+        marker for each of its workers.
+        """
+        first = self.stages[0]
+        stream = self.reader.read()
+        try:
+            for item in stream:
+                self._put(first, item)
+                self.read += 1
+            for _ in range(first.workers):
+                self._put(first, _DONE)
+        except _Stopped:
+            pass
+        except Exception as e:
+            self._fail("reader", e)
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
+
+    def _work(self, i, pool):
+        """
+        Apply the i-th stage to its queue until the end of the stream, passing the
+        results to the next stage. The last worker of the stage to finish passes the
+        end of stream on.
+        """
+        stage = self.stages[i]
+        downstream = self.stages[i + 1] if i + 1 < len(self.stages) else None
+        try:
+            done = False
+            while not done:
+                item, done = self._next(stage)
+                if item is None:
+                    continue
+                start = time.monotonic()
+                if pool is None:
+                    result = stage.func(item)
+                else:
+                    result = pool.submit(stage.func, item).result()
+                size = len(item) if stage.batch_size is not None else 1
+                stage._record(size, time.monotonic() - start, result is not None)
+                if result is not None and downstream is not None:
+                    self._put(downstream, result)
+            with stage._lock:
+                stage._active -= 1
+                last = stage._active == 0
+            if last and downstream is not None:
+                for _ in range(downstream.workers):
+                    self._put(downstream, _DONE)
+        except _Stopped:
+            pass
+        except Exception as e:
+            self._fail(stage.name, e)
+
+def _add_documents(corpus, documents):
+    """
+    Add a batch of documents to the corpus and pass it on.
+    """
+    corpus.add_documents(documents)
+    return documents
+
+def _update_analyzer(analyzer, documents):
+    """
+    Update the topic models with a batch of documents and pass it on.
+    """
+    analyzer.update(documents)
+    return documents
+
+def ingest_pipeline(reader, corpus, analyzer=None, parse=parse_tokens, parse_workers=1, executor="thread", batch_size=100,
+                    batch_timeout=1.0, queue_size=64):
+    """
+    Return a StagedPipeline that parses the documents of the reader into tokens with
+    parse_workers workers, adds them to the corpus in batches of up to batch_size
+    documents (or whatever has arrived within batch_timeout seconds), and then
+    updates the analyzer, if given, with each batch. Documents that fail to parse are
+    dropped. Use executor="process" to parse on multiple cores.
+    """
+    stages = [
+        Stage("parse", partial(_parse_or_none, parse), workers=parse_workers, executor=executor, queue_size=queue_size),
+        Stage("corpus", partial(_add_documents, corpus), batch_size=batch_size, batch_timeout=batch_timeout,
+              queue_size=queue_size),
+    ]
+    if analyzer is not None:
+        stages.append(Stage("analyzer", partial(_update_analyzer, analyzer), queue_size=queue_size))
+    return StagedPipeline(reader, stages)
@@ -0,0 +1,65 @@
+from src.reader.reader import AsyncReader, Reader
+
+import asyncio
+
+# Returned by next() in the executor when the wrapped stream is exhausted.
+_DONE = object()
+
+class SyncToAsyncReader(AsyncReader):
+    """
+    SyncToAsyncReader adapts a streaming Reader (one whose read() returns a generator,
+    e.g., DirectoryReader or TopicReader) to the AsyncReader interface. Each item is
+    read in the executor (default: the event loop's default thread pool) so that
+    blocking reads do not stall the event loop. Items are read one at a time, so the
+    wrapped reader does not need to be thread-safe.
+    """
+    def __init__(self, reader, executor=None):
+        if not isinstance(reader, Reader):
+            raise ValueError("SyncToAsyncReader requires a Reader object.")
+        self.reader = reader
+        self.executor = executor
+
+    async def read(self):
+        """
+        Read data from the wrapped reader into an async stream.
+        """
+        loop = asyncio.get_running_loop()
+        stream = iter(self.reader.read())
+        try:
+            while True:
+                item = await loop.run_in_executor(self.executor, next, stream, _DONE)
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            if hasattr(stream, "close"):
+                stream.close()
+
+class AsyncToSyncReader(Reader):
+    """
+    AsyncToSyncReader adapts an AsyncReader to the Reader interface, e.g., to use an
+    async reader with HTMLParser. The async stream is driven on a private event loop
+    in the calling thread, so read() must not be called from a running event loop.
+    """
+    def __init__(self, reader):
+        if not isinstance(reader, AsyncReader):
+            raise ValueError("AsyncToSyncReader requires an AsyncReader object.")
+        self.reader = reader
+
+    def read(self):
+        """
+        Read data from the wrapped async reader into a stream.
+        """
+        loop = asyncio.new_event_loop()
+        stream = self.reader.read().__aiter__()
+        try:
+            while True:
+                try:
+                    item = loop.run_until_complete(stream.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            loop.run_until_complete(stream.aclose())
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
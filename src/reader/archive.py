@@ -0,0 +1,170 @@
+from src.reader.reader import Reader
+
+import gzip
+import queue
+import tarfile
+import threading
+
+# Archive formats by file extension, longest extensions first.
+FORMATS = [
+    (".tar.gz", "tar"),
+    (".tgz", "tar"),
+    (".tar", "tar"),
+    (".warc.gz", "warc"),
+    (".warc", "warc"),
+]
+
+# WARC record types whose payloads are documents.
+WARC_TYPES = {"response", "resource"}
+
+# Time in seconds between checks for a closed stream while the queue is full.
+PUT_TIMEOUT = 0.1
+
+def archive_format(path):
+    """
+    Return the format of the archive at the path from its file extension.
+    """
+    for ext, format in FORMATS:
+        if str(path).lower().endswith(ext):
+            return format
+    raise ValueError("archive must be one of: " + ", ".join(ext for ext, _ in FORMATS))
+
+def tar_members(path):
+    """
+    Return a generator of the contents of the regular files in a (possibly
+    compressed) tar archive. The archive is read as a stream, so members are never
+    extracted to disk and the file is never seeked.
+    """
+    with tarfile.open(path, mode="r|*") as tar:
+        for member in tar:
+            if member.isfile():
+                yield tar.extractfile(member).read()
+
+def warc_records(f):
+    """
+    Return a generator of the (headers, block) of each record in an uncompressed WARC
+    stream. Header names are lowercased.
+    """
+    while True:
+        line = f.readline()
+        if line == b"":
+            return
+        if line.strip() == b"":
+            continue
+        if not line.startswith(b"WARC/"):
+            raise ValueError("invalid WARC record header: " + repr(line[:32]))
+        headers = {}
+        while True:
+            line = f.readline()
+            if line.strip() == b"":
+                break
+            name, _, value = line.decode("utf-8").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        block = f.read(length)
+        if len(block) < length:
+            raise ValueError("truncated WARC record")
+        yield headers, block
+
+def warc_payloads(path):
+    """
+    Return a generator of the payloads of the response and resource records of a
+    WARC file, which may be gzip compressed per record or as a whole. The HTTP headers
+    of response records are removed.
+    """
+    opener = gzip.open if str(path).lower().endswith(".gz") else open
+    with opener(path, 'rb') as f:
+        for headers, block in warc_records(f):
+            if headers.get("warc-type") not in WARC_TYPES:
+                continue
+            if headers.get("content-type", "").startswith("application/http"):
+                _, _, block = block.partition(b"\r\n\r\n")
+            yield block
+
+MEMBERS = {
+    "tar": tar_members,
+    "warc": warc_payloads,
+}
+
+class _Failure():
+    """
+    Carries an error from the decompression thread to the reader.
+    """
+    def __init__(self, error):
+        self.error = error
+
+_DONE = object()
+
+class ArchiveReader(Reader):
+    """
+    ArchiveReader implements reading the files of tar archives (optionally gzip
+    compressed) and the documents of WARC files into a stream, without extracting
+    them to disk. The archives are read and decompressed in a background thread, up
+    to queue_size documents ahead of the stream, so decompression overlaps with
+    processing the documents.
+    Parameters:
+        paths:
+            Path of an archive, or a list of paths read in order. The format of each is
+            detected from its extension: .tar, .tar.gz, .tgz, .warc or .warc.gz.
+        encoding:
+            Text encoding of the documents. Default: "ISO-8859-1"
+        queue_size:
+            Maximum number of documents decompressed ahead of the stream. Default: 16
+    """
+    def __init__(self, paths, encoding="ISO-8859-1", queue_size=16):
+        if isinstance(paths, str):
+            paths = [paths]
+        self.paths = list(paths)
+        for path in self.paths:
+            archive_format(path)
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1.")
+        self.encoding = encoding
+        self.queue_size = queue_size
+
+    def _put(self, documents, stop, item):
+        """
+        Queue the item, returning False instead if the stream was closed.
+        """
+        while not stop.is_set():
+            try:
+                documents.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decompress(self, documents, stop):
+        """
+        Read every archive and queue its decoded documents, followed by _DONE or the
+        error that stopped reading.
+        """
+        try:
+            for path in self.paths:
+                for data in MEMBERS[archive_format(path)](path):
+                    if not self._put(documents, stop, data.decode(self.encoding)):
+                        return
+        except Exception as e:
+            self._put(documents, stop, _Failure(e))
+            return
+        self._put(documents, stop, _DONE)
+
+    def read(self):
+        """
+        Read the documents of the archives into a stream.
+        """
+        documents = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._decompress, args=(documents, stop), daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = documents.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, _Failure):
+                    raise ValueError("Error reading archive: " + str(item.error))
+                yield item
+        finally:
+            stop.set()
+            thread.join()
@@ -1,19 +1,189 @@
-from src.reader.reader import Reader
+from src.reader.reader import AsyncReader, Reader
 
 import os
+import asyncio
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+from src.storage.files import read_json, write_json
+
+def _read_file(path, encoding):
+    """
+    Read the contents of the file at the path.
+    """
+    with open(path, 'r', encoding=encoding) as f:
+        return f.read()
 
 class DirectoryReader(Reader):
     """
     DirectoryReader implements reading files from a directory into a stream.
+    Parameters:
+        directory:
+            Directory to read files from.
+        encoding:
+            Text encoding of the files. Default: "ISO-8859-1"
+        recursive:
+            If True, files in subdirectories are read as well. Default: False
+        state:
+            Path of a watermark file recording the path, modification time and size
+            of every file that has been read and committed. If given, only files that
+            are new or have changed since they were committed are read, so re-reading
+            a large tree costs in proportion to the changes (plus a stat of every
+            file). The caller commits the files read with the commit() method, e.g.,
+            once they have been added to the corpus. Default: None
+        workers:
+            Number of threads reading files. If greater than 1 then up to read_ahead
+            files are read ahead of the stream by a thread pool; files are still
+            yielded in scan order. Default: 1
+        read_ahead:
+            Maximum number of files read ahead of the stream. Default: 2 * workers
     """
-    def __init__(self, directory, encoding="ISO-8859-1"):
+    def __init__(self, directory, encoding="ISO-8859-1", recursive=False, state=None, workers=1, read_ahead=None):
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        if read_ahead is None:
+            read_ahead = 2 * workers
+        if read_ahead < 1:
+            raise ValueError("read_ahead must be at least 1.")
         self.directory = directory
         self.encoding = encoding
+        self.recursive = recursive
+        self.state = state
+        self.workers = workers
+        self.read_ahead = read_ahead
+        self.watermark_ = {}
+        if state is not None:
+            self.watermark_ = read_json(state) or {}
+        self._read = {}
+        self._seen = set()
+        self._scanned = False
+
+    def _scan(self):
+        """
+        Return a generator of the (relative path, path, [mtime_ns, size]) of each file
+        under the directory, in directory order, skipping the watermark file.
+        """
+        ignore = set()
+        if self.state is not None:
+            ignore = {os.path.abspath(self.state), os.path.abspath(self.state) + ".tmp"}
+        stack = [("", str(self.directory))]
+        while len(stack) > 0:
+            prefix, dir = stack.pop()
+            subdirs = []
+            with os.scandir(dir) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        if self.recursive:
+                            subdirs.append((prefix + entry.name + "/", entry.path))
+                        continue
+                    if os.path.abspath(entry.path) in ignore:
+                        continue
+                    stat = entry.stat()
+                    yield prefix + entry.name, entry.path, [stat.st_mtime_ns, stat.st_size]
+            stack.extend(reversed(subdirs))
+
+    def _changed(self):
+        """
+        Return a generator of the scanned files that are not in the watermark or have
+        changed since they were committed.
+        """
+        self._seen = set()
+        self._scanned = False
+        for name, path, stamp in self._scan():
+            self._seen.add(name)
+            if self.watermark_.get(name) != stamp:
+                yield name, path, stamp
+        self._scanned = True
 
     def read(self):
         """
         Read files from the directory into a stream.
         """
-        for f in os.listdir(self.directory):
-            with open(os.path.join(self.directory, f), 'r', encoding=self.encoding) as f:
-                yield f.read()
\ No newline at end of file
+        self._read = {}
+        files = self._changed()
+        if self.workers == 1:
+            for name, path, stamp in files:
+                data = _read_file(path, self.encoding)
+                self._read[name] = stamp
+                yield data
+            return
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                while True:
+                    for name, path, stamp in islice(files, self.read_ahead - len(pending)):
+                        pending.append((name, stamp, executor.submit(_read_file, path, self.encoding)))
+                    if len(pending) == 0:
+                        return
+                    name, stamp, future = pending.popleft()
+                    data = future.result()
+                    self._read[name] = stamp
+                    yield data
+            finally:
+                for _, _, future in pending:
+                    future.cancel()
+
+    def commit(self):
+        """
+        Record the files read so far in the watermark file so that they are skipped by
+        later reads unless they change. Once a read has scanned the whole directory,
+        files that no longer exist are dropped from the watermark.
+        """
+        if self.state is None:
+            raise ValueError("DirectoryReader requires a state file to commit.")
+        self.watermark_.update(self._read)
+        if self._scanned:
+            self.watermark_ = {name: stamp for name, stamp in self.watermark_.items() if name in self._seen}
+        write_json(self.state, self.watermark_)
+        self._read = {}
+
+class AsyncDirectoryReader(AsyncReader):
+    """
+    AsyncDirectoryReader implements reading files from a directory into an async
+    stream. The directory is scanned like DirectoryReader, including the recursive
+    and watermark (state) modes, so both readers return the same files for the same
+    directory. Files are read in the executor (default: the event loop's default
+    thread pool), up to read_ahead files at a time, and are yielded in scan order.
+    """
+    def __init__(self, directory, encoding="ISO-8859-1", read_ahead=4, executor=None, recursive=False, state=None):
+        if read_ahead < 1:
+            raise ValueError("read_ahead must be at least 1.")
+        self.reader = DirectoryReader(directory, encoding=encoding, recursive=recursive, state=state)
+        self.directory = directory
+        self.encoding = encoding
+        self.read_ahead = read_ahead
+        self.executor = executor
+
+    async def read(self):
+        """
+        Read files from the directory into an async stream.
+        """
+        loop = asyncio.get_running_loop()
+        self.reader._read = {}
+        files = iter(await loop.run_in_executor(self.executor, list, self.reader._changed()))
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < self.read_ahead:
+                    file = next(files, None)
+                    if file is None:
+                        break
+                    name, path, stamp = file
+                    pending.append((name, stamp, loop.run_in_executor(self.executor, _read_file, path, self.encoding)))
+                if len(pending) == 0:
+                    return
+                name, stamp, future = pending.popleft()
+                data = await future
+                self.reader._read[name] = stamp
+                yield data
+        finally:
+            for _, _, future in pending:
+                future.cancel()
+
+    def commit(self):
+        """
+        Record the files read so far in the watermark file, see DirectoryReader.commit().
+        """
+        self.reader.commit()
@@ -1,8 +1,38 @@
-from src.reader.reader import Reader
+from src.reader.reader import AsyncReader, Reader
 
+import asyncio
+
+from collections import deque
+from functools import partial
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from kafka import KafkaConsumer
+from kafka.consumer.subscription_state import ConsumerRebalanceListener
 from kafka.structs import OffsetAndMetadata, TopicPartition
 
+EXECUTORS = {
+    "process": ProcessPoolExecutor,
+    "thread": ThreadPoolExecutor,
+}
+
+def _process_values(process, values):
+    """
+    Apply the process function to each message value of a batch in a worker.
+    """
+    return [process(value) for value in values]
+
+class _RevokeListener(ConsumerRebalanceListener):
+    """
+    Notifies the reader when partitions are revoked from the consumer by a rebalance.
+    """
+    def __init__(self, reader):
+        self.reader = reader
+
+    def on_partitions_revoked(self, revoked):
+        self.reader._revoke(revoked)
+
+    def on_partitions_assigned(self, assigned):
+        pass
+
 class TopicReader(Reader):
     """
     TopicReader implements reading data from a Kafka topic into a stream.
@@ -24,8 +54,13 @@ class TopicReader(Reader):
             identifier for automatic offset committing. Default: 'orca'
         auto_commit_interval:
             Time in milliseconds between automatic offset commits. Default: 5000
+        consumer:
+            An existing consumer to read from instead of connecting to the broker
+            (e.g., a stand-in consumer for testing). It must support iteration, poll()
+            and commit() like KafkaConsumer. Default: None
     """
-    def __init__(self, url, topic, resume_earliest=True, auto_commit=True, group_id="orca", auto_commit_interval=5000):
+    def __init__(self, url, topic, resume_earliest=True, auto_commit=True, group_id="orca", auto_commit_interval=5000,
+                 consumer=None):
         if not isinstance(url, str) or url == "":
             raise ValueError("Kafka broker URL is required.")
         if not isinstance(topic, str) or topic == "":
@@ -38,6 +73,12 @@ class TopicReader(Reader):
         if auto_commit and group_id == "":
             raise ValueError("Kafka group_id is required if auto_commit is True.")
         self.message_ = None
+        self.offsets_ = {}
+        self.commit_on_revoke = False
+        self._pending = {}
+        if consumer is not None:
+            self.consumer = consumer
+            return
         try:
             self.consumer = KafkaConsumer(
                 topic,
@@ -54,14 +95,207 @@ class TopicReader(Reader):
         Read data from the Kafka topic into a stream.
         """
         for message in self.consumer:
-            self.message_ = message
+            self._track(message)
             yield message.value
 
+    def read_batches(self, max_records=500, timeout_ms=1000, stop_when_idle=False):
+        """
+        Read data from the Kafka topic into a stream of batches, each a list of up to
+        max_records message values fetched with a single poll. Messages from the same
+        partition are in offset order. If stop_when_idle is True then the stream ends
+        when a poll returns no messages within timeout_ms, otherwise polling continues.
+
+        The offsets of every partition read are tracked, so for at-least-once
+        ingestion call commit() once a batch has been durably added to the corpus.
+        """
+        if max_records < 1:
+            raise ValueError("max_records must be at least 1.")
+        while True:
+            batch = self._poll(max_records, timeout_ms)
+            if len(batch) == 0:
+                if stop_when_idle:
+                    return
+                continue
+            yield batch
+
+    def _poll(self, max_records, timeout_ms):
+        """
+        Poll the consumer once and return the list of message values fetched, tracking
+        the offsets of their partitions.
+        """
+        batch = []
+        records = self.consumer.poll(timeout_ms=timeout_ms, max_records=max_records)
+        for messages in records.values():
+            for message in messages:
+                self._track(message)
+                batch.append(message.value)
+        return batch
+
+    def read_parallel(self, process, workers=4, executor="process", max_records=500, timeout_ms=1000, max_in_flight=None,
+                      commit_on_revoke=False, stop_when_idle=False):
+        """
+        Read data from the Kafka topic in batches like read_batches(), applying the
+        process function (e.g., parse and tokenize) to each message value in parallel
+        workers, and return a stream of batches of the results. Each partition is
+        assigned to one of the workers, which are single-worker process pools (or
+        threads if executor is "thread", e.g., for I/O bound processing), so the
+        partitions are processed in parallel while each partition is processed in
+        order. The results are merged into a single stream as they complete, with each
+        batch holding results from one partition in offset order. process must be
+        picklable for process workers (e.g., a module-level function).
+
+        At most max_in_flight batches (default: twice the number of workers) are
+        queued or processing at a time; polling pauses until results are consumed.
+        Offsets are only tracked for batches that have been yielded, so commit() never
+        commits messages that are still in flight. When a rebalance revokes
+        partitions, their in-flight batches are discarded (they will be redelivered to
+        the new owner) and their offsets are dropped, or committed first if
+        commit_on_revoke is True, e.g., when every yielded batch is durable by the time
+        the next batch is requested.
+        """
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        if executor not in EXECUTORS:
+            raise ValueError("executor must be one of: " + ", ".join(EXECUTORS))
+        if max_records < 1:
+            raise ValueError("max_records must be at least 1.")
+        if max_in_flight is None:
+            max_in_flight = 2 * workers
+
+        self.commit_on_revoke = commit_on_revoke
+        self._pending = {}
+        self.consumer.subscribe([self.topic], listener=_RevokeListener(self))
+        lanes = [EXECUTORS[executor](max_workers=1) for _ in range(workers)]
+        assignment = {}
+        task = partial(_process_values, process)
+        try:
+            while True:
+                in_flight = sum(len(futures) for futures in self._pending.values())
+                polled = False
+                if in_flight < max_in_flight:
+                    records = self.consumer.poll(timeout_ms=timeout_ms if in_flight == 0 else 0, max_records=max_records)
+                    for partition, messages in records.items():
+                        if partition not in assignment:
+                            assignment[partition] = lanes[len(assignment) % workers]
+                        future = assignment[partition].submit(task, [message.value for message in messages])
+                        self._pending.setdefault(partition, deque()).append((future, messages[-1]))
+                        polled = True
+                    if not polled and in_flight == 0:
+                        if stop_when_idle:
+                            return
+                        continue
+
+                # Yield the completed batches at the head of each partition's queue.
+                ready = False
+                for partition, futures in list(self._pending.items()):
+                    while len(futures) > 0 and futures[0][0].done():
+                        future, last = futures.popleft()
+                        results = future.result()
+                        self._track(last)
+                        ready = True
+                        yield results
+                    if len(futures) == 0:
+                        del self._pending[partition]
+
+                # Wait for a result if there is nothing new to poll or submit.
+                if not ready and not polled:
+                    wait([futures[0][0] for futures in self._pending.values()], return_when=FIRST_COMPLETED)
+        finally:
+            for futures in self._pending.values():
+                for future, _ in futures:
+                    future.cancel()
+            self._pending = {}
+            for lane in lanes:
+                lane.shutdown(wait=True)
+
+    def _revoke(self, revoked):
+        """
+        Discard the in-flight batches and offsets of partitions revoked by a rebalance,
+        committing the offsets of the yielded batches first if commit_on_revoke is set.
+        This is called by the consumer during poll().
+        """
+        revoked = set(revoked)
+        for partition in revoked:
+            for future, _ in self._pending.pop(partition, ()):
+                future.cancel()
+        offsets = {partition: offset for partition, offset in self.offsets_.items() if partition in revoked}
+        if self.commit_on_revoke and len(offsets) > 0:
+            self.consumer.commit({partition: OffsetAndMetadata(offset, None) for partition, offset in offsets.items()})
+        for partition in offsets:
+            del self.offsets_[partition]
+
+    def _track(self, message):
+        """
+        Record the message as the last read message and advance the next offset to
+        commit for its partition.
+        """
+        self.message_ = message
+        partition = TopicPartition(message.topic, message.partition)
+        self.offsets_[partition] = max(self.offsets_.get(partition, 0), message.offset + 1)
+
     def commit(self):
         """
-        Commit the last read offset to Kafka. This enables the caller to control when
-        messages are considered 'committed' based on external logic.
+        Commit the read offsets of every partition to Kafka in a single call. This
+        enables the caller to control when messages are considered 'committed' based
+        on external logic.
         """
-        if self.message_ is None:
+        if len(self.offsets_) == 0:
             raise ValueError("No message to commit.")
-        self.consumer.commit({TopicPartition(self.topic, self.message_.partition): OffsetAndMetadata(self.message_.offset + 1, None)})
\ No newline at end of file
+        self.consumer.commit({partition: OffsetAndMetadata(offset, None) for partition, offset in self.offsets_.items()})
+
+class AsyncTopicReader(AsyncReader):
+    """
+    AsyncTopicReader implements reading data from a Kafka topic into an async stream.
+    It takes the same parameters as TopicReader and wraps one, so offsets are tracked
+    and committed in the same way. The consumer is only used from a single dedicated
+    thread, since KafkaConsumer is not thread-safe, and the event loop is free to run
+    other stages (e.g., parsing and corpus updates) while a poll waits on the broker.
+    """
+    def __init__(self, url, topic, resume_earliest=True, auto_commit=True, group_id="orca", auto_commit_interval=5000,
+                 consumer=None):
+        self.reader = TopicReader(url, topic, resume_earliest=resume_earliest, auto_commit=auto_commit,
+                                  group_id=group_id, auto_commit_interval=auto_commit_interval, consumer=consumer)
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    @property
+    def offsets_(self):
+        return self.reader.offsets_
+
+    async def read(self, max_records=500, timeout_ms=1000, stop_when_idle=False):
+        """
+        Read data from the Kafka topic into an async stream of message values.
+        """
+        async for batch in self.read_batches(max_records=max_records, timeout_ms=timeout_ms,
+                                             stop_when_idle=stop_when_idle):
+            for value in batch:
+                yield value
+
+    async def read_batches(self, max_records=500, timeout_ms=1000, stop_when_idle=False):
+        """
+        Read data from the Kafka topic into an async stream of batches like
+        TopicReader.read_batches(). Each poll runs in the consumer thread.
+        """
+        if max_records < 1:
+            raise ValueError("max_records must be at least 1.")
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await loop.run_in_executor(self.executor, self.reader._poll, max_records, timeout_ms)
+            if len(batch) == 0:
+                if stop_when_idle:
+                    return
+                continue
+            yield batch
+
+    async def commit(self):
+        """
+        Commit the read offsets of every partition to Kafka in a single call, like
+        TopicReader.commit().
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.reader.commit)
+
+    def close(self):
+        """
+        Stop the consumer thread.
+        """
+        self.executor.shutdown(wait=True)
@@ -13,4 +13,23 @@ class Reader():
             data = self.source.read()
         except Exception as e:
             raise ValueError("Error reading from source: " + str(e))
-        return data
\ No newline at end of file
+        return data
+
+class AsyncReader():
+    """
+    AsyncReader is a generic wrapper for asynchronously reading data from a source that supports an async read() method.
+    Subclasses implement read() as an async generator so that waiting on I/O does not
+    block the event loop.
+    """
+    def __init__(self, source):
+        self.source = source
+
+    async def read(self):
+        """
+        Read data from the source.
+        """
+        try:
+            data = await self.source.read()
+        except Exception as e:
+            raise ValueError("Error reading from source: " + str(e))
+        return data
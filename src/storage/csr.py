@@ -0,0 +1,115 @@
+import os
+import numpy as np
+from scipy.sparse import csr_matrix
+from gensim.corpora import MmCorpus
+
+from src.storage.files import read_json, write_json
+
+META_NAME = "meta.json"
+INDPTR_NAME = "indptr.bin"
+INDICES_NAME = "indices.bin"
+DATA_NAME = "data.bin"
+
+INDPTR_DTYPE = np.int64
+INDICES_DTYPE = np.int32
+
+def _memmap(path, dtype, length):
+    """
+    Memory map a flat binary array, mmap cannot map empty files so zero-length arrays
+    are returned as regular arrays.
+    """
+    if length == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(length,))
+
+class CsrCorpus():
+    """
+    CsrCorpus is a binary corpus format which stores bag-of-words documents as the
+    indptr, indices and data arrays of a compressed sparse row matrix. The arrays are
+    memory mapped rather than parsed, so opening the corpus is constant time, document
+    lookup is O(1) and the whole corpus can be handed to modeling engines as a
+    scipy.sparse.csr_matrix without copying.
+
+    The corpus is stored as a directory containing one flat binary file per array and
+    a small JSON metadata file describing their dtypes and lengths.
+    """
+    def __init__(self, path):
+        meta = read_json(os.path.join(path, META_NAME))
+        if meta is None:
+            raise ValueError("no csr corpus found at " + str(path))
+        self.path = path
+        self.num_docs = meta["num_docs"]
+        self.num_nnz = meta["num_nnz"]
+        self.num_terms = meta["num_terms"]
+        self.indptr = _memmap(os.path.join(path, INDPTR_NAME), INDPTR_DTYPE, self.num_docs + 1)
+        self.indices = _memmap(os.path.join(path, INDICES_NAME), INDICES_DTYPE, self.num_nnz)
+        self.data = _memmap(os.path.join(path, DATA_NAME), np.dtype(meta["dtype"]), self.num_nnz)
+
+    @staticmethod
+    def serialize(path, corpus, dtype=np.float32):
+        """
+        Stream the bag-of-words documents into a new CsrCorpus at the path. Documents
+        are appended to the indices and data files as they are read so only the row
+        pointers are held in memory.
+        """
+        os.makedirs(path, exist_ok=True)
+        indptr = [0]
+        num_terms = 0
+        with open(os.path.join(path, INDICES_NAME), 'wb') as indices, open(os.path.join(path, DATA_NAME), 'wb') as data:
+            for doc in corpus:
+                if len(doc) > 0:
+                    ids, values = zip(*doc)
+                    ids = np.asarray(ids, dtype=INDICES_DTYPE)
+                    indices.write(ids.tobytes())
+                    data.write(np.asarray(values, dtype=dtype).tobytes())
+                    num_terms = max(num_terms, int(ids.max()) + 1)
+                indptr.append(indptr[-1] + len(doc))
+        np.asarray(indptr, dtype=INDPTR_DTYPE).tofile(os.path.join(path, INDPTR_NAME))
+        write_json(os.path.join(path, META_NAME), {
+            "num_docs": len(indptr) - 1,
+            "num_nnz": indptr[-1],
+            "num_terms": num_terms,
+            "dtype": np.dtype(dtype).name,
+        })
+
+    def doc_arrays(self, docno):
+        """
+        Return zero-copy views of the term ids and values of the given document.
+        """
+        start, end = self.indptr[docno], self.indptr[docno + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def __getitem__(self, docno):
+        if docno < 0:
+            docno += self.num_docs
+        if docno < 0 or docno >= self.num_docs:
+            raise IndexError("document index out of range")
+        ids, values = self.doc_arrays(docno)
+        return list(zip(ids.tolist(), values.tolist()))
+
+    def __iter__(self):
+        indptr = self.indptr.tolist()
+        for docno in range(self.num_docs):
+            start, end = indptr[docno], indptr[docno + 1]
+            yield list(zip(self.indices[start:end].tolist(), self.data[start:end].tolist()))
+
+    def __len__(self):
+        return self.num_docs
+
+    def to_csr(self, num_terms=None):
+        """
+        Return the corpus as a documents x terms scipy.sparse.csr_matrix which shares
+        the memory mapped arrays. num_terms can be used to widen the matrix to the
+        size of the dictionary.
+        """
+        if num_terms is None:
+            num_terms = self.num_terms
+        return csr_matrix((self.data, self.indices, self.indptr), shape=(self.num_docs, num_terms), copy=False)
+
+def convert_mm(mm_path, path, dtype=np.float32):
+    """
+    Convert a MatrixMarket corpus, such as the corpus.mm file of an existing
+    checkpoint, into a CsrCorpus at the path.
+    """
+    CsrCorpus.serialize(path, MmCorpus(mm_path), dtype=dtype)
+    return CsrCorpus(path)
@@ -0,0 +1,28 @@
+import json
+import os
+
+# Extension of the temporary files that are renamed over their destination once
+# they have been written.
+TMP_EXT = ".tmp"
+
+def write_json(path, data):
+    """
+    Atomically write the data to the path as JSON. The data is written to a temporary
+    file which is flushed to disk and then renamed over the destination, so readers
+    always see either the previous or the new contents, never a partial write.
+    """
+    tmp = path + TMP_EXT
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def read_json(path):
+    """
+    Read JSON data from the path, returning None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,315 @@
+import os
+import shutil
+import uuid
+import numpy as np
+from bisect import bisect_right
+from itertools import chain
+from gensim.corpora import MmCorpus
+from gensim.matutils import corpus2csc
+from scipy.sparse import csr_matrix, vstack
+
+from src.storage.csr import CsrCorpus
+from src.dictionary.remap import remap_document, remap_matrix
+from src.storage.files import TMP_EXT, read_json, write_json
+
+SEGMENT_DIR = "segments"
+INDEX_EXT = ".index"
+IDS_EXT = ".ids"
+
+# Files stored alongside a segment, named by the segment name plus an extension.
+COMPANION_EXTS = [INDEX_EXT, IDS_EXT]
+
+# Segment formats by file extension.
+FORMATS = {
+    "mm": MmCorpus,
+    "csr": CsrCorpus,
+}
+
+def new_segment_name(format="mm"):
+    """
+    Return a new unique segment name in the given format, relative to the corpus
+    directory.
+    """
+    if format not in FORMATS:
+        raise ValueError("segment format must be one of: " + ", ".join(FORMATS))
+    return SEGMENT_DIR + "/" + uuid.uuid4().hex + "." + format
+
+def segment_format(name):
+    """
+    Return the corpus class used to read the named segment.
+    """
+    return FORMATS[os.path.splitext(name)[1][1:]]
+
+def segment_files(name):
+    """
+    Return the names of all files that make up the named segment.
+    """
+    return [name] + [name + ext for ext in COMPANION_EXTS]
+
+def segment_name(filename):
+    """
+    Return the name of the segment that the file in the segment directory belongs to,
+    or None if the file is not part of a segment (e.g., a temporary file that is still
+    being written).
+    """
+    for ext in COMPANION_EXTS:
+        if filename.endswith(ext):
+            filename = filename[:-len(ext)]
+            break
+    if os.path.splitext(filename)[1][1:] not in FORMATS:
+        return None
+    return SEGMENT_DIR + "/" + filename
+
+def open_segment(dir, segment):
+    """
+    Open the segment described by the segment entry for streaming.
+    """
+    return segment_format(segment["name"])(os.path.join(dir, segment["name"]))
+
+def read_ids(dir, segment):
+    """
+    Return the external document ids of the rows of the segment, with None for rows
+    that were added without an id.
+    """
+    if not segment.get("ids", False):
+        return [None] * segment["num_docs"]
+    return read_json(os.path.join(dir, segment["name"] + IDS_EXT))
+
+def segment_generation(segment):
+    """
+    Return the dictionary generation whose token ids the segment was written with.
+    """
+    return segment.get("generation", 0)
+
+def _remapped(corpus, remap):
+    """
+    Return a generator of the documents of the corpus translated with the remap table.
+    """
+    if remap is None:
+        return iter(corpus)
+    return (remap_document(doc, remap) for doc in corpus)
+
+def write_segment(dir, name, documents, ids=None, generation=0):
+    """
+    Serialize a stream of bag-of-words documents into a new immutable segment and
+    return its segment entry. Segments are never modified once they are written. If
+    the stream is empty then no segment is written and None is returned. If ids are
+    given then the external document id of each row is stored with the segment. The
+    generation of the dictionary the documents were converted with is recorded so
+    that the segment can be remapped after the dictionary is pruned.
+    """
+    path = os.path.join(dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    corpus = segment_format(name)
+    corpus.serialize(path, documents)
+    num_docs = len(corpus(path))
+    if num_docs == 0:
+        remove_segment(dir, name)
+        return None
+    segment = {"name": name, "num_docs": num_docs}
+    if generation > 0:
+        segment["generation"] = generation
+    if ids is not None and any(id is not None for id in ids):
+        write_json(path + IDS_EXT, list(ids))
+        segment["ids"] = True
+    return segment
+
+def merge_segments(dir, name, segments, remaps=None, generation=0):
+    """
+    Concatenate the given segments, in order, into a new segment and return its entry.
+    The source segments are left in place since older checkpoints may still refer to
+    them. Sources from older dictionary generations are translated with their remap
+    tables (a mapping of segment name to table) so the merged segment is written with
+    the ids of the given generation.
+    """
+    remaps = remaps or {}
+    corpora = [_remapped(open_segment(dir, s), remaps.get(s["name"])) for s in segments]
+    ids = list(chain.from_iterable(read_ids(dir, s) for s in segments))
+    return write_segment(dir, name, chain.from_iterable(corpora), ids=ids, generation=generation)
+
+def compact_segment(dir, name, segment, deleted, remap=None, generation=0):
+    """
+    Rewrite the segment without the rows at the deleted offsets. Returns the new
+    segment entry, or None if every row was deleted, along with the deleted rows. If a
+    remap table is given then the rows are translated to the ids of the generation.
+    """
+    ids = [id for offset, id in enumerate(read_ids(dir, segment)) if offset not in deleted]
+    removed = []
+
+    def rows():
+        for offset, doc in enumerate(_remapped(open_segment(dir, segment), remap)):
+            if offset in deleted:
+                removed.append(doc)
+            else:
+                yield doc
+
+    return write_segment(dir, name, rows(), ids=ids, generation=generation), removed
+
+def adopt_segment(dir, name, path):
+    """
+    Link a matrix written outside of the segment directory (e.g., by a checkpoint
+    created before corpora were segmented) into the segment directory so that it is
+    managed like any other segment. Hard links are used where possible so that this
+    does not require copying the data. If the segment is in a different format then
+    the matrix is converted instead.
+    """
+    os.makedirs(os.path.join(dir, SEGMENT_DIR), exist_ok=True)
+    if segment_format(name) is not segment_format(path):
+        segment_format(name).serialize(os.path.join(dir, name), open_segment(dir, {"name": path}))
+        return
+    for src, dst in zip(segment_files(path), segment_files(name)):
+        src = os.path.join(dir, src)
+        if not os.path.exists(src):
+            continue
+        try:
+            os.link(src, os.path.join(dir, dst))
+        except OSError:
+            shutil.copyfile(src, os.path.join(dir, dst))
+
+def remove_segment(dir, name):
+    """
+    Remove all files belonging to the named segment, including temporary files left
+    by an interrupted write.
+    """
+    for f in segment_files(name):
+        for path in [os.path.join(dir, f), os.path.join(dir, f + TMP_EXT)]:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+def size_tier(num_docs, merge_factor):
+    """
+    Return the size tier of a segment with the given number of documents. Tier t holds
+    segments with between merge_factor^t and merge_factor^(t+1) documents.
+    """
+    tier = 0
+    while num_docs >= merge_factor:
+        num_docs //= merge_factor
+        tier += 1
+    return tier
+
+def find_merge(segments, merge_factor):
+    """
+    Apply the size-tiered merge policy to the ordered list of segments. Returns the
+    (start, end) slice of the first run of merge_factor adjacent segments that belong
+    to the same size tier, or None if no merge is required. Only adjacent segments are
+    merged so that the document order of the corpus is preserved.
+    """
+    start = 0
+    for i in range(1, len(segments) + 1):
+        if i == len(segments) or size_tier(segments[i]["num_docs"], merge_factor) != size_tier(segments[start]["num_docs"], merge_factor):
+            if i - start >= merge_factor:
+                return start, start + merge_factor
+            start = i
+    return None
+
+class SegmentedCorpus():
+    """
+    SegmentedCorpus is a read-only gensim-style corpus that streams documents across
+    an ordered list of immutable segments. Rows of a segment can be marked as deleted
+    with tombstones, a mapping of segment name to deleted row offsets, in which case
+    they are skipped and excluded from the length and positions of the corpus.
+
+    Segments written before the dictionary was pruned are translated to the current
+    token ids as they are read, using remaps, a mapping of segment name to remap
+    table.
+
+    Opening a MatrixMarket segment unpickles its whole offset index, so opened
+    segments can be shared between instances with opened, a mapping of segment name
+    to opened corpus which is filled in as segments are opened. Segments are
+    immutable, so an opened segment never needs to be reopened.
+    """
+    def __init__(self, dir, segments, tombstones=None, remaps=None, opened=None):
+        self.dir = dir
+        self.segments = list(segments)
+        self.tombstones = {name: sorted(rows) for name, rows in (tombstones or {}).items()}
+        self.remaps = [(remaps or {}).get(s["name"]) for s in self.segments]
+        if opened is None:
+            opened = {}
+        self.corpora = []
+        for s in self.segments:
+            if s["name"] not in opened:
+                opened[s["name"]] = open_segment(dir, s)
+            self.corpora.append(opened[s["name"]])
+        self.offsets = [0]
+        for s in self.segments:
+            self.offsets.append(self.offsets[-1] + s["num_docs"] - len(self.tombstones.get(s["name"], [])))
+
+    def __iter__(self):
+        for segment, corpus, remap in zip(self.segments, self.corpora, self.remaps):
+            deleted = set(self.tombstones.get(segment["name"], []))
+            if len(deleted) == 0:
+                for doc in _remapped(corpus, remap):
+                    yield doc
+            else:
+                for offset, doc in enumerate(_remapped(corpus, remap)):
+                    if offset not in deleted:
+                        yield doc
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def __getitem__(self, docno):
+        """
+        Return the document at the given position in the corpus.
+        """
+        if docno < 0:
+            docno += len(self)
+        if docno < 0 or docno >= len(self):
+            raise IndexError("document index out of range")
+        i = bisect_right(self.offsets, docno) - 1
+        offset = docno - self.offsets[i]
+
+        # Skip over the deleted rows that precede the document in its segment.
+        deleted = self.tombstones.get(self.segments[i]["name"], [])
+        row = offset
+        while offset + bisect_right(deleted, row) != row:
+            row = offset + bisect_right(deleted, row)
+        return self._document(i, row)
+
+    def _document(self, i, offset):
+        """
+        Return the document at the given row offset of the i-th segment.
+        """
+        doc = self.corpora[i][offset]
+        if self.remaps[i] is not None:
+            doc = remap_document(doc, self.remaps[i])
+        return doc
+
+    def document(self, name, offset):
+        """
+        Return the document at the given row offset of the named segment.
+        """
+        for i, segment in enumerate(self.segments):
+            if segment["name"] == name:
+                return self._document(i, offset)
+        raise KeyError(name)
+
+    def to_csr(self, num_terms):
+        """
+        Return the corpus as a documents x terms scipy.sparse.csr_matrix for handing
+        off to the modeling engines. Binary segments are used without copying when the
+        corpus consists of a single segment without deleted rows or remapped ids;
+        MatrixMarket segments must be scanned.
+        """
+        matrices = []
+        for segment, corpus, remap in zip(self.segments, self.corpora, self.remaps):
+            width = num_terms if remap is None else len(remap)
+            if isinstance(corpus, CsrCorpus):
+                matrix = corpus.to_csr(width)
+            else:
+                matrix = corpus2csc(corpus, num_terms=width, num_docs=len(corpus)).T.tocsr()
+            if remap is not None:
+                matrix = remap_matrix(matrix, remap, num_terms)
+            deleted = self.tombstones.get(segment["name"], [])
+            if len(deleted) > 0:
+                keep = np.ones(matrix.shape[0], dtype=bool)
+                keep[deleted] = False
+                matrix = matrix[keep]
+            matrices.append(matrix)
+        if len(matrices) == 0:
+            return csr_matrix((0, num_terms))
+        if len(matrices) == 1:
+            return matrices[0]
+        return vstack(matrices, format="csr")
@@ -0,0 +1,206 @@
+import os
+import numpy as np
+from collections import Counter
+from collections.abc import Mapping
+from gensim.corpora import Dictionary
+
+from src.storage.csr import _memmap
+from src.storage.files import read_json, write_json
+
+META_NAME = "meta.json"
+TOKENS_NAME = "tokens.bin"
+OFFSETS_NAME = "offsets.bin"
+SORTED_NAME = "sorted.bin"
+DFS_NAME = "dfs.bin"
+CFS_NAME = "cfs.bin"
+
+def write_vocab(path, dictionary):
+    """
+    Write the vocabulary of a gensim Dictionary as flat binary arrays that can be
+    memory mapped by LazyDictionary. Tokens are stored as a UTF-8 blob indexed by
+    token id along with the ids sorted by token for lookups by token. Returns False
+    without writing anything if the dictionary ids are not contiguous.
+    """
+    num_terms = len(dictionary.token2id)
+    if num_terms > 0 and max(dictionary.token2id.values()) != num_terms - 1:
+        return False
+
+    os.makedirs(path, exist_ok=True)
+    tokens = [b""] * num_terms
+    for token, id in dictionary.token2id.items():
+        tokens[id] = token.encode("utf-8")
+    offsets = np.zeros(num_terms + 1, dtype=np.int64)
+    np.cumsum([len(t) for t in tokens], out=offsets[1:])
+    with open(os.path.join(path, TOKENS_NAME), 'wb') as f:
+        f.write(b"".join(tokens))
+    offsets.tofile(os.path.join(path, OFFSETS_NAME))
+    np.asarray(sorted(range(num_terms), key=tokens.__getitem__), dtype=np.int64).tofile(os.path.join(path, SORTED_NAME))
+
+    # Missing statistics are stored as 0 since every token in a dictionary has been
+    # seen in at least one document.
+    for name, counts in [(DFS_NAME, dictionary.dfs), (CFS_NAME, dictionary.cfs)]:
+        array = np.zeros(num_terms, dtype=np.int64)
+        for id, count in counts.items():
+            array[id] = count
+        array.tofile(os.path.join(path, name))
+
+    write_json(os.path.join(path, META_NAME), {
+        "num_terms": num_terms,
+        "num_docs": dictionary.num_docs,
+        "num_pos": dictionary.num_pos,
+        "num_nnz": dictionary.num_nnz,
+    })
+    return True
+
+def has_vocab(path):
+    """
+    Returns True if a vocabulary has been written to the path.
+    """
+    return os.path.exists(os.path.join(path, META_NAME))
+
+class _TokenIds(Mapping):
+    """
+    Read-only token -> id mapping that binary searches the sorted token ids.
+    """
+    def __init__(self, vocab):
+        self.vocab = vocab
+
+    def __getitem__(self, token):
+        if not isinstance(token, str):
+            raise KeyError(token)
+        key = token.encode("utf-8")
+        lo, hi = 0, len(self.vocab)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            id = int(self.vocab.sorted[mid])
+            if self.vocab.token_bytes(id) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.vocab):
+            id = int(self.vocab.sorted[lo])
+            if self.vocab.token_bytes(id) == key:
+                return id
+        raise KeyError(token)
+
+    def __iter__(self):
+        for id in range(len(self.vocab)):
+            yield self.vocab.id2token[id]
+
+    def __len__(self):
+        return len(self.vocab)
+
+class _IdTokens(Mapping):
+    """
+    Read-only id -> token mapping that slices the token blob.
+    """
+    def __init__(self, vocab):
+        self.vocab = vocab
+
+    def __getitem__(self, id):
+        if not 0 <= id < len(self.vocab):
+            raise KeyError(id)
+        return self.vocab.token_bytes(id).decode("utf-8")
+
+    def __iter__(self):
+        return iter(range(len(self.vocab)))
+
+    def __len__(self):
+        return len(self.vocab)
+
+class _Counts(Mapping):
+    """
+    Read-only id -> count mapping backed by a memory mapped array.
+    """
+    def __init__(self, array):
+        self.array = array
+
+    def __getitem__(self, id):
+        if not 0 <= id < len(self.array) or self.array[id] == 0:
+            raise KeyError(id)
+        return int(self.array[id])
+
+    def __iter__(self):
+        for id in np.flatnonzero(self.array).tolist():
+            yield id
+
+    def __len__(self):
+        return int(np.count_nonzero(self.array))
+
+    def to_dict(self):
+        ids = np.flatnonzero(self.array)
+        return dict(zip(ids.tolist(), self.array[ids].tolist()))
+
+class LazyDictionary():
+    """
+    LazyDictionary is a read-only view of a gensim Dictionary backed by memory mapped
+    vocabulary arrays. Opening it only reads a small metadata file; token strings and
+    statistics are paged in on demand as they are accessed. It exposes the token2id,
+    id2token, dfs and cfs mappings and the document statistics of a Dictionary, and
+    can be materialized into a full Dictionary when the vocabulary must be updated.
+    """
+    def __init__(self, path):
+        meta = read_json(os.path.join(path, META_NAME))
+        if meta is None:
+            raise ValueError("no vocabulary found at " + str(path))
+        self.path = path
+        self.num_docs = meta["num_docs"]
+        self.num_pos = meta["num_pos"]
+        self.num_nnz = meta["num_nnz"]
+        self.num_terms = meta["num_terms"]
+        self.offsets = _memmap(os.path.join(path, OFFSETS_NAME), np.int64, self.num_terms + 1)
+        self.tokens = _memmap(os.path.join(path, TOKENS_NAME), np.uint8, int(self.offsets[-1]))
+        self.sorted = _memmap(os.path.join(path, SORTED_NAME), np.int64, self.num_terms)
+        self.token2id = _TokenIds(self)
+        self.id2token = _IdTokens(self)
+        self.dfs = _Counts(_memmap(os.path.join(path, DFS_NAME), np.int64, self.num_terms))
+        self.cfs = _Counts(_memmap(os.path.join(path, CFS_NAME), np.int64, self.num_terms))
+
+    def token_bytes(self, id):
+        """
+        Return the UTF-8 encoded token with the given id.
+        """
+        return self.tokens[self.offsets[id]:self.offsets[id + 1]].tobytes()
+
+    def __getitem__(self, id):
+        return self.id2token[id]
+
+    def __len__(self):
+        return self.num_terms
+
+    def __contains__(self, id):
+        return id in self.id2token
+
+    def keys(self):
+        return list(range(self.num_terms))
+
+    def doc2bow(self, document, allow_update=False):
+        """
+        Convert a document into BoW format using the existing vocabulary. Unknown
+        tokens are ignored; the vocabulary cannot be updated.
+        """
+        if allow_update:
+            raise ValueError("LazyDictionary is read-only, materialize() it to update the vocabulary.")
+        if isinstance(document, str):
+            raise TypeError("doc2bow expects an array of unicode tokens on input, not a single string")
+        counts = Counter()
+        for token, count in Counter(document).items():
+            id = self.token2id.get(token)
+            if id is not None:
+                counts[id] += count
+        return sorted(counts.items())
+
+    def materialize(self):
+        """
+        Return a full in-memory gensim Dictionary with the same vocabulary.
+        """
+        dictionary = Dictionary()
+        tokens = self.tokens.tobytes()
+        offsets = self.offsets.tolist()
+        dictionary.token2id = {tokens[offsets[i]:offsets[i + 1]].decode("utf-8"): i for i in range(self.num_terms)}
+        dictionary.dfs = self.dfs.to_dict()
+        dictionary.cfs = self.cfs.to_dict()
+        dictionary.num_docs = self.num_docs
+        dictionary.num_pos = self.num_pos
+        dictionary.num_nnz = self.num_nnz
+        return dictionary
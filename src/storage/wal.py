@@ -0,0 +1,107 @@
+import os
+import pickle
+import struct
+import zlib
+
+LOG_EXT = ".log"
+
+# Each record is framed by its payload length and CRC32 checksum.
+HEADER = struct.Struct("<II")
+
+class WriteAheadLog():
+    """
+    WriteAheadLog is an append-only, checksummed log of records stored as a sequence
+    of files in a directory. Every append is flushed and fsynced before it returns, so
+    an acknowledged record survives a crash. Records are numbered with increasing
+    sequence numbers so that they can be replayed on top of a checkpoint and
+    truncated once a checkpoint covers them.
+
+    A torn record at the end of the log (e.g., from a crash during an append) is
+    detected by its checksum and discarded when the log is opened.
+    """
+    def __init__(self, dir, sync=True):
+        self.dir = dir
+        self.sync = sync
+        self.last_seq = 0
+        os.makedirs(dir, exist_ok=True)
+        for seq, _ in self.replay():
+            self.last_seq = seq
+        self._file = None
+
+    def _files(self):
+        """
+        Return the (first sequence number, path) of the log files in order.
+        """
+        files = []
+        for f in os.listdir(self.dir):
+            if f.endswith(LOG_EXT):
+                files.append((int(f[:-len(LOG_EXT)]), os.path.join(self.dir, f)))
+        return sorted(files)
+
+    def _open(self):
+        """
+        Start a new log file for appends beginning at the next sequence number.
+        """
+        path = os.path.join(self.dir, "{:020d}".format(self.last_seq + 1) + LOG_EXT)
+        self._file = open(path, 'ab')
+
+    def append(self, record):
+        """
+        Durably append a record to the log and return its sequence number.
+        """
+        if self._file is None:
+            self._open()
+        seq = self.last_seq + 1
+        payload = pickle.dumps((seq, record), protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._file.write(payload)
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+        self.last_seq = seq
+        return seq
+
+    def replay(self, after=0):
+        """
+        Return a generator of (seq, record) for every record in the log with a
+        sequence number greater than after. A torn or corrupt tail is truncated.
+        """
+        for _, path in self._files():
+            with open(path, 'r+b') as f:
+                offset = 0
+                while True:
+                    header = f.read(HEADER.size)
+                    if len(header) < HEADER.size:
+                        break
+                    length, crc = HEADER.unpack(header)
+                    payload = f.read(length)
+                    if length == 0 or len(payload) < length or zlib.crc32(payload) != crc:
+                        break
+                    offset = f.tell()
+                    seq, record = pickle.loads(payload)
+                    if seq > after:
+                        yield seq, record
+                if f.tell() != offset or f.read(1):
+                    f.truncate(offset)
+
+    def truncate(self, seq):
+        """
+        Discard log files whose records all have sequence numbers at or below seq.
+        Subsequent appends are written to a new file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        files = self._files()
+        for i, (_, path) in enumerate(files):
+            last = files[i + 1][0] - 1 if i + 1 < len(files) else self.last_seq
+            if last <= seq:
+                os.remove(path)
+
+    def close(self):
+        """
+        Close the current log file.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,97 @@
+from src.parser.html import HTMLParser
+from src.reader.adapters import AsyncToSyncReader, SyncToAsyncReader
+from src.reader.directory import AsyncDirectoryReader, DirectoryReader
+from src.reader.reader import AsyncReader, Reader
+
+import os
+import asyncio
+import pytest
+
+class ListReader(Reader):
+    def __init__(self, data):
+        self.data = data
+        self.closed = False
+
+    def read(self):
+        try:
+            for item in self.data:
+                yield item
+        finally:
+            self.closed = True
+
+class AsyncListReader(AsyncReader):
+    def __init__(self, data):
+        self.data = data
+
+    async def read(self):
+        for item in self.data:
+            await asyncio.sleep(0)
+            yield item
+
+async def read_all(reader, limit=None):
+    items = []
+    async for item in reader.read():
+        items.append(item)
+        if len(items) == limit:
+            break
+    return items
+
+class TestAdapters():
+    """
+    Tests for the sync <-> async reader adapters.
+    """
+
+    @pytest.mark.parametrize("data", [[], ["foo"], ["foo", "bar", "baz"]])
+    def test_sync_to_async(self, data):
+        """
+        Test that a Reader can be read as an AsyncReader.
+        """
+        assert asyncio.run(read_all(SyncToAsyncReader(ListReader(data)))) == data
+
+    def test_sync_to_async_close(self):
+        """
+        Test that the wrapped stream is closed when the async stream is closed early.
+        """
+        reader = ListReader(["foo", "bar", "baz"])
+        assert asyncio.run(read_all(SyncToAsyncReader(reader), limit=1)) == ["foo"]
+        assert reader.closed
+
+    @pytest.mark.parametrize("data", [[], ["foo"], ["foo", "bar", "baz"]])
+    def test_async_to_sync(self, data):
+        """
+        Test that an AsyncReader can be read as a Reader.
+        """
+        assert list(AsyncToSyncReader(AsyncListReader(data)).read()) == data
+
+    def test_round_trip(self, tmpdir):
+        """
+        Test that wrapping both ways preserves the stream.
+        """
+        for name in ["foo.txt", "bar.txt"]:
+            with open(os.path.join(tmpdir, name), 'w') as f:
+                f.write(name)
+        reader = AsyncToSyncReader(SyncToAsyncReader(DirectoryReader(tmpdir)))
+        assert list(reader.read()) == list(DirectoryReader(tmpdir).read())
+
+    def test_html_parser(self, tmpdir):
+        """
+        Test that an AsyncReader can be used with the HTMLParser.
+        """
+        with open(os.path.join(tmpdir, "doc.html"), 'w') as f:
+            f.write("<h1>Heading</h1><p>Paragraph</p>")
+        parser = HTMLParser(AsyncToSyncReader(AsyncDirectoryReader(tmpdir)))
+        assert list(parser.parse()) == ["Heading Paragraph"]
+
+    @pytest.mark.parametrize(
+        "adapter, reader",
+        [
+            (SyncToAsyncReader, AsyncListReader([])),
+            (AsyncToSyncReader, ListReader([])),
+        ]
+    )
+    def test_invalid_reader(self, adapter, reader):
+        """
+        Test that the adapters require the reader type they adapt from.
+        """
+        with pytest.raises(ValueError):
+            adapter(reader)
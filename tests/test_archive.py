@@ -0,0 +1,110 @@
+from src.parser.html import HTMLParser
+from src.reader.archive import ArchiveReader
+
+import io
+import os
+import gzip
+import tarfile
+import pytest
+
+def write_tar(path, files, mode="w:gz"):
+    with tarfile.open(path, mode) as tar:
+        for name, data in files.items():
+            data = data.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+def warc_record(type, payload, content_type="application/http; msgtype=response"):
+    if type == "response":
+        payload = b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n" + payload
+    headers = (
+        "WARC/1.0\r\n"
+        "WARC-Type: " + type + "\r\n"
+        "Content-Type: " + content_type + "\r\n"
+        "Content-Length: " + str(len(payload)) + "\r\n\r\n"
+    )
+    return headers.encode("utf-8") + payload + b"\r\n\r\n"
+
+def write_warc(path, records, compress=True):
+    with open(path, 'wb') as f:
+        for record in records:
+            # WARC files are conventionally compressed one gzip member per record.
+            f.write(gzip.compress(record) if compress else record)
+
+class TestArchiveReader():
+    """
+    Tests for the ArchiveReader class.
+    """
+
+    @pytest.mark.parametrize("name, mode", [("docs.tar.gz", "w:gz"), ("docs.tgz", "w:gz"), ("docs.tar", "w")])
+    def test_read_tar(self, tmpdir, name, mode):
+        """
+        Test that the files of a tar archive are streamed in archive order.
+        """
+        path = os.path.join(tmpdir, name)
+        write_tar(path, {"a.html": "foo", "sub/b.html": "bar", "c.html": "baz"}, mode=mode)
+        assert list(ArchiveReader(path).read()) == ["foo", "bar", "baz"]
+
+    @pytest.mark.parametrize("name, compress", [("crawl.warc.gz", True), ("crawl.warc", False)])
+    def test_read_warc(self, tmpdir, name, compress):
+        """
+        Test that the payloads of response and resource records are streamed without
+        their HTTP headers.
+        """
+        path = os.path.join(tmpdir, name)
+        write_warc(path, [
+            warc_record("warcinfo", b"software: test", content_type="application/warc-fields"),
+            warc_record("request", b"GET / HTTP/1.1\r\n\r\n", content_type="application/http; msgtype=request"),
+            warc_record("response", b"<p>foo</p>"),
+            warc_record("resource", b"<p>bar</p>", content_type="text/html"),
+        ], compress=compress)
+        assert list(ArchiveReader(path).read()) == ["<p>foo</p>", "<p>bar</p>"]
+
+    def test_read_multiple(self, tmpdir):
+        """
+        Test that multiple archives are read in order.
+        """
+        tar = os.path.join(tmpdir, "docs.tar.gz")
+        warc = os.path.join(tmpdir, "crawl.warc.gz")
+        write_tar(tar, {"a.html": "foo"})
+        write_warc(warc, [warc_record("response", b"bar")])
+        assert list(ArchiveReader([warc, tar]).read()) == ["bar", "foo"]
+
+    def test_html_parser(self, tmpdir):
+        """
+        Test that the reader plugs into the HTMLParser.
+        """
+        path = os.path.join(tmpdir, "docs.tar.gz")
+        write_tar(path, {"a.html": "<h1>Heading</h1><p>Text</p>", "b.html": "<li>Item</li>"})
+        parser = HTMLParser(ArchiveReader(path))
+        assert list(parser.parse()) == ["Heading Text", "Item"]
+
+    def test_close(self, tmpdir):
+        """
+        Test that closing the stream early stops the decompression thread.
+        """
+        path = os.path.join(tmpdir, "docs.tar.gz")
+        write_tar(path, {"doc" + str(i) + ".html": str(i) for i in range(50)})
+        stream = ArchiveReader(path, queue_size=1).read()
+        assert next(stream) == "0"
+        stream.close()
+
+    @pytest.mark.parametrize("data", [b"not an archive", b"WARC/1.0\r\nContent-Length: 100\r\n\r\nshort"])
+    def test_read_invalid(self, tmpdir, data):
+        """
+        Test that errors reading an archive are raised from the stream.
+        """
+        path = os.path.join(tmpdir, "bad.tar.gz" if data.startswith(b"not") else "bad.warc")
+        with open(path, 'wb') as f:
+            f.write(data)
+        with pytest.raises(ValueError):
+            list(ArchiveReader(path).read())
+
+    @pytest.mark.parametrize("paths, kwargs", [("docs.zip", {}), ("docs.tar", {"queue_size": 0})])
+    def test_invalid_init(self, paths, kwargs):
+        """
+        Test that unknown formats and invalid queue sizes are rejected.
+        """
+        with pytest.raises(ValueError):
+            ArchiveReader(paths, **kwargs)
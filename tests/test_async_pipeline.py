@@ -0,0 +1,101 @@
+from src.corpus import OnlineTextCorpus
+from src.pipeline.async_pipeline import AsyncPipeline, parse_tokens
+from src.reader.adapters import SyncToAsyncReader
+from src.reader.directory import AsyncDirectoryReader, DirectoryReader
+from src.reader.reader import AsyncReader, Reader
+
+import os
+import asyncio
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+
+class ListReader(Reader):
+    def __init__(self, data):
+        self.data = data
+
+    def read(self):
+        yield from self.data
+
+class FailingReader(AsyncReader):
+    def __init__(self, data):
+        self.data = data
+
+    async def read(self):
+        for item in self.data:
+            yield item
+        raise ValueError("connection lost")
+
+class TestAsyncPipeline():
+    """
+    Tests for the AsyncPipeline class.
+    """
+
+    def write_documents(self, dir, documents):
+        for i, html in enumerate(documents):
+            with open(os.path.join(dir, "doc" + str(i) + ".html"), 'w') as f:
+                f.write(html)
+
+    @pytest.mark.parametrize("batch_size, max_pending", [(1, 1), (2, 16), (100, 4)])
+    def test_run(self, tmpdir, batch_size, max_pending):
+        """
+        Test that documents are read, parsed and added to the corpus in read order.
+        """
+        documents = ["<h1>Doc " + str(i) + "</h1><p>Some text</p>" for i in range(5)]
+        self.write_documents(tmpdir.mkdir("html"), documents)
+        corpus = OnlineTextCorpus(tmpdir.mkdir("corpus"))
+        reader = AsyncDirectoryReader(os.path.join(tmpdir, "html"))
+        pipeline = AsyncPipeline(reader, corpus, batch_size=batch_size, max_pending=max_pending)
+        assert asyncio.run(pipeline.run()) == {"read": 5, "failed": 0, "added": 5}
+
+        dictionary = corpus.get_dictionary()
+        expected = [
+            dictionary.doc2bow(parse_tokens(html))
+            for html in DirectoryReader(os.path.join(tmpdir, "html")).read()
+        ]
+        assert list(corpus.mm) == expected
+
+    def test_process_executor(self, tmpdir):
+        """
+        Test that parsing can be offloaded to a process pool.
+        """
+        corpus = OnlineTextCorpus(tmpdir)
+        reader = ListReader(["<p>one two</p>", "<p>three</p>"])
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            pipeline = AsyncPipeline(reader, corpus, executor=executor)
+            assert asyncio.run(pipeline.run()) == {"read": 2, "failed": 0, "added": 2}
+        assert corpus.dictionary.num_docs == 2
+
+    def test_failed(self, tmpdir):
+        """
+        Test that documents that fail to parse are skipped and counted.
+        """
+        corpus = OnlineTextCorpus(tmpdir)
+        pipeline = AsyncPipeline(SyncToAsyncReader(ListReader(["<p>one</p>", 42, "<p>two</p>"])), corpus)
+        assert asyncio.run(pipeline.run()) == {"read": 3, "failed": 1, "added": 2}
+
+    def test_reader_error(self, tmpdir):
+        """
+        Test that a reader error is raised after the documents read before it have
+        been added.
+        """
+        corpus = OnlineTextCorpus(tmpdir)
+        pipeline = AsyncPipeline(FailingReader(["<p>one</p>", "<p>two</p>"]), corpus, max_pending=1)
+        with pytest.raises(ValueError):
+            asyncio.run(pipeline.run())
+        assert pipeline.stats["added"] == 2
+        assert corpus.dictionary.num_docs == 2
+
+    @pytest.mark.parametrize(
+        "reader, kwargs",
+        [
+            (None, {}),
+            (ListReader([]), {"batch_size": 0}),
+            (ListReader([]), {"max_pending": 0}),
+        ]
+    )
+    def test_invalid_init(self, tmpdir, reader, kwargs):
+        """
+        Test that the reader and stage sizes are validated.
+        """
+        with pytest.raises(ValueError):
+            AsyncPipeline(reader, OnlineTextCorpus(tmpdir), **kwargs)
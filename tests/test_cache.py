@@ -0,0 +1,91 @@
+from src.parser.cache import ParseCache, content_hash
+
+import pytest
+
+class TestParseCache():
+    """
+    Tests for the ParseCache class.
+    """
+
+    def test_content_hash(self):
+        """
+        Test that keys depend on the content and the namespace.
+        """
+        assert content_hash("<p>text</p>") == content_hash(b"<p>text</p>")
+        assert len(content_hash("<p>text</p>")) == 16
+        assert content_hash("<p>text</p>") != content_hash("<p>other</p>")
+        assert content_hash("<p>text</p>", "lead") != content_hash("<p>text</p>")
+
+    @pytest.mark.parametrize("value", ["text", "", ["token", "list"]])
+    def test_get_put(self, tmpdir, value):
+        """
+        Test caching values and counting hits and misses.
+        """
+        cache = ParseCache(str(tmpdir.join("cache.db")))
+        key = content_hash("<p>text</p>")
+        assert cache.get(key) is None
+        cache.put(key, value)
+        assert cache.get(key) == value
+        assert len(cache) == 1
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 1, 0)
+        assert stats["hit_rate"] == 0.5
+
+    def test_persistence(self, tmpdir):
+        """
+        Test that the cache is persisted and reopened with its size and recency.
+        """
+        path = str(tmpdir.join("dir", "cache.db"))
+        cache = ParseCache(path, max_bytes=20)
+        cache.put(b"a", "aaaa")
+        cache.put(b"b", "bbbb")
+        cache.get(b"a")
+        cache.close()
+
+        cache = ParseCache(path, max_bytes=20)
+        assert cache.size == 12
+        assert cache.get(b"a") == "aaaa"
+        cache.put(b"c", "cccccccc")
+        assert cache.get(b"b") is None
+        assert cache.get(b"a") == "aaaa"
+        assert cache.evictions == 1
+
+    def test_eviction(self, tmpdir):
+        """
+        Test that the least recently used entries are evicted to stay within the size
+        bound.
+        """
+        cache = ParseCache(str(tmpdir.join("cache.db")), max_bytes=30)
+        for i in range(5):
+            cache.put(str(i).encode(), "x" * 8)
+            cache.get(b"0")
+        assert [cache.get(str(i).encode()) is not None for i in range(5)] == [True, False, False, True, True]
+        assert cache.size == 30
+        assert cache.evictions == 2
+
+        # Replacing an entry updates the size, and values larger than the cache are
+        # not stored.
+        cache.put(b"0", "x")
+        assert cache.size == 23
+        cache.put(b"5", "x" * 100)
+        assert cache.get(b"5") is None
+        assert len(cache) == 3
+
+    def test_size_bytes(self, tmpdir):
+        """
+        Test that the size of non-ASCII values is measured in UTF-8 bytes.
+        """
+        cache = ParseCache(str(tmpdir.join("cache.db")), max_bytes=30)
+        cache.put(b"a", "\u00e9" * 10)
+        assert cache.size == 22
+        assert cache.get(b"a") == "\u00e9" * 10
+        cache.put(b"b", "\u6587" * 10)
+        assert cache.get(b"b") is None
+        assert cache.size == 22
+
+    def test_invalid(self, tmpdir):
+        """
+        Test that an invalid size bound is rejected.
+        """
+        with pytest.raises(ValueError):
+            ParseCache(str(tmpdir.join("cache.db")), max_bytes=0)
@@ -0,0 +1,79 @@
+from src.analyzer.coherence import CooccurrenceAccumulator, top_words
+
+import random
+import pytest
+from gensim.corpora import Dictionary
+from gensim.models.coherencemodel import CoherenceModel
+from gensim.models.ldamodel import LdaModel
+
+def random_documents(num_docs=100, doc_length=20, vocab_size=100, seed=0):
+    rng = random.Random(seed)
+    vocab = ["token{}".format(i) for i in range(vocab_size)]
+    weights = [1 / (i + 1) for i in range(vocab_size)]
+    return [rng.choices(vocab, weights=weights, k=doc_length) for _ in range(num_docs)]
+
+class TestCooccurrenceAccumulator():
+    """
+    Tests for the CooccurrenceAccumulator class.
+    """
+
+    def test_counts(self):
+        """
+        Test counting tracked words and pairs in batches and backfilling new words.
+        """
+        corpus = [[(0, 1), (1, 2)], [(1, 1), (2, 1)], [(0, 3), (2, 1), (3, 1)]]
+        accumulator = CooccurrenceAccumulator()
+        accumulator.update(corpus[:2])
+        accumulator.track([1, 0, 1], corpus[:2])
+        assert list(accumulator.index) == [1, 0]
+        assert accumulator.counts.tolist() == [[2, 1], [1, 1]]
+
+        accumulator.update(corpus[2:])
+        accumulator.track([2], corpus)
+        assert accumulator.num_docs == 3
+        assert accumulator.counts.tolist() == [[2, 1, 1], [1, 2, 1], [1, 1, 2]]
+        with pytest.raises(ValueError):
+            accumulator.track([3], corpus[:2])
+
+    def test_remove_retain(self):
+        """
+        Test uncounting documents and dropping tracked words.
+        """
+        corpus = [[(0, 1), (1, 2)], [(1, 1), (2, 1)], [(0, 3), (2, 1), (3, 1)]]
+        accumulator = CooccurrenceAccumulator()
+        accumulator.track([0, 1, 2], [])
+        accumulator.update(corpus)
+        accumulator.remove(corpus[:1])
+        accumulator.retain([2, 0, 5])
+        assert accumulator.num_docs == 2
+        assert accumulator.index == {0: 0, 2: 1}
+        assert accumulator.counts.tolist() == [[1, 1], [1, 2]]
+
+    @pytest.mark.parametrize("batches", [1, 4])
+    def test_u_mass(self, batches):
+        """
+        Test that the coherence of several models is the same as CoherenceModel's.
+        """
+        documents = random_documents()
+        dictionary = Dictionary(documents)
+        corpus = [dictionary.doc2bow(doc) for doc in documents]
+        models = [LdaModel(corpus, id2word=dictionary, num_topics=k, random_state=1) for k in [2, 5]]
+        accumulator = CooccurrenceAccumulator()
+        size = len(corpus) // batches
+        for start in range(0, len(corpus), size):
+            accumulator.update(corpus[start:start + size])
+            for model in models:
+                accumulator.track([id for topic in top_words(model) for id in topic], corpus[:start + size])
+            for model in models:
+                cm = CoherenceModel(model=model, corpus=corpus[:start + size], dictionary=dictionary, coherence='u_mass')
+                assert accumulator.u_mass(top_words(model)) == cm.get_coherence()
+
+    def test_u_mass_empty(self):
+        """
+        Test that words that do not occur in the corpus do not contribute.
+        """
+        accumulator = CooccurrenceAccumulator()
+        accumulator.track([0, 1], [])
+        assert accumulator.u_mass([[0, 1]]) == 0.0
+        accumulator.update([[(0, 1)], [(0, 1), (1, 1)]])
+        assert accumulator.u_mass([[1, 0], [0, 1]]) == pytest.approx(0.5 * (-0.693147180 + 0.0))
@@ -1,6 +1,13 @@
+from src import corpus as corpus_module
 from src.corpus import OnlineTextCorpus
+from src.storage import segment as segment_module
+from src.storage.segment import write_segment
+from src.storage.vocab import LazyDictionary
+from src.analyzer.vocab import VocabAnalyzer
+from src.dictionary.sketch import SketchDictionary
 
 import os
+import time
 import pytest
 from gensim.corpora import Dictionary
 from gensim.corpora import MmCorpus
@@ -101,4 +108,650 @@ class TestOnlineTextCorpus():
         counts = []
         for document in corpus.iter_corpus(documents=additional):
             counts.append(len(document))
-        assert counts == expected_words
\ No newline at end of file
+        assert counts == expected_words
+
+    @pytest.mark.parametrize("wal", [False, True])
+    def test_iter(self, tmpdir, wal):
+        """
+        Test that the corpus can be streamed and sized like a gensim corpus, including
+        logged documents.
+        """
+        documents = [["hello", "world"], ["the", "quick", "brown", "fox"], ["fox"]]
+        corpus = OnlineTextCorpus(tmpdir, wal=wal, checkpoint_docs=100)
+        assert len(corpus) == 0
+        assert list(corpus) == []
+        corpus.add_documents(documents[:2])
+        corpus.add_documents(documents[2:])
+        assert len(corpus) == 3
+        assert list(corpus) == list(corpus) == list(corpus.iter_corpus())
+        assert [len(doc) for doc in corpus] == [2, 4, 1]
+        corpus.close()
+
+    def test_segments(self, tmpdir):
+        """
+        Test that add_documents() writes each batch as a new segment which is shared
+        with older checkpoints rather than copied.
+        """
+        corpus = OnlineTextCorpus(tmpdir, num_checkpoints=2, merge_factor=10)
+        corpus.add_documents([["hello", "world"]])
+        first = corpus.segments[0]["name"]
+        inode = os.stat(os.path.join(tmpdir, first)).st_ino
+
+        corpus.add_documents([["the", "quick", "brown", "fox"], ["jumped"]])
+        assert [s["num_docs"] for s in corpus.segments] == [1, 2]
+        assert corpus.segments[0]["name"] == first
+        assert os.stat(os.path.join(tmpdir, first)).st_ino == inode
+
+        # Segments are removed once no retained checkpoint refers to them.
+        corpus.add_documents([["lazy", "dog"]])
+        assert sorted(os.listdir(tmpdir)) == ["MANIFEST.json", "corpus_2", "corpus_3", "segments"]
+        assert len(os.listdir(os.path.join(tmpdir, "segments"))) == 6
+
+        # A fresh corpus loads the segments of the latest version.
+        loaded = OnlineTextCorpus(tmpdir)
+        loaded.load()
+        assert loaded.version == 3
+        assert list(loaded.mm) == list(corpus.mm)
+
+    @pytest.mark.parametrize("format", ["mm", "csr"])
+    def test_segments_opened_once(self, tmpdir, monkeypatch, format):
+        """
+        Test that each checkpoint only opens the new segment rather than reopening
+        every segment of the corpus.
+        """
+        opened = []
+        open_segment = segment_module.open_segment
+
+        def counting_open_segment(dir, segment):
+            opened.append(segment["name"])
+            return open_segment(dir, segment)
+
+        monkeypatch.setattr(segment_module, "open_segment", counting_open_segment)
+        corpus = OnlineTextCorpus(tmpdir, format=format)
+        documents = [[str(i), "word"] for i in range(5)]
+        for doc in documents:
+            corpus.add_documents([doc])
+        assert sorted(opened) == sorted(s["name"] for s in corpus.segments)
+        assert list(corpus.mm) == [corpus.dictionary.doc2bow(doc) for doc in documents]
+
+    @pytest.mark.parametrize(
+        "background_merge",
+        [False, True]
+    )
+    def test_merge(self, tmpdir, background_merge):
+        """
+        Test that segments are merged according to the size-tiered merge policy.
+        """
+        corpus = OnlineTextCorpus(tmpdir, num_checkpoints=1, merge_factor=2, background_merge=background_merge)
+        documents = [[str(i), "word"] for i in range(7)]
+        for doc in documents:
+            corpus.add_documents([doc])
+            corpus.close()
+
+        # 7 documents merged in tiers of 4, 2 and 1 documents.
+        assert [s["num_docs"] for s in corpus.segments] == [4, 2, 1]
+        assert list(corpus.mm) == [corpus.dictionary.doc2bow(doc) for doc in documents]
+
+        # Merged-away segments are garbage collected by the next checkpoint.
+        corpus.add_documents([])
+        assert len(os.listdir(os.path.join(tmpdir, "segments"))) == 6
+
+    def test_merge_error(self, tmpdir, monkeypatch):
+        """
+        Test that a failed background merge releases its segment, removes its partial
+        output and is raised by the next add_documents() and close().
+        """
+        def merge_segments(dir, name, segments, remaps=None, generation=0):
+            write_segment(dir, name, [[(0, 1.0)]])
+            raise OSError("disk full")
+
+        monkeypatch.setattr(corpus_module, "merge_segments", merge_segments)
+        corpus = OnlineTextCorpus(tmpdir, merge_factor=2)
+        corpus.add_documents([["hello"]])
+        corpus.add_documents([["world"]])
+        corpus._merger.join()
+        assert corpus._pending == set()
+        assert len(os.listdir(os.path.join(tmpdir, "segments"))) == 4
+        with pytest.raises(ValueError):
+            corpus.add_documents([["again"]])
+        with pytest.raises(ValueError):
+            corpus.close()
+        assert [s["num_docs"] for s in corpus.segments] == [1, 1]
+
+    def test_gc_in_flight_segment(self, tmpdir):
+        """
+        Test that checkpoints do not garbage collect the files of a segment that is
+        still being written.
+        """
+        corpus = OnlineTextCorpus(tmpdir, format="csr")
+        corpus.add_documents([["hello", "world"]], ids=["a"])
+        name = corpus._reserve_segment()
+        os.makedirs(os.path.join(tmpdir, name))
+        open(os.path.join(tmpdir, name + ".ids.tmp"), "w").close()
+        corpus.add_documents([["the", "quick", "fox"]], ids=["b"])
+        assert os.path.isdir(os.path.join(tmpdir, name))
+        assert os.path.exists(os.path.join(tmpdir, name + ".ids.tmp"))
+
+        # Unreferenced segments are removed once their write is abandoned.
+        corpus._pending.discard(name)
+        corpus.add_documents([["lazy", "dog"]])
+        assert not os.path.exists(os.path.join(tmpdir, name))
+        assert not os.path.exists(os.path.join(tmpdir, name + ".ids.tmp"))
+
+    def test_legacy_checkpoint(self, tmpdir):
+        """
+        Test that a checkpoint holding a single matrix is adopted as a segment.
+        """
+        dictionary = Dictionary([["hello", "world"]])
+        corpus_path = os.path.join(tmpdir, "corpus_1")
+        os.mkdir(corpus_path)
+        dictionary.save(os.path.join(corpus_path, "dict"))
+        MmCorpus.serialize(os.path.join(corpus_path, "corpus.mm"), [dictionary.doc2bow(["hello", "world"])])
+
+        corpus = OnlineTextCorpus(tmpdir, num_checkpoints=1)
+        corpus.add_documents([["hello"]])
+        assert sorted(os.listdir(tmpdir)) == ["MANIFEST.json", "corpus_2", "segments"]
+        assert [s["num_docs"] for s in corpus.segments] == [1, 1]
+        assert list(corpus.mm) == [[(0, 1.0), (1, 1.0)], [(0, 1.0)]]
+
+    @pytest.mark.parametrize(
+        "format",
+        ["mm", "csr"]
+    )
+    def test_format(self, tmpdir, format):
+        """
+        Test that the corpus supports random access and csr handoff in all formats.
+        """
+        documents = [["hello", "world"], ["hello"], ["the", "quick", "brown", "fox"]]
+        corpus = OnlineTextCorpus(tmpdir, merge_factor=2, background_merge=False, format=format)
+        for doc in documents:
+            corpus.add_documents([doc])
+        assert all(s["name"].endswith("." + format) for s in corpus.segments)
+
+        expected = [corpus.dictionary.doc2bow(doc) for doc in documents]
+        assert list(corpus.mm) == expected
+        assert [corpus.mm[i] for i in range(len(documents))] == expected
+
+        matrix = corpus.to_csr()
+        assert matrix.shape == (3, 6)
+        assert matrix.sum() == 7
+
+    def test_invalid_format(self, tmpdir):
+        """
+        Test that an unknown segment format is rejected.
+        """
+        with pytest.raises(ValueError):
+            OnlineTextCorpus(tmpdir, format="txt")
+
+    def test_wal_checkpoint_retry(self, tmpdir, monkeypatch):
+        """
+        Test that a checkpoint which fails to write its segment can be retried without
+        counting the logged documents twice in the checkpointed dictionary.
+        """
+        def failing_write_segment(*args, **kwargs):
+            raise OSError("disk full")
+
+        documents = [["hello", "world"], ["hello", "fox"]]
+        corpus = OnlineTextCorpus(tmpdir, wal=True, checkpoint_docs=100)
+        corpus.add_documents(documents)
+        with monkeypatch.context() as m:
+            m.setattr(corpus_module, "write_segment", failing_write_segment)
+            with pytest.raises(OSError):
+                corpus.checkpoint()
+        corpus.close()
+
+        expected = Dictionary(documents)
+        loaded = OnlineTextCorpus(tmpdir)
+        dictionary = loaded.get_dictionary()
+        assert dictionary.num_docs == 2
+        assert dictionary.num_pos == expected.num_pos
+        assert dictionary.dfs[dictionary.token2id["hello"]] == 2
+        assert dictionary.cfs[dictionary.token2id["fox"]] == 1
+        assert len(loaded) == 2
+
+    @pytest.mark.parametrize(
+        "hash_dictionary",
+        [False, True]
+    )
+    def test_wal_recovery(self, tmpdir, hash_dictionary):
+        """
+        Test that logged documents are recovered on load() and checkpointed on close().
+        """
+        documents = [["hello", "world"], ["the", "quick", "brown", "fox"], ["hello", "fox", "fox"]]
+        corpus = OnlineTextCorpus(tmpdir, hash_dictionary=hash_dictionary, wal=True, checkpoint_docs=100)
+        corpus.add_documents(documents[:2])
+        corpus.add_documents(documents[2:])
+        assert corpus.version == 0
+        assert len(list(corpus.iter_corpus())) == 3
+
+        # Simulate a crash by loading the corpus from disk without closing it.
+        recovered = OnlineTextCorpus(tmpdir, hash_dictionary=hash_dictionary, wal=True, checkpoint_docs=100)
+        recovered.load()
+        assert list(recovered.iter_corpus()) == list(corpus.iter_corpus())
+        assert recovered.dictionary.dfs == corpus.dictionary.dfs
+        assert recovered.dictionary.num_pos == corpus.dictionary.num_pos
+        if not hash_dictionary:
+            assert recovered.dictionary.cfs == corpus.dictionary.cfs
+            assert recovered.dictionary.token2id == corpus.dictionary.token2id
+
+        recovered.close()
+        assert recovered.version == 1
+        assert len(recovered.mm) == 3
+
+        # The checkpointed documents are not replayed again.
+        loaded = OnlineTextCorpus(tmpdir, hash_dictionary=hash_dictionary, wal=True)
+        loaded.load()
+        assert loaded.version == 1
+        assert list(loaded.iter_corpus()) == list(recovered.mm)
+        assert loaded.dictionary.dfs == recovered.dictionary.dfs
+
+    def test_wal_checkpoint_trigger(self, tmpdir):
+        """
+        Test that the background worker checkpoints once enough documents are logged.
+        """
+        corpus = OnlineTextCorpus(tmpdir, wal=True, checkpoint_docs=2)
+        corpus.add_documents([["hello", "world"]])
+        corpus.add_documents([["hello"], ["world"]])
+        deadline = time.time() + 5
+        while corpus.version == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        assert corpus.version == 1
+
+        corpus.add_documents([["fox"]])
+        corpus.close()
+        assert corpus.version == 2
+        assert [len(doc) for doc in corpus.mm] == [2, 1, 1, 1]
+        assert corpus.dictionary.num_docs == 4
+
+        loaded = OnlineTextCorpus(tmpdir)
+        loaded.load()
+        assert loaded.dictionary.token2id == corpus.dictionary.token2id
+        assert loaded.dictionary.dfs == corpus.dictionary.dfs
+
+    def test_manifest(self, tmpdir, monkeypatch):
+        """
+        Test that load() starts from the manifest with a lazily loaded dictionary.
+        """
+        corpus = OnlineTextCorpus(tmpdir)
+        corpus.add_documents([["hello", "world"], ["hello"]])
+        corpus.add_documents([["the", "quick", "brown", "fox"]])
+        corpus.close()
+
+        # The corpus directory should not be scanned on startup.
+        listdir = os.listdir
+        monkeypatch.setattr(os, "listdir", lambda path: pytest.fail("listdir called"))
+        loaded = OnlineTextCorpus(tmpdir)
+        dictionary = loaded.get_dictionary()
+        monkeypatch.setattr(os, "listdir", listdir)
+
+        assert isinstance(dictionary, LazyDictionary)
+        assert loaded.version == 2
+        assert len(loaded.mm) == 3
+        assert dictionary.token2id["fox"] == corpus.dictionary.token2id["fox"]
+        assert dictionary.num_docs == 3
+
+        # Adding documents materializes the dictionary.
+        loaded.add_documents([["fox", "jumped"]])
+        assert isinstance(loaded.dictionary, Dictionary)
+        assert loaded.dictionary.token2id["jumped"] == 6
+        assert loaded.dictionary.dfs[corpus.dictionary.token2id["fox"]] == 2
+
+    def test_vocab_interval(self, tmpdir):
+        """
+        Test that the vocabulary arrays are only written every vocab_interval
+        checkpoints and on close(), and that versions without them load the pickled
+        dictionary.
+        """
+        corpus = OnlineTextCorpus(tmpdir, num_checkpoints=10, vocab_interval=2)
+        for doc in [["hello", "world"], ["the", "quick"], ["brown", "fox"]]:
+            corpus.add_documents([doc])
+        assert [os.path.isdir(os.path.join(tmpdir, "corpus_" + str(v), "vocab")) for v in [1, 2, 3]] == [False, True, False]
+
+        loaded = OnlineTextCorpus(tmpdir)
+        assert isinstance(loaded.get_dictionary(), Dictionary)
+        assert loaded.dictionary.token2id == corpus.dictionary.token2id
+
+        corpus.close()
+        loaded = OnlineTextCorpus(tmpdir)
+        assert isinstance(loaded.get_dictionary(), LazyDictionary)
+        assert dict(loaded.dictionary.token2id) == corpus.dictionary.token2id
+
+    @pytest.mark.parametrize(
+        "wal, format",
+        [(False, "mm"), (False, "csr"), (True, "mm")]
+    )
+    def test_document_ids(self, tmpdir, wal, format):
+        """
+        Test that documents can be looked up, replaced and deleted by external id.
+        """
+        corpus = OnlineTextCorpus(tmpdir, wal=wal, format=format)
+        corpus.add_documents([["hello", "world"], ["the", "quick", "fox"], ["lazy", "dog"]], ids=["a", "b", None])
+        corpus.add_documents([["hello", "fox"]], ids=["a"])
+        corpus.close()
+
+        dictionary = corpus.dictionary
+        assert corpus.get_document("a") == dictionary.doc2bow(["hello", "fox"])
+        assert corpus.get_document("b") == dictionary.doc2bow(["the", "quick", "fox"])
+        assert corpus.get_document("c") is None
+        assert len(list(corpus.iter_corpus())) == 3
+
+        assert corpus.delete(["b", "c"]) == 1
+        assert corpus.get_document("b") is None
+        assert list(corpus.iter_corpus()) == [dictionary.doc2bow(doc) for doc in [["lazy", "dog"], ["hello", "fox"]]]
+        assert corpus.mm[1] == dictionary.doc2bow(["hello", "fox"])
+        assert corpus.to_csr().shape[0] == 2
+
+        # Tombstones survive a restart.
+        loaded = OnlineTextCorpus(tmpdir, wal=wal, format=format)
+        loaded.load()
+        assert len(list(loaded.iter_corpus())) == 2
+        assert loaded.get_document("a") == dictionary.doc2bow(["hello", "fox"])
+        assert loaded.get_document("b") is None
+
+    def test_delete_after_reload(self, tmpdir):
+        """
+        Test that documents can be deleted from a reopened corpus, whose dictionary is
+        loaded lazily.
+        """
+        corpus = OnlineTextCorpus(tmpdir)
+        corpus.add_documents([["hello", "world"], ["the", "quick", "fox"]], ids=["a", "b"])
+        corpus.close()
+
+        loaded = OnlineTextCorpus(tmpdir)
+        assert isinstance(loaded.get_dictionary(), LazyDictionary)
+        assert loaded.delete(["a"]) == 1
+        loaded.close()
+
+        reloaded = OnlineTextCorpus(tmpdir)
+        reloaded.load()
+        assert reloaded.get_document("a") is None
+        assert list(reloaded.iter_corpus()) == [corpus.dictionary.doc2bow(["the", "quick", "fox"])]
+
+    def test_compact(self, tmpdir):
+        """
+        Test that compact() removes deleted rows and their dictionary statistics.
+        """
+        corpus = OnlineTextCorpus(tmpdir)
+        corpus.add_documents([["hello", "world"], ["the", "quick", "fox"]], ids=["a", "b"])
+        corpus.add_documents([["hello", "fox", "fox"]], ids=["c"])
+        corpus.add_documents([["the", "end"]], ids=["d"])
+        corpus.delete(["b", "c"])
+        assert corpus.compact() == 2
+        assert corpus.compact() == 0
+
+        expected = Dictionary([["hello", "world"], ["the", "end"]])
+        assert corpus.tombstones == {}
+        assert [s["num_docs"] for s in corpus.segments] == [1, 1]
+        assert corpus.dictionary.num_docs == 2
+        assert corpus.dictionary.num_pos == expected.num_pos
+        assert corpus.dictionary.num_nnz == expected.num_nnz
+        assert corpus.dictionary.dfs[corpus.dictionary.token2id["the"]] == 1
+        assert corpus.get_document("d") == corpus.dictionary.doc2bow(["the", "end"])
+        assert corpus.get_document("c") is None
+
+        # Tokens that no longer occur are removed from the dictionary.
+        assert sorted(corpus.dictionary.token2id) == sorted(expected.token2id)
+        assert list(corpus.iter_corpus()) == [corpus.dictionary.doc2bow(doc) for doc in [["hello", "world"], ["the", "end"]]]
+
+    @pytest.mark.parametrize("wal", [False, True])
+    def test_compact_vocab_statistics(self, tmpdir, wal):
+        """
+        Test that vocab statistics can be computed after compact(), before and after a
+        restart.
+        """
+        corpus = OnlineTextCorpus(tmpdir, wal=wal)
+        corpus.add_documents([["a", "b"], ["c"], ["a", "c"]], ids=["x", "y", "z"])
+        corpus.delete(["y", "z"])
+        corpus.compact()
+        corpus.add_documents([["b", "d"]])
+        corpus.close()
+
+        expected = VocabAnalyzer(Dictionary([["a", "b"], ["b", "d"]]))
+        assert VocabAnalyzer(corpus.dictionary).corpus_statistics() == expected.corpus_statistics()
+        assert VocabAnalyzer(corpus.dictionary).word_statistics("a") == expected.word_statistics("a")
+
+        loaded = OnlineTextCorpus(tmpdir, wal=wal)
+        vocab = VocabAnalyzer(loaded.get_dictionary())
+        assert vocab.corpus_statistics() == expected.corpus_statistics()
+        assert vocab.word_statistics("d") == expected.word_statistics("d")
+        assert list(loaded.iter_corpus()) == [loaded.dictionary.doc2bow(doc) for doc in [["a", "b"], ["b", "d"]]]
+        loaded.close()
+
+    def test_merge_ids(self, tmpdir):
+        """
+        Test that merges carry ids and tombstones over to the merged segment.
+        """
+        corpus = OnlineTextCorpus(tmpdir, merge_factor=2, background_merge=False)
+        corpus.add_documents([["a"]], ids=["a"])
+        corpus.get_document("a")
+        corpus.add_documents([["b"]], ids=["b"])
+        corpus.delete(["a"])
+        corpus.add_documents([["c"]])
+        corpus.add_documents([["d"]], ids=["d"])
+        assert [s["num_docs"] for s in corpus.segments] == [4]
+        assert list(corpus.tombstones.values()) == [[0]]
+        assert [corpus.get_document(id) for id in ["a", "b", "d"]] == [None, [(1, 1.0)], [(3, 1.0)]]
+        assert len(corpus.mm) == 3
+
+    @pytest.mark.parametrize("wal", [False, True])
+    def test_parallel_add_documents(self, tmpdir, wal):
+        """
+        Test that adding documents with a process pool matches adding them serially.
+        """
+        documents = [["hello", "world"], ["the", "quick", "brown", "fox"], [], ["hello", "fox", "fox"], ["jumped"]]
+        serial = OnlineTextCorpus(tmpdir.mkdir("serial"), wal=wal)
+        serial.add_documents(documents)
+        serial.close()
+        parallel = OnlineTextCorpus(tmpdir.mkdir("parallel"), wal=wal)
+        parallel.add_documents(documents, workers=2, chunksize=2)
+        parallel.close()
+
+        assert list(parallel.mm) == list(serial.mm)
+        assert parallel.dictionary.token2id == serial.dictionary.token2id
+        assert parallel.dictionary.dfs == serial.dictionary.dfs
+        assert parallel.dictionary.cfs == serial.dictionary.cfs
+        assert parallel.dictionary.num_docs == serial.dictionary.num_docs
+
+    @pytest.mark.parametrize("format", ["mm", "csr"])
+    def test_prune(self, tmpdir, format):
+        """
+        Test that pruning remaps existing segments without rewriting them.
+        """
+        documents = [["the", "cat", "sat"], ["the", "dog", "sat"], ["a", "cat", "and", "a", "dog"], ["the", "end"]]
+        corpus = OnlineTextCorpus(tmpdir, background_merge=False, format=format)
+        for doc in documents:
+            corpus.add_documents([doc])
+        segments = list(corpus.segments)
+        assert corpus.prune(no_below=2, no_above=1.0) == 3
+        assert corpus.generation == 1
+        assert corpus.segments == segments
+        assert sorted(corpus.dictionary.token2id) == ["cat", "dog", "sat", "the"]
+
+        expected = [corpus.dictionary.doc2bow(doc) for doc in documents]
+        assert list(corpus.iter_corpus()) == expected
+        assert corpus.mm[2] == expected[2]
+        assert corpus.to_csr().shape == (4, 4)
+        assert corpus.to_csr().toarray().tolist() == [[sum(c for i, c in bow if i == id) for id in range(4)] for bow in expected]
+
+        loaded = OnlineTextCorpus(tmpdir)
+        loaded.load()
+        assert loaded.generation == 1
+        assert list(loaded.iter_corpus()) == expected
+
+        # Documents added after pruning use the new ids
+        corpus.add_documents([["the", "cat", "cat", "new"]])
+        assert corpus.segments[-1]["generation"] == 1
+        assert list(corpus.mm)[-1] == corpus.dictionary.doc2bow(["the", "cat", "cat", "new"])
+
+    def test_prune_merge(self, tmpdir):
+        """
+        Test that merges rewrite old segments with the current ids and that remap
+        tables are removed once no retained segment needs them.
+        """
+        corpus = OnlineTextCorpus(tmpdir, num_checkpoints=1, merge_factor=2, background_merge=False)
+        corpus.add_documents([["a", "b", "c"], ["a", "b"]])
+        corpus.prune(no_below=2, no_above=1.0)
+        corpus.add_documents([["b", "d"]])
+        corpus.prune(no_below=1, no_above=0.5)
+        assert sorted(corpus.dictionary.token2id) == ["d"]
+        assert list(corpus.iter_corpus()) == [[], [], [(0, 1)]]
+        assert sorted(os.listdir(os.path.join(tmpdir, "remaps"))) == ["1.bin", "2.bin"]
+
+        corpus.add_documents([["d", "e"]])
+        assert [s.get("generation", 0) for s in corpus.segments] == [2]
+        assert list(corpus.iter_corpus()) == [[], [], [(0, 1)], [(0, 1), (1, 1)]]
+
+        # Merged-away segments and their remap tables are removed at the next checkpoint
+        corpus.add_documents([["e"]])
+        assert os.listdir(os.path.join(tmpdir, "remaps")) == []
+        assert list(corpus.iter_corpus())[-1] == [(1, 1)]
+
+    def test_prune_compact(self, tmpdir):
+        """
+        Test that compaction after pruning subtracts the remapped documents.
+        """
+        corpus = OnlineTextCorpus(tmpdir, background_merge=False)
+        corpus.add_documents([["a", "b"], ["a", "c"], ["a", "b", "b"]], ids=["x", "y", "z"])
+        corpus.prune(no_below=2, no_above=1.0)
+        corpus.delete(["z"])
+        assert corpus.compact() == 1
+        assert list(corpus.iter_corpus()) == [[(0, 1.0), (1, 1.0)], [(0, 1.0)]]
+        assert corpus.dictionary.dfs == {0: 2, 1: 1}
+        assert corpus.get_document("y") == [(0, 1.0)]
+
+    def test_prune_wal(self, tmpdir):
+        """
+        Test that logged documents are checkpointed before pruning.
+        """
+        corpus = OnlineTextCorpus(tmpdir, wal=True, checkpoint_docs=100)
+        corpus.add_documents([["a", "b"], ["a", "c"]])
+        assert corpus.prune(no_below=2, no_above=1.0) == 2
+        corpus.add_documents([["a", "c"]])
+        corpus.close()
+        assert list(corpus.mm) == [[(0, 1.0)], [(0, 1.0)], [(0, 1.0), (1, 1.0)]]
+
+        loaded = OnlineTextCorpus(tmpdir, wal=True)
+        loaded.load()
+        assert loaded.dictionary.token2id == corpus.dictionary.token2id
+        assert loaded.dictionary.dfs == corpus.dictionary.dfs
+
+    def test_prune_hash_dictionary(self, tmpdir):
+        """
+        Test that hashing dictionaries cannot be pruned.
+        """
+        corpus = OnlineTextCorpus(tmpdir, hash_dictionary=True)
+        with pytest.raises(ValueError):
+            corpus.prune()
+
+    @pytest.mark.parametrize("wal", [False, True])
+    def test_sketch_dictionary(self, tmpdir, wal):
+        """
+        Test that the corpus can use a bounded memory sketch dictionary.
+        """
+        documents = [["hello", "world"], ["the", "quick", "brown", "fox"], ["hello", "fox", "fox"]]
+        corpus = OnlineTextCorpus(tmpdir, sketch_memory=2**16, wal=wal)
+        corpus.add_documents(documents, ids=["a", "b", "c"])
+        corpus.close()
+        assert corpus.hash_dictionary
+        assert isinstance(corpus.dictionary, SketchDictionary)
+        assert list(corpus.mm) == [corpus.dictionary.doc2bow(doc) for doc in documents]
+        assert corpus.dictionary.cf("fox") == 3
+
+        loaded = OnlineTextCorpus(tmpdir, sketch_memory=2**16, wal=wal)
+        loaded.load()
+        assert isinstance(loaded.dictionary, SketchDictionary)
+        assert loaded.dictionary.df("fox") == 2
+        assert loaded.dictionary.num_docs == 3
+
+        loaded.delete(["c"])
+        assert loaded.compact() == 1
+        assert loaded.dictionary.num_docs == 2
+        loaded.close()
+
+    def test_sketch_compact_statistics(self, tmpdir):
+        """
+        Test that compact() subtracts the same number of non-zeros from a sketch
+        dictionary as adding the documents counted, even when tokens collide.
+        """
+        sketch = SketchDictionary(memory=2**16)
+        ids = {}
+        for i in range(10000):
+            token = "t" + str(i)
+            if sketch.restricted_hash(token) in ids:
+                collision = [ids[sketch.restricted_hash(token)], token]
+                break
+            ids[sketch.restricted_hash(token)] = token
+        documents = [collision + ["other"], ["hello", "world"]]
+        corpus = OnlineTextCorpus(tmpdir, sketch_memory=2**16)
+        corpus.add_documents(documents, ids=["a", "b"])
+        assert corpus.dictionary.num_nnz == 4
+        bounds = corpus.dictionary.error_bounds()
+
+        corpus.delete(["a"])
+        corpus.compact()
+        assert (corpus.dictionary.num_docs, corpus.dictionary.num_pos, corpus.dictionary.num_nnz) == (1, 2, 2)
+        assert corpus.dictionary.error_bounds() == bounds
+        corpus.close()
+
+    def test_invalid_sketch_memory(self, tmpdir):
+        """
+        Test that the sketch memory budget must be positive.
+        """
+        with pytest.raises(ValueError):
+            OnlineTextCorpus(tmpdir, sketch_memory=0)
+
+    @pytest.mark.parametrize("wal", [False, True])
+    def test_dedup(self, tmpdir, wal):
+        """
+        Test that near-duplicate documents are dropped and the index is persisted.
+        """
+        article = "the central bank raised interest rates by a quarter point on tuesday citing inflation".split()
+        other = "local team wins the championship after a dramatic overtime finish on sunday night".split()
+        corpus = OnlineTextCorpus(tmpdir, wal=wal, dedup_threshold=0.7)
+        assert corpus.add_documents([article, other, article[:-1] + ["pressures"]], ids=["a", "b", "c"]) == [False, False, True]
+        corpus.close()
+        assert len(corpus.mm) == 2
+        assert corpus.get_document("c") is None
+        assert corpus.dedup.stats()["duplicates"] == 1
+        assert corpus.dedup.hit_rate == 1 / 3
+
+        loaded = OnlineTextCorpus(tmpdir, wal=wal, dedup_threshold=0.7)
+        loaded.load()
+        assert loaded.dedup.num_rows == 2
+        assert loaded.add_documents([other, ["something", "new"]]) == [True, False]
+        loaded.close()
+        assert len(loaded.mm) == 3
+
+    def test_dedup_wal_recovery(self, tmpdir):
+        """
+        Test that signatures of logged documents are recovered from the log.
+        """
+        article = "the central bank raised interest rates by a quarter point on tuesday citing inflation".split()
+        corpus = OnlineTextCorpus(tmpdir, wal=True, checkpoint_docs=100, dedup_threshold=0.7)
+        corpus.add_documents([article])
+
+        recovered = OnlineTextCorpus(tmpdir, wal=True, checkpoint_docs=100, dedup_threshold=0.7)
+        recovered.load()
+        assert recovered.dedup.num_rows == 1
+        assert recovered.add_documents([list(article)]) == [True]
+        recovered.close()
+        assert recovered.dedup_rows == 1
+
+    def test_dedup_flag(self, tmpdir):
+        """
+        Test that near-duplicates are kept but flagged in flag mode.
+        """
+        article = "the central bank raised interest rates by a quarter point on tuesday citing inflation".split()
+        corpus = OnlineTextCorpus(tmpdir, dedup_threshold=0.7, dedup_mode="flag")
+        assert corpus.add_documents([article, article, []]) == [False, True, False]
+        assert len(corpus.mm) == 3
+        assert corpus.dedup.num_rows == 1
+        assert OnlineTextCorpus(tmpdir).add_documents([article]) is None
+
+    @pytest.mark.parametrize("threshold, mode", [(0, "drop"), (1.5, "drop"), (0.8, "ignore")])
+    def test_invalid_dedup(self, tmpdir, threshold, mode):
+        """
+        Test that invalid dedup options are rejected.
+        """
+        with pytest.raises(ValueError):
+            OnlineTextCorpus(tmpdir, dedup_threshold=threshold, dedup_mode=mode)
@@ -0,0 +1,65 @@
+from src.storage.csr import CsrCorpus, convert_mm
+
+import os
+import numpy as np
+import pytest
+from gensim.corpora import MmCorpus
+
+class TestCsrCorpus():
+    """
+    Tests for the CsrCorpus class.
+    """
+
+    @pytest.mark.parametrize(
+        "documents",
+        [
+            [],
+            [[]],
+            [[(0, 1.0)], [], [(1, 2.0), (3, 1.0)]],
+        ]
+    )
+    def test_serialize(self, tmpdir, documents):
+        """
+        Test that documents can be serialized and streamed back in order.
+        """
+        path = os.path.join(tmpdir, "corpus.csr")
+        CsrCorpus.serialize(path, documents)
+        corpus = CsrCorpus(path)
+        assert len(corpus) == len(documents)
+        assert list(corpus) == documents
+        for i, doc in enumerate(documents):
+            assert corpus[i] == doc
+
+    def test_getitem_invalid(self, tmpdir):
+        """
+        Test that out of range document lookups raise an IndexError.
+        """
+        path = os.path.join(tmpdir, "corpus.csr")
+        CsrCorpus.serialize(path, [[(0, 1.0)]])
+        corpus = CsrCorpus(path)
+        assert corpus[-1] == [(0, 1.0)]
+        with pytest.raises(IndexError):
+            corpus[1]
+
+    def test_to_csr(self, tmpdir):
+        """
+        Test that the corpus is handed off as a csr_matrix sharing the mapped arrays.
+        """
+        path = os.path.join(tmpdir, "corpus.csr")
+        CsrCorpus.serialize(path, [[(0, 1.0), (2, 2.0)], [], [(1, 3.0)]])
+        corpus = CsrCorpus(path)
+        matrix = corpus.to_csr()
+        assert matrix.shape == (3, 3)
+        assert matrix.toarray().tolist() == [[1.0, 0.0, 2.0], [0.0, 0.0, 0.0], [0.0, 3.0, 0.0]]
+        assert np.shares_memory(matrix.data, corpus.data)
+        assert corpus.to_csr(num_terms=10).shape == (3, 10)
+
+    def test_convert_mm(self, tmpdir):
+        """
+        Test that MatrixMarket checkpoints can be converted to the binary format.
+        """
+        documents = [[(0, 1.0), (4, 2.0)], [], [(1, 1.0)]]
+        mm_path = os.path.join(tmpdir, "corpus.mm")
+        MmCorpus.serialize(mm_path, documents)
+        corpus = convert_mm(mm_path, os.path.join(tmpdir, "corpus.csr"))
+        assert list(corpus) == list(MmCorpus(mm_path))
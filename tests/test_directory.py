@@ -1,6 +1,7 @@
-from src.reader.directory import DirectoryReader
+from src.reader.directory import AsyncDirectoryReader, DirectoryReader
 
 import os
+import asyncio
 import pytest
 
 class TestDirectoryReader():
@@ -27,4 +28,154 @@ class TestDirectoryReader():
                 f.write(data)
 
         reader = DirectoryReader(tmpdir)
-        assert list(reader.read()) == list(files.values())
\ No newline at end of file
+        assert list(reader.read()) == list(files.values())
+
+
+    def write_files(self, dir, files):
+        for name, data in files.items():
+            path = os.path.join(dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(data)
+
+    @pytest.mark.parametrize("recursive, expected", [(False, {"a"}), (True, {"a", "b", "c"})])
+    def test_read_recursive(self, tmpdir, recursive, expected):
+        """
+        Test that subdirectories are only read in recursive mode.
+        """
+        self.write_files(tmpdir, {"a.txt": "a", "sub/b.txt": "b", "sub/deeper/c.txt": "c"})
+        reader = DirectoryReader(tmpdir, recursive=recursive)
+        assert set(reader.read()) == expected
+
+    @pytest.mark.parametrize("workers, read_ahead", [(1, None), (2, None), (4, 1)])
+    def test_read_workers(self, tmpdir, workers, read_ahead):
+        """
+        Test that files read by a thread pool are yielded in scan order.
+        """
+        self.write_files(tmpdir, {"sub/doc" + str(i) + ".txt": str(i) for i in range(20)})
+        expected = list(DirectoryReader(tmpdir, recursive=True).read())
+        reader = DirectoryReader(tmpdir, recursive=True, workers=workers, read_ahead=read_ahead)
+        assert list(reader.read()) == expected
+
+    def test_watermark(self, tmpdir):
+        """
+        Test that only new or changed files are read after the watermark is committed.
+        """
+        data = tmpdir.mkdir("data")
+        state = os.path.join(tmpdir, "state.json")
+        self.write_files(data, {"a.txt": "a", "sub/b.txt": "b"})
+        reader = DirectoryReader(data, recursive=True, state=state)
+        assert set(reader.read()) == {"a", "b"}
+
+        # Uncommitted files are read again.
+        reader = DirectoryReader(data, recursive=True, state=state)
+        assert set(reader.read()) == {"a", "b"}
+        reader.commit()
+        assert list(reader.read()) == []
+
+        # A new reader resumes from the watermark file.
+        self.write_files(data, {"sub/c.txt": "c", "a.txt": "changed"})
+        os.utime(os.path.join(data, "a.txt"), ns=(0, 0))
+        reader = DirectoryReader(data, recursive=True, state=state, workers=2)
+        assert set(reader.read()) == {"changed", "c"}
+        reader.commit()
+        assert sorted(reader.watermark_) == ["a.txt", "sub/b.txt", "sub/c.txt"]
+
+        # Deleted files are dropped from the watermark after a full scan.
+        os.remove(os.path.join(data, "sub", "b.txt"))
+        reader = DirectoryReader(data, recursive=True, state=state)
+        assert list(reader.read()) == []
+        reader.commit()
+        assert sorted(reader.watermark_) == ["a.txt", "sub/c.txt"]
+
+    def test_watermark_partial(self, tmpdir):
+        """
+        Test that committing part way through a read only records the files yielded.
+        """
+        state = os.path.join(tmpdir, "state.json")
+        self.write_files(tmpdir, {"doc" + str(i) + ".txt": str(i) for i in range(5)})
+        reader = DirectoryReader(tmpdir, state=state, workers=2)
+        stream = reader.read()
+        first = [next(stream), next(stream)]
+        reader.commit()
+        stream.close()
+
+        reader = DirectoryReader(tmpdir, state=state)
+        rest = list(reader.read())
+        assert sorted(first + rest) == [str(i) for i in range(5)]
+
+    def test_commit_without_state(self, tmpdir):
+        """
+        Test that committing requires a state file.
+        """
+        with pytest.raises(ValueError):
+            DirectoryReader(tmpdir).commit()
+
+    @pytest.mark.parametrize("workers, read_ahead", [(0, None), (2, 0)])
+    def test_invalid_workers(self, tmpdir, workers, read_ahead):
+        """
+        Test that the thread pool options are validated.
+        """
+        with pytest.raises(ValueError):
+            DirectoryReader(tmpdir, workers=workers, read_ahead=read_ahead)
+
+async def read_all(reader):
+    return [data async for data in reader.read()]
+
+class TestAsyncDirectoryReader():
+    """
+    Tests for the AsyncDirectoryReader class.
+    """
+
+    @pytest.mark.parametrize("read_ahead", [1, 2, 8])
+    def test_read(self, tmpdir, read_ahead):
+        """
+        Test that the AsyncDirectoryReader streams files in the same order as the
+        DirectoryReader.
+        """
+        for i in range(5):
+            with open(os.path.join(tmpdir, "doc" + str(i) + ".txt"), 'w') as f:
+                f.write("text " + str(i))
+
+        reader = AsyncDirectoryReader(tmpdir, read_ahead=read_ahead)
+        assert asyncio.run(read_all(reader)) == list(DirectoryReader(tmpdir).read())
+
+    @pytest.mark.parametrize("recursive", [False, True])
+    def test_read_nested(self, tmpdir, recursive):
+        """
+        Test that subdirectories are skipped or read like the DirectoryReader.
+        """
+        TestDirectoryReader().write_files(tmpdir, {"a.txt": "a", "sub/b.txt": "b", "sub/deeper/c.txt": "c"})
+        reader = AsyncDirectoryReader(tmpdir, recursive=recursive)
+        assert asyncio.run(read_all(reader)) == list(DirectoryReader(tmpdir, recursive=recursive).read())
+
+    def test_watermark(self, tmpdir):
+        """
+        Test that only new or changed files are read after the watermark is committed.
+        """
+        data = tmpdir.mkdir("data")
+        state = os.path.join(tmpdir, "state.json")
+        TestDirectoryReader().write_files(data, {"a.txt": "a", "sub/b.txt": "b"})
+        reader = AsyncDirectoryReader(data, recursive=True, state=state)
+        assert sorted(asyncio.run(read_all(reader))) == ["a", "b"]
+        reader.commit()
+        assert asyncio.run(read_all(reader)) == []
+
+        TestDirectoryReader().write_files(data, {"sub/c.txt": "c"})
+        assert asyncio.run(read_all(AsyncDirectoryReader(data, recursive=True, state=state))) == ["c"]
+        assert list(DirectoryReader(data, recursive=True, state=state).read()) == ["c"]
+
+    def test_read_missing(self, tmpdir):
+        """
+        Test that reading a missing directory raises an error.
+        """
+        reader = AsyncDirectoryReader(os.path.join(tmpdir, "missing"))
+        with pytest.raises(OSError):
+            asyncio.run(read_all(reader))
+
+    def test_invalid_read_ahead(self, tmpdir):
+        """
+        Test that read_ahead must be positive.
+        """
+        with pytest.raises(ValueError):
+            AsyncDirectoryReader(tmpdir, read_ahead=0)
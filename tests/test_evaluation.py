@@ -0,0 +1,74 @@
+from src.analyzer.evaluation import GrowingCorpus, ReservoirCorpus, SlidingWindowCorpus, evaluation_corpus
+
+import pytest
+from collections import Counter
+
+class TestEvaluationCorpus():
+    """
+    Tests for the evaluation corpora of the modeling engines.
+    """
+
+    def test_growing(self):
+        """
+        Test that the growing corpus streams the source followed by added documents.
+        """
+        corpus = evaluation_corpus(range(3))
+        assert isinstance(corpus, GrowingCorpus)
+        assert corpus.add([3, 4]) == ([3, 4], [])
+        assert list(corpus) == [0, 1, 2, 3, 4]
+        assert len(corpus) == 5
+
+    def test_growing_live_source(self):
+        """
+        Test that documents appended to the source after fitting are not counted
+        twice.
+        """
+        source = [0, 1, 2]
+        corpus = GrowingCorpus(source)
+        source.extend([3, 4])
+        corpus.add([3, 4])
+        assert list(corpus) == [0, 1, 2, 3, 4]
+        assert len(corpus) == 5
+
+    def test_window(self):
+        """
+        Test that the window keeps the most recent documents.
+        """
+        corpus = evaluation_corpus(range(5), size=3)
+        assert isinstance(corpus, SlidingWindowCorpus)
+        assert list(corpus) == [2, 3, 4]
+        assert corpus.add([5]) == ([5], [2])
+        assert corpus.add([6, 7, 8, 9]) == ([6, 7, 8, 9], [3, 4, 5, 6])
+        assert list(corpus) == [7, 8, 9]
+        assert len(corpus) == 3
+
+    def test_reservoir(self):
+        """
+        Test that the reservoir is a fixed size uniform sample of the documents and
+        that the added and removed documents account for its contents.
+        """
+        corpus = evaluation_corpus(range(2), size=5, sampling="reservoir", seed=1)
+        assert isinstance(corpus, ReservoirCorpus)
+        assert list(corpus) == [0, 1]
+        counts = Counter(corpus)
+        for start in range(2, 1000, 7):
+            added, removed = corpus.add(range(start, start + 7))
+            counts.update(added)
+            counts.subtract(removed)
+        assert len(corpus) == 5
+        assert corpus.seen == 1003
+        assert +counts == Counter(corpus)
+
+        # Every document is equally likely to be sampled.
+        sampled = Counter()
+        for seed in range(2000):
+            sampled.update(doc // 20 for doc in evaluation_corpus(range(100), size=5, sampling="reservoir", seed=seed))
+        assert all(abs(count - 2000) < 250 for count in sampled.values())
+
+    @pytest.mark.parametrize("size, sampling", [(0, "window"), (0, "reservoir"), (5, "random")])
+    def test_invalid(self, size, sampling):
+        """
+        Test that invalid options are rejected.
+        """
+        with pytest.raises(ValueError):
+            evaluation_corpus([], size=size, sampling=sampling)
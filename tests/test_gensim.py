@@ -0,0 +1,202 @@
+from src.analyzer.engines.gensim import GensimEngine
+from src.corpus import OnlineTextCorpus
+from src.analyzer.topic import TopicAnalyzer
+
+import random
+import pytest
+from gensim.corpora import Dictionary
+from gensim.models.coherencemodel import CoherenceModel
+from gensim.matutils import corpus2csc
+
+def random_documents(num_docs=100, doc_length=20, vocab_size=100, seed=0):
+    rng = random.Random(seed)
+    vocab = ["token{}".format(i) for i in range(vocab_size)]
+    return [rng.choices(vocab, k=doc_length) for _ in range(num_docs)]
+
+class TestGensimEngine():
+    """
+    Tests for the GensimEngine class.
+    """
+
+    @pytest.mark.parametrize("engine", ["lda", "nmf"])
+    @pytest.mark.parametrize("workers, max_cores", [(2, None), (3, 2), (8, 8)])
+    def test_parallel_sweep(self, engine, workers, max_cores):
+        """
+        Test that a parallel sweep fits the same models as the serial loop.
+        """
+        documents = random_documents()
+        dictionary = Dictionary(documents)
+        corpus = [dictionary.doc2bow(doc) for doc in documents]
+        serial = GensimEngine(engine=engine, dictionary=dictionary, min_topics=2, max_topics=4, random_state=1)
+        serial.fit(corpus)
+        parallel = GensimEngine(engine=engine, dictionary=dictionary, min_topics=2, max_topics=4, workers=workers,
+                                max_cores=max_cores, random_state=1)
+        parallel.fit(corpus)
+        assert list(parallel.topics()) == [2, 3, 4]
+        assert parallel.topics() == serial.topics()
+
+    def test_parallel_sweep_sparse(self):
+        """
+        Test a parallel sweep on a scipy.sparse corpus through the TopicAnalyzer.
+        """
+        documents = random_documents()
+        dictionary = Dictionary(documents)
+        corpus = [dictionary.doc2bow(doc) for doc in documents]
+        matrix = corpus2csc(corpus, num_terms=len(dictionary)).T.tocsr()
+        analyzer = TopicAnalyzer(dictionary=dictionary, min_topics=2, max_topics=3, workers=2, random_state=1)
+        analyzer.model(matrix)
+        serial = GensimEngine(dictionary=dictionary, min_topics=2, max_topics=3, random_state=1)
+        serial.fit(corpus)
+        assert analyzer.topics() == serial.topics()
+
+    @pytest.mark.parametrize("engine", ["lda", "nmf"])
+    def test_halving_search(self, engine):
+        """
+        Test that the halving search keeps the best candidate trained on the whole
+        corpus.
+        """
+        documents = random_documents(num_docs=90)
+        dictionary = Dictionary(documents)
+        corpus = [dictionary.doc2bow(doc) for doc in documents]
+        analyzer = TopicAnalyzer(type=engine, dictionary=dictionary, min_topics=2, max_topics=10, search="halving",
+                                 random_state=1)
+        analyzer.model(corpus)
+        history = analyzer.engine.search_
+        assert [rung["documents"] for rung in history] == [10, 30, 90]
+        assert [len(rung["scores"]) for rung in history] == [9, 3, 1]
+        for rung, survivors in zip(history, history[1:]):
+            ranked = sorted(rung["scores"], key=rung["scores"].get, reverse=True)
+            assert sorted(survivors["scores"]) == sorted(ranked[:len(survivors["scores"])])
+
+        topics = analyzer.topics()
+        (k, result), = topics.items()
+        assert history[-1]["scores"] == {k: result["coherence"]}
+        assert len(result["topics"]) == k
+
+    @pytest.mark.parametrize("engine", ["lda", "nmf"])
+    def test_update_coherence(self, engine):
+        """
+        Test that updated models are scored from the shared co-occurrence counts with
+        the same coherence as CoherenceModel on the whole corpus.
+        """
+        documents = random_documents(num_docs=160)
+        dictionary = Dictionary(documents)
+        analyzer = TopicAnalyzer(type=engine, dictionary=dictionary, min_topics=2, max_topics=4, random_state=1)
+        analyzer.model([dictionary.doc2bow(doc) for doc in documents[:100]])
+        for start in [100, 130]:
+            analyzer.update(documents[start:start + 30])
+            assert analyzer.engine.cooccurrence_.num_docs == start + 30
+            assert len(analyzer.engine.corpus_) == start + 30
+            for k, m in analyzer.engine.models_.items():
+                cm = CoherenceModel(model=m['model'], corpus=analyzer.engine.corpus_, dictionary=dictionary,
+                                    coherence='u_mass')
+                assert analyzer.topics()[k]['coherence'] == cm.get_coherence()
+
+    @pytest.mark.parametrize("sampling", ["window", "reservoir"])
+    def test_bounded_evaluation(self, sampling):
+        """
+        Test that coherence is evaluated on a fixed size evaluation corpus.
+        """
+        documents = random_documents(num_docs=300)
+        dictionary = Dictionary(documents)
+        engine = GensimEngine(dictionary=dictionary, min_topics=2, max_topics=3, eval_size=50, eval_sampling=sampling,
+                              eval_seed=1, random_state=1)
+        engine.fit([dictionary.doc2bow(doc) for doc in documents[:100]])
+        for start in range(100, 300, 40):
+            engine.update(documents[start:start + 40])
+            assert len(engine.corpus_) == 50
+            assert engine.cooccurrence_.num_docs == 50
+            for k, m in engine.models_.items():
+                cm = CoherenceModel(model=m['model'], corpus=list(engine.corpus_), dictionary=dictionary, coherence='u_mass')
+                assert engine.topics()[k]['coherence'] == cm.get_coherence()
+        if sampling == "window":
+            assert list(engine.corpus_) == [dictionary.doc2bow(doc) for doc in documents[250:]]
+
+    def test_streaming_corpus(self, tmpdir):
+        """
+        Test fitting on an OnlineTextCorpus streamed from disk, which is not copied
+        into the evaluation corpus.
+        """
+        documents = random_documents(num_docs=130)
+        corpus = OnlineTextCorpus(tmpdir)
+        corpus.add_documents(documents[:100])
+        dictionary = corpus.get_dictionary()
+        dictionary.add_documents(documents[100:])
+        engine = GensimEngine(dictionary=dictionary, min_topics=2, max_topics=3, random_state=1)
+        engine.fit(corpus)
+        assert engine.corpus_.corpus is corpus
+
+        engine.update(documents[100:])
+        assert len(engine.corpus_) == 130
+        for k, m in engine.models_.items():
+            cm = CoherenceModel(model=m['model'], corpus=list(engine.corpus_), dictionary=dictionary, coherence='u_mass')
+            assert engine.topics()[k]['coherence'] == cm.get_coherence()
+        corpus.close()
+
+    def test_live_corpus(self, tmpdir):
+        """
+        Test updating an engine fitted on an OnlineTextCorpus after each batch has
+        been added to the corpus, as in an ingest pipeline, without counting the
+        batch twice in the evaluation corpus or in the shared dictionary.
+        """
+        documents = random_documents(num_docs=160)
+        corpus = OnlineTextCorpus(tmpdir)
+        corpus.add_documents(documents[:100])
+        dictionary = corpus.get_dictionary()
+        engine = GensimEngine(dictionary=dictionary, min_topics=2, max_topics=3, random_state=1)
+        engine.fit(corpus)
+        assert not engine.update_dictionary_
+        for start in [100, 130]:
+            batch = documents[start:start + 30]
+            corpus.add_documents(batch)
+            engine.update(batch)
+            assert len(engine.corpus_) == len(corpus) == start + 30
+            assert engine.cooccurrence_.num_docs == start + 30
+            for k, m in engine.models_.items():
+                cm = CoherenceModel(model=m['model'], corpus=list(corpus), dictionary=dictionary, coherence='u_mass')
+                assert engine.topics()[k]['coherence'] == cm.get_coherence()
+        corpus.close()
+
+        expected = Dictionary(documents)
+        loaded = OnlineTextCorpus(tmpdir)
+        loaded.load()
+        assert len(loaded) == 160
+        assert loaded.dictionary.num_docs == expected.num_docs
+        assert loaded.dictionary.num_pos == expected.num_pos
+        for token, id in expected.token2id.items():
+            assert loaded.dictionary.dfs[loaded.dictionary.token2id[token]] == expected.dfs[id]
+            assert loaded.dictionary.cfs[loaded.dictionary.token2id[token]] == expected.cfs[id]
+
+    @pytest.mark.parametrize("eta", [0.01, "auto"])
+    def test_eta_prior(self, eta):
+        """
+        Test that the eta prior is passed on to gensim's LdaModel rather than being
+        taken as the halving factor.
+        """
+        documents = random_documents(num_docs=30)
+        dictionary = Dictionary(documents)
+        analyzer = TopicAnalyzer(dictionary=dictionary, min_topics=2, max_topics=2, eta=eta, random_state=1)
+        analyzer.model([dictionary.doc2bow(doc) for doc in documents])
+        model = analyzer.engine.models_[2]['model']
+        if eta == "auto":
+            assert model.optimize_eta
+        else:
+            assert (model.eta == eta).all()
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {"workers": 0},
+            {"workers": 2, "max_cores": 0},
+            {"search": "random"},
+            {"search": "halving", "halving_factor": 1},
+            {"eval_size": 0},
+            {"eval_sampling": "random"},
+        ]
+    )
+    def test_invalid_options(self, options):
+        """
+        Test that the engine options are validated.
+        """
+        with pytest.raises(ValueError):
+            GensimEngine(dictionary=Dictionary(), **options)
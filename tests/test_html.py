@@ -1,5 +1,6 @@
 from src.reader.reader import Reader
-from src.parser.html import HTMLParser
+from src.parser.cache import ParseCache
+from src.parser.html import HTMLParser, _LeadExtractor, TAGS, parse_lead, parse_text, parse_text_fast
 
 import pytest
 
@@ -18,6 +19,16 @@ class StringReader(Reader):
         for s in self.strings:
             yield s
 
+class CountingReader(Reader):
+    def __init__(self, strings):
+        self.strings = strings
+        self.count = 0
+
+    def read(self):
+        for s in self.strings:
+            self.count += 1
+            yield s
+
 class TestHTMLParser():
     """
     Tests for the HTMLParser class.
@@ -30,13 +41,14 @@ class TestHTMLParser():
             InvalidReader(),
         ]
     )
-    def test_parse_invalid(self, reader):
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_parse_invalid(self, reader, workers):
         """
         Test that the parser handles underlying reader errors.
         """
         parser = HTMLParser(reader)
         with pytest.raises(ValueError):
-            list(parser.parse())
+            list(parser.parse(workers=workers))
 
     @pytest.mark.parametrize(
         "html, expected",
@@ -52,10 +64,176 @@ class TestHTMLParser():
             (["<h2>Heading Text<h2>", 42], ["Heading Text", None]),
         ]
     )
-    def test_parse(self, html, expected):
+    @pytest.mark.parametrize("fast", [False, True])
+    def test_parse(self, html, expected, fast):
         """
         Test that the parser parses the text from the provided HTML.
         """
-        parser = HTMLParser(StringReader(html))
+        parser = HTMLParser(StringReader(html), fast=fast)
         texts = list(parser.parse())
-        assert texts == expected
\ No newline at end of file
+        assert texts == expected
+
+    @pytest.mark.parametrize(
+        "html",
+        [
+            "<p>a</p><p></p><p>b</p>",
+            "<li>One<p>Two</p></li><p>Three <b>four</b></p>",
+            "<div><p>a</div>b</p><p>c",
+            "<p>a<b>  </b>c</p><pre><p>x  <i> </i> y</p></pre>",
+            "<p>a<script>var p = '<p>';</script><style>p {}</style>b<template>c</template></p>",
+            "<p>&amp; &nbsp;&lt;&gt; &#8217; &#x42; &#147; &foo; &amp</p>",
+            "<p>a<!-- comment -->b<![CDATA[c]]><?pi?>d</p><!DOCTYPE html>",
+            "<p>a<br>b<br/>c</br><img><img/><li></img>d</p>",
+            "<p/><h1 class='x'>a<h1>b</h1>c<p>unclosed",
+            b"<p>bytes</p>",
+        ]
+    )
+    def test_parse_text_fast(self, html):
+        """
+        Test that the fast extractor returns the same text as BeautifulSoup.
+        """
+        assert parse_text_fast(html) == parse_text(html)
+
+    @pytest.mark.parametrize("chunksize", [1, 3, 100])
+    @pytest.mark.parametrize("fast", [False, True])
+    def test_parse_workers(self, chunksize, fast):
+        """
+        Test that parsing in worker processes returns the texts in input order with
+        None for documents that fail to parse.
+        """
+        html = ["<p>Document " + str(i) + "</p>" if i % 4 else 42 for i in range(20)]
+        expected = list(HTMLParser(StringReader(html)).parse())
+        parser = HTMLParser(StringReader(html), fast=fast)
+        assert list(parser.parse(workers=2, chunksize=chunksize)) == expected
+
+    def test_parse_workers_bounded(self):
+        """
+        Test that only max_in_flight chunks are read ahead of the results.
+        """
+        reader = CountingReader(["<p>" + str(i) + "</p>" for i in range(100)])
+        texts = HTMLParser(reader).parse(workers=2, chunksize=5, max_in_flight=3)
+        assert next(texts) == "0"
+        assert reader.count == 15
+        texts.close()
+
+    @pytest.mark.parametrize("workers, chunksize", [(0, 100), (2, 0)])
+    def test_parse_invalid_workers(self, workers, chunksize):
+        """
+        Test that the worker options are validated.
+        """
+        with pytest.raises(ValueError):
+            next(HTMLParser(StringReader([])).parse(workers=workers, chunksize=chunksize))
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_parse_cache(self, tmpdir, workers):
+        """
+        Test that replayed documents are read from the cache instead of parsed again.
+        """
+        html = ["<p>" + str(i % 4) + "</p>" for i in range(10)] + [None, "<h1>Heading</h1><p>Text</p>"]
+        expected = [str(i % 4) for i in range(10)] + [None, "Heading Text"]
+        cache = ParseCache(str(tmpdir.join("cache.db")))
+        parser = HTMLParser(StringReader(html), fast=True, cache=cache)
+        assert list(parser.parse(workers=workers, chunksize=3)) == expected
+        assert len(cache) == 5
+        # Chunks are looked up before the texts of earlier chunks are returned from
+        # the workers, so repeated documents may not be found within a parse.
+        if workers == 1:
+            assert (cache.hits, cache.misses) == (6, 5)
+
+        # The cache is shared with parsers that extract the same text, and persisted.
+        cache.close()
+        cache = ParseCache(str(tmpdir.join("cache.db")))
+        parser = HTMLParser(StringReader(html), cache=cache)
+        assert list(parser.parse(workers=workers, chunksize=3)) == expected
+        assert (cache.hits, cache.misses) == (11, 0)
+
+        # Texts extracted with other options are cached separately.
+        parser = HTMLParser(StringReader(html), max_tokens=1, cache=cache)
+        assert list(parser.parse(workers=workers, chunksize=3)) == expected[:11] + ["Heading"]
+        assert cache.hits + cache.misses == 22
+        if workers == 1:
+            assert (cache.hits, cache.misses) == (17, 5)
+        cache.close()
+
+    @pytest.mark.parametrize(
+        "max_chars, max_tokens, expected",
+        [
+            (None, None, "Heading First paragraph here. Second paragraph"),
+            (100, None, "Heading First paragraph here. Second paragraph"),
+            (14, None, "Heading First"),
+            (16, None, "Heading First"),
+            (3, None, "Hea"),
+            (None, 3, "Heading First paragraph"),
+            (None, 4, "Heading First paragraph here."),
+            (100, 2, "Heading First"),
+            (10, 3, "Heading"),
+        ]
+    )
+    def test_parse_lead(self, max_chars, max_tokens, expected):
+        """
+        Test that the leading text is cut to the budget at a word boundary.
+        """
+        html = "<h1>Heading</h1><p>First paragraph here.</p><div><p>Second paragraph</p></div>"
+        assert parse_lead(html, max_chars=max_chars, max_tokens=max_tokens) == expected
+
+    @pytest.mark.parametrize("boilerplate", [False, True])
+    def test_parse_lead_bytes(self, boilerplate):
+        """
+        Test that undecoded bytes (e.g., Kafka message values) are decoded like
+        parse_text() decodes them.
+        """
+        html = "<h1>Caf\u00e9</h1><p>First paragraph here.</p>"
+        for data in [html.encode("utf-8"), html.encode("latin-1")]:
+            assert parse_lead(data, max_tokens=2, boilerplate=boilerplate) == parse_text(data)[:len("Caf\u00e9 First")]
+        parser = HTMLParser(StringReader([html.encode("utf-8")]), max_chars=10, boilerplate=boilerplate)
+        assert list(parser.parse()) == ["Caf\u00e9 First"]
+
+    def test_parse_lead_early_stop(self):
+        """
+        Test that parsing stops once the budget is filled.
+        """
+        html = "<h1>Heading</h1>\n" + "<p>Some paragraph text.</p>\n" * 10000
+        extractor = _LeadExtractor(TAGS, max_tokens=20)
+        assert extractor.extract(html) == "Heading " + "Some paragraph text. " * 6 + "Some"
+        assert extractor.getpos()[0] < 1000
+
+    def test_parse_lead_unclosed(self):
+        """
+        Test that parsing stops within a long unclosed block.
+        """
+        html = "<p>" + "word " * 100000
+        extractor = _LeadExtractor(TAGS, max_chars=20)
+        assert extractor.extract(html) == "word word word word"
+        assert len(extractor.rawdata) < len(html)
+
+    def test_parse_lead_boilerplate(self):
+        """
+        Test that link-heavy and low text density blocks are dropped.
+        """
+        html = (
+            "<ul><li><a href='/'>Home</a></li><li><a href='/world'>World</a></li></ul>"
+            "<h1>Big News</h1><p>Share</p>"
+            "<p>The quick brown fox jumped over the lazy dog in the park today.</p>"
+            "<p>Read <a href='/fox'>more about the fox here</a></p><p>Comments (12)</p>"
+        )
+        assert parse_lead(html, boilerplate=True) == (
+            "Big News The quick brown fox jumped over the lazy dog in the park today."
+        )
+        assert parse_lead(html, max_tokens=4, boilerplate=True) == "Big News The quick"
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_parse_budget(self, workers):
+        """
+        Test that the parser extracts the leading text when a budget is set.
+        """
+        html = ["<h1>Heading</h1><p>First paragraph here.</p>", 42]
+        parser = HTMLParser(StringReader(html), max_tokens=2)
+        assert list(parser.parse(workers=workers)) == ["Heading First", None]
+
+    @pytest.mark.parametrize("max_chars, max_tokens", [(0, None), (None, 0)])
+    def test_invalid_budget(self, max_chars, max_tokens):
+        """
+        Test that budgets must be positive.
+        """
+        with pytest.raises(ValueError):
+            HTMLParser(StringReader([]), max_chars=max_chars, max_tokens=max_tokens)
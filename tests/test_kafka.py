@@ -0,0 +1,315 @@
+from src.reader.kafka import AsyncTopicReader, TopicReader
+
+import time
+import asyncio
+import random
+import pytest
+import threading
+from collections import defaultdict, namedtuple
+from kafka.structs import OffsetAndMetadata, TopicPartition
+
+# The fields of a kafka ConsumerRecord used by the readers
+Message = namedtuple("Message", ["topic", "partition", "offset", "value"])
+
+def upper(value):
+    return value.upper()
+
+class FakeConsumer():
+    """
+    Stand-in for KafkaConsumer which serves messages from in-memory partition logs.
+    """
+    def __init__(self, topic, partitions):
+        self.topic = topic
+        self.logs = {p: [Message(topic, p, i, value) for i, value in enumerate(values)] for p, values in partitions.items()}
+        self.positions = defaultdict(int)
+        self.commits = []
+        self.polls = 0
+        self.fetches = 0
+        self.listener = None
+        self.revocations = {}
+
+    def subscribe(self, topics, listener=None):
+        self.listener = listener
+
+    def poll(self, timeout_ms=0, max_records=None):
+        self.polls += 1
+        if self.fetches in self.revocations:
+            # Simulate a rebalance which moves partitions to another consumer
+            revoked = self.revocations.pop(self.fetches)
+            for p in revoked:
+                del self.logs[p]
+            self.listener.on_partitions_revoked([TopicPartition(self.topic, p) for p in revoked])
+        records = {}
+        remaining = max_records
+        for p, log in self.logs.items():
+            messages = log[self.positions[p]:self.positions[p] + remaining]
+            if len(messages) > 0:
+                records[TopicPartition(self.topic, p)] = messages
+                self.positions[p] += len(messages)
+                remaining -= len(messages)
+            if remaining == 0:
+                break
+        if len(records) > 0:
+            self.fetches += 1
+        return records
+
+    def __iter__(self):
+        while True:
+            records = self.poll(max_records=1)
+            if len(records) == 0:
+                return
+            for messages in records.values():
+                yield from messages
+
+    def commit(self, offsets):
+        self.commits.append(dict(offsets))
+
+class TestTopicReader():
+    """
+    Tests for the TopicReader class.
+    """
+
+    @pytest.mark.parametrize("url, topic", [("", "news"), ("localhost:9092", "")])
+    def test_invalid_init(self, url, topic):
+        """
+        Test that the broker URL and topic are required.
+        """
+        with pytest.raises(ValueError):
+            TopicReader(url, topic, consumer=FakeConsumer(topic, {}))
+
+    @pytest.mark.parametrize(
+        "max_records, expected",
+        [
+            (2, [["a0", "a1"], ["a2", "b0"], ["b1"]]),
+            (3, [["a0", "a1", "a2"], ["b0", "b1"]]),
+            (10, [["a0", "a1", "a2", "b0", "b1"]]),
+        ]
+    )
+    def test_read_batches(self, max_records, expected):
+        """
+        Test that messages are read in batches with offsets tracked per partition.
+        """
+        consumer = FakeConsumer("news", {0: ["a0", "a1", "a2"], 1: ["b0", "b1"]})
+        reader = TopicReader("localhost:9092", "news", auto_commit=False, consumer=consumer)
+        assert list(reader.read_batches(max_records=max_records, stop_when_idle=True)) == expected
+        assert reader.offsets_ == {TopicPartition("news", 0): 3, TopicPartition("news", 1): 2}
+
+    def test_commit(self):
+        """
+        Test that the offsets of every partition are committed in a single call once
+        the caller has processed the batch.
+        """
+        consumer = FakeConsumer("news", {0: ["a0", "a1", "a2"], 1: ["b0"], 2: []})
+        reader = TopicReader("localhost:9092", "news", auto_commit=False, consumer=consumer)
+        with pytest.raises(ValueError):
+            reader.commit()
+
+        batches = reader.read_batches(max_records=2, stop_when_idle=True)
+        assert next(batches) == ["a0", "a1"]
+        reader.commit()
+        assert consumer.commits == [{TopicPartition("news", 0): OffsetAndMetadata(2, None)}]
+
+        assert next(batches) == ["a2", "b0"]
+        reader.commit()
+        assert len(consumer.commits) == 2
+        assert consumer.commits[-1] == {
+            TopicPartition("news", 0): OffsetAndMetadata(3, None),
+            TopicPartition("news", 1): OffsetAndMetadata(1, None),
+        }
+        assert list(batches) == []
+
+    def test_read(self):
+        """
+        Test that reading one message at a time commits every partition read.
+        """
+        consumer = FakeConsumer("news", {0: ["a0"], 1: ["b0", "b1"]})
+        reader = TopicReader("localhost:9092", "news", auto_commit=False, consumer=consumer)
+        assert list(reader.read()) == ["a0", "b0", "b1"]
+        reader.commit()
+        assert consumer.commits == [{
+            TopicPartition("news", 0): OffsetAndMetadata(1, None),
+            TopicPartition("news", 1): OffsetAndMetadata(2, None),
+        }]
+
+    def test_invalid_max_records(self):
+        """
+        Test that batches must hold at least one record.
+        """
+        reader = TopicReader("localhost:9092", "news", consumer=FakeConsumer("news", {}))
+        with pytest.raises(ValueError):
+            next(reader.read_batches(max_records=0))
+
+    @pytest.mark.parametrize("executor, workers", [("thread", 1), ("thread", 3), ("process", 2)])
+    def test_read_parallel(self, executor, workers):
+        """
+        Test that partitions are processed in parallel and merged in order per
+        partition.
+        """
+        partitions = {p: ["{}-{}".format(p, i) for i in range(7)] for p in range(4)}
+        consumer = FakeConsumer("news", partitions)
+        reader = TopicReader("localhost:9092", "news", auto_commit=False, consumer=consumer)
+        batches = list(reader.read_parallel(upper, workers=workers, executor=executor, max_records=3, stop_when_idle=True))
+
+        merged = defaultdict(list)
+        for batch in batches:
+            assert len(set(value.split("-")[0] for value in batch)) == 1
+            merged[int(batch[0].split("-")[0])].extend(batch)
+        assert merged == {p: [value.upper() for value in values] for p, values in partitions.items()}
+        assert reader.offsets_ == {TopicPartition("news", p): 7 for p in partitions}
+        reader.commit()
+        assert len(consumer.commits) == 1
+
+    def test_read_parallel_order(self):
+        """
+        Test that each partition stays in order when batches finish out of order.
+        """
+        rng = random.Random(42)
+
+        def slow_upper(value):
+            time.sleep(rng.random() * 0.005)
+            return value.upper()
+
+        partitions = {p: [str(i) for i in range(20)] for p in range(3)}
+        consumer = FakeConsumer("news", partitions)
+        reader = TopicReader("localhost:9092", "news", auto_commit=False, consumer=consumer)
+        merged = defaultdict(list)
+        for batch in reader.read_parallel(slow_upper, workers=3, executor="thread", max_records=2, stop_when_idle=True):
+            merged[consumer.topic, reader.message_.partition].extend(batch)
+        assert all(values == [str(i) for i in range(20)] for values in merged.values())
+        assert len(merged) == 3
+
+    def test_read_parallel_backpressure(self):
+        """
+        Test that polling pauses once max_in_flight batches are being processed.
+        """
+        release = threading.Event()
+
+        def blocked(value):
+            release.wait()
+            return value
+
+        consumer = FakeConsumer("news", {p: ["a", "b", "c"] for p in range(3)})
+        reader = TopicReader("localhost:9092", "news", auto_commit=False, consumer=consumer)
+        batches = reader.read_parallel(blocked, workers=2, executor="thread", max_records=1, max_in_flight=2, stop_when_idle=True)
+        thread = threading.Thread(target=lambda: next(batches))
+        thread.start()
+        time.sleep(0.05)
+        assert consumer.fetches == 2
+        release.set()
+        thread.join()
+        assert sum(len(batch) for batch in batches) == 8
+
+    @pytest.mark.parametrize("commit_on_revoke", [False, True])
+    def test_read_parallel_rebalance(self, commit_on_revoke):
+        """
+        Test that revoked partitions are dropped from the stream and their offsets are
+        never committed by this reader after the rebalance.
+        """
+        release = threading.Event()
+
+        def blocked(value):
+            if value.startswith("b"):
+                release.wait()
+            return value.upper()
+
+        # The batch of partition 1 is still processing when the partition is revoked
+        consumer = FakeConsumer("news", {0: ["a0", "a1", "a2", "a3"], 1: ["b0", "b1", "b2", "b3"]})
+        consumer.revocations = {2: [1]}
+        reader = TopicReader("localhost:9092", "news", auto_commit=False, consumer=consumer)
+        threading.Timer(0.1, release.set).start()
+        batches = list(reader.read_parallel(
+            blocked, workers=2, executor="thread", max_records=3, max_in_flight=4, commit_on_revoke=commit_on_revoke,
+            stop_when_idle=True,
+        ))
+        assert batches == [["A0", "A1", "A2"], ["A3"]]
+        assert reader.offsets_ == {TopicPartition("news", 0): 4}
+        if commit_on_revoke:
+            assert consumer.commits == []
+        reader.commit()
+        assert consumer.commits[-1] == {TopicPartition("news", 0): OffsetAndMetadata(4, None)}
+
+    def test_read_parallel_revoke_yielded(self):
+        """
+        Test that the offsets of yielded batches are committed when their partition is
+        revoked with commit_on_revoke.
+        """
+        consumer = FakeConsumer("news", {0: ["a0", "a1"], 1: ["b0", "b1", "b2"]})
+        consumer.revocations = {2: [1]}
+        reader = TopicReader("localhost:9092", "news", auto_commit=False, consumer=consumer)
+        batches = reader.read_parallel(
+            upper, workers=2, executor="thread", max_records=2, max_in_flight=1, commit_on_revoke=True, stop_when_idle=True
+        )
+        assert next(batches) == ["A0", "A1"]
+        assert next(batches) == ["B0", "B1"]
+        assert list(batches) == []
+        assert consumer.commits == [{TopicPartition("news", 1): OffsetAndMetadata(2, None)}]
+        assert TopicPartition("news", 1) not in reader.offsets_
+
+    @pytest.mark.parametrize("kwargs", [{"workers": 0}, {"executor": "fiber"}, {"max_records": 0}])
+    def test_read_parallel_invalid(self, kwargs):
+        """
+        Test that invalid parallel options are rejected.
+        """
+        reader = TopicReader("localhost:9092", "news", consumer=FakeConsumer("news", {}))
+        with pytest.raises(ValueError):
+            next(reader.read_parallel(upper, **kwargs))
+
+class TestAsyncTopicReader():
+    """
+    Tests for the AsyncTopicReader class.
+    """
+
+    @pytest.mark.parametrize(
+        "max_records, expected",
+        [
+            (2, [["a0", "a1"], ["a2", "b0"], ["b1"]]),
+            (10, [["a0", "a1", "a2", "b0", "b1"]]),
+        ]
+    )
+    def test_read_batches(self, max_records, expected):
+        """
+        Test that messages are read in batches and committed like the TopicReader.
+        """
+        consumer = FakeConsumer("news", {0: ["a0", "a1", "a2"], 1: ["b0", "b1"]})
+        reader = AsyncTopicReader("localhost:9092", "news", auto_commit=False, consumer=consumer)
+
+        async def read_all():
+            batches = [batch async for batch in reader.read_batches(max_records=max_records, stop_when_idle=True)]
+            await reader.commit()
+            return batches
+
+        try:
+            assert asyncio.run(read_all()) == expected
+        finally:
+            reader.close()
+        assert consumer.commits == [{
+            TopicPartition("news", 0): OffsetAndMetadata(3, None),
+            TopicPartition("news", 1): OffsetAndMetadata(2, None),
+        }]
+
+    def test_read(self):
+        """
+        Test that messages are read into a stream of values.
+        """
+        consumer = FakeConsumer("news", {0: ["a0"], 1: ["b0", "b1"]})
+        reader = AsyncTopicReader("localhost:9092", "news", auto_commit=False, consumer=consumer)
+
+        async def read_all():
+            return [value async for value in reader.read(max_records=1, stop_when_idle=True)]
+
+        try:
+            assert asyncio.run(read_all()) == ["a0", "b0", "b1"]
+        finally:
+            reader.close()
+        assert reader.offsets_ == {TopicPartition("news", 0): 1, TopicPartition("news", 1): 2}
+
+    def test_invalid_max_records(self):
+        """
+        Test that batches must hold at least one record.
+        """
+        reader = AsyncTopicReader("localhost:9092", "news", consumer=FakeConsumer("news", {}))
+        try:
+            with pytest.raises(ValueError):
+                asyncio.run(reader.read_batches(max_records=0).__anext__())
+        finally:
+            reader.close()
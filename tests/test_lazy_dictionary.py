@@ -0,0 +1,66 @@
+from src.storage.vocab import LazyDictionary, write_vocab
+from src.analyzer.vocab import VocabAnalyzer
+
+import os
+import pytest
+from gensim.corpora import Dictionary
+
+DOCUMENTS = [
+    ["the", "quick", "brown", "fox", "jumps", "over", "the"],
+    ["lazy", "dog", "über", "fox"],
+    ["", "dog"],
+]
+
+class TestLazyDictionary():
+    """
+    Tests for the LazyDictionary class.
+    """
+
+    @pytest.mark.parametrize(
+        "documents",
+        [[], DOCUMENTS]
+    )
+    def test_lazy_dictionary(self, tmpdir, documents):
+        """
+        Test that the lazy view matches the dictionary it was written from.
+        """
+        dictionary = Dictionary(documents)
+        path = os.path.join(tmpdir, "vocab")
+        assert write_vocab(path, dictionary)
+        lazy = LazyDictionary(path)
+
+        assert len(lazy) == len(dictionary)
+        assert dict(lazy.token2id) == dictionary.token2id
+        assert dict(lazy.dfs) == dictionary.dfs
+        assert dict(lazy.cfs) == dictionary.cfs
+        for token, id in dictionary.token2id.items():
+            assert lazy.token2id[token] == id
+            assert lazy[id] == token
+        assert "missing" not in lazy.token2id
+        assert (lazy.num_docs, lazy.num_pos, lazy.num_nnz) == (dictionary.num_docs, dictionary.num_pos, dictionary.num_nnz)
+        assert lazy.doc2bow(["fox", "fox", "missing", "dog"]) == dictionary.doc2bow(["fox", "fox", "missing", "dog"])
+
+        materialized = lazy.materialize()
+        assert materialized.token2id == dictionary.token2id
+        assert materialized.dfs == dictionary.dfs
+        assert materialized.cfs == dictionary.cfs
+        assert VocabAnalyzer(lazy).corpus_statistics() == VocabAnalyzer(dictionary).corpus_statistics()
+
+    def test_read_only(self, tmpdir):
+        """
+        Test that the lazy view cannot be updated.
+        """
+        path = os.path.join(tmpdir, "vocab")
+        write_vocab(path, Dictionary(DOCUMENTS))
+        with pytest.raises(ValueError):
+            LazyDictionary(path).doc2bow(["new"], allow_update=True)
+
+    def test_sparse_ids(self, tmpdir):
+        """
+        Test that dictionaries with gaps in their ids are not written.
+        """
+        dictionary = Dictionary(DOCUMENTS)
+        del dictionary.token2id["the"]
+        assert not write_vocab(os.path.join(tmpdir, "vocab"), dictionary)
+        with pytest.raises(ValueError):
+            LazyDictionary(os.path.join(tmpdir, "vocab"))
@@ -0,0 +1,122 @@
+from src.dedup.minhash import MinHashLSH, optimal_bands, shingles
+
+import os
+import random
+import pytest
+
+def random_document(rng, length=100):
+    return ["w{}".format(rng.randrange(5000)) for _ in range(length)]
+
+def jaccard(a, b, size=3):
+    a, b = shingles(a, size), shingles(b, size)
+    return len(a & b) / len(a | b)
+
+class TestMinHash():
+    """
+    Tests for the MinHash LSH near-duplicate index.
+    """
+
+    @pytest.mark.parametrize(
+        "document, size, expected",
+        [
+            ([], 3, set()),
+            (["a", "b"], 3, {"a b"}),
+            (["a", "b", "c", "d"], 3, {"a b c", "b c d"}),
+            (["a", "b", "a", "b"], 1, {"a", "b"}),
+        ]
+    )
+    def test_shingles(self, document, size, expected):
+        """
+        Test that documents are split into word n-gram shingles.
+        """
+        assert shingles(document, size) == expected
+
+    @pytest.mark.parametrize("threshold, num_perm", [(0.5, 128), (0.8, 128), (0.9, 64), (1.0, 16)])
+    def test_optimal_bands(self, threshold, num_perm):
+        """
+        Test that the band split uses at most num_perm minhashes.
+        """
+        bands, rows = optimal_bands(threshold, num_perm)
+        assert bands * rows <= num_perm
+
+    @pytest.mark.parametrize("threshold", [0, 1.5])
+    def test_invalid_threshold(self, threshold):
+        """
+        Test that the threshold must be a valid Jaccard similarity.
+        """
+        with pytest.raises(ValueError):
+            MinHashLSH(threshold=threshold)
+
+    def test_signature(self):
+        """
+        Test that signatures estimate the Jaccard similarity of the shingles.
+        """
+        rng = random.Random(42)
+        index = MinHashLSH(num_perm=256)
+        a = random_document(rng)
+        b = a[:70] + random_document(rng, 30)
+        estimate = (index.signature(a) == index.signature(b)).mean()
+        assert abs(estimate - jaccard(a, b)) < 0.1
+        assert (index.signature(a) == index.signature(list(a))).all()
+        assert index.signature([]) is None
+
+    def test_query(self):
+        """
+        Test that near-duplicates are found and distinct documents are not.
+        """
+        rng = random.Random(42)
+        index = MinHashLSH(threshold=0.7)
+        originals = [random_document(rng) for _ in range(50)]
+        for doc in originals:
+            assert index.query(index.signature(doc)) is None
+            index.insert(index.signature(doc))
+
+        found = 0
+        for i, doc in enumerate(originals):
+            copy = list(doc)
+            copy[-1] = "changed"
+            if index.query(index.signature(copy)) == i:
+                found += 1
+        assert found >= 45
+        for _ in range(50):
+            assert index.query(index.signature(random_document(rng))) is None
+
+        stats = index.stats()
+        assert stats["queries"] == 150
+        assert stats["duplicates"] == found
+        assert stats["indexed"] == 50
+        assert stats["hit_rate"] == found / 150
+
+    def test_save_load(self, tmpdir):
+        """
+        Test that the index is saved incrementally and unsaved signatures are dropped.
+        """
+        rng = random.Random(42)
+        documents = [random_document(rng) for _ in range(30)]
+        index = MinHashLSH(threshold=0.8, num_perm=64)
+        for doc in documents[:10]:
+            index.insert(index.signature(doc))
+        index.save(tmpdir)
+        for doc in documents[10:20]:
+            index.insert(index.signature(doc))
+        index.save(tmpdir, 15)
+
+        loaded = MinHashLSH.load(tmpdir, 15)
+        assert (loaded.num_perm, loaded.threshold, loaded.num_rows) == (64, 0.8, 15)
+        assert loaded.query(loaded.signature(documents[14])) == 14
+        assert loaded.query(loaded.signature(documents[15])) is None
+
+        # Signatures past the loaded rows are overwritten by the next save
+        loaded.insert(loaded.signature(documents[25]))
+        loaded.save(tmpdir)
+        reloaded = MinHashLSH.load(tmpdir, 16, threshold=0.9)
+        assert reloaded.threshold == 0.9
+        assert reloaded.query(reloaded.signature(documents[25])) == 15
+        assert os.path.getsize(os.path.join(tmpdir, "signatures.bin")) == 16 * 64 * 4
+
+    def test_load_missing(self, tmpdir):
+        """
+        Test that loading a missing index raises an error.
+        """
+        with pytest.raises(ValueError):
+            MinHashLSH.load(tmpdir, 0)
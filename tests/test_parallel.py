@@ -0,0 +1,80 @@
+from src.parallel import chunked, ordered_map
+from src.dictionary.parallel import parallel_doc2bow, serial_doc2bow
+
+import pytest
+from gensim.corpora import Dictionary
+
+DOCUMENTS = [
+    ["the", "cat", "sat", "on", "the", "mat"],
+    [],
+    ["the", "dog", "ate", "the", "cat"],
+    ["a", "bird", "sat", "on", "the", "dog", "dog"],
+    ["zebra", "aardvark", "cat"],
+    ["mat", "mat", "mat"],
+    ["new", "words", "in", "the", "last", "document"],
+]
+
+def square(x):
+    return x * x
+
+class TestParallel():
+    """
+    Tests for parallel helpers and parallel dictionary updates.
+    """
+
+    @pytest.mark.parametrize(
+        "items, chunksize, expected",
+        [
+            ([], 2, []),
+            ([1, 2, 3], 1, [[1], [2], [3]]),
+            ([1, 2, 3], 2, [[1, 2], [3]]),
+            ([1, 2, 3], 5, [[1, 2, 3]]),
+        ]
+    )
+    def test_chunked(self, items, chunksize, expected):
+        """
+        Test that items are grouped into chunks in order.
+        """
+        assert list(chunked(iter(items), chunksize)) == expected
+
+    @pytest.mark.parametrize("max_in_flight", [None, 1, 3])
+    def test_ordered_map(self, max_in_flight):
+        """
+        Test that results are returned in input order.
+        """
+        results = list(ordered_map(square, range(20), 2, max_in_flight=max_in_flight))
+        assert results == [x * x for x in range(20)]
+
+    def test_ordered_map_invalid(self):
+        """
+        Test that the in-flight bound must be positive.
+        """
+        with pytest.raises(ValueError):
+            list(ordered_map(square, range(2), 2, max_in_flight=0))
+
+    @pytest.mark.parametrize("workers, chunksize", [(1, 2), (2, 1), (2, 2), (3, 100)])
+    @pytest.mark.parametrize("existing", [[], [["cat", "hat"]]])
+    def test_parallel_doc2bow(self, workers, chunksize, existing):
+        """
+        Test that the parallel path produces the same dictionary and BoW documents as
+        the serial gensim path.
+        """
+        expected = Dictionary(existing)
+        bows = [expected.doc2bow(doc, allow_update=True) for doc in DOCUMENTS]
+
+        dictionary = Dictionary(existing)
+        results = list(parallel_doc2bow(dictionary, iter(DOCUMENTS), workers=workers, chunksize=chunksize))
+        assert [bow for bow, _ in results] == bows
+        assert dictionary.token2id == expected.token2id
+        assert dictionary.dfs == expected.dfs
+        assert dictionary.cfs == expected.cfs
+        assert dictionary.num_docs == expected.num_docs
+        assert dictionary.num_pos == expected.num_pos
+        assert dictionary.num_nnz == expected.num_nnz
+
+        # The missing tokens are the same as reported by the serial path
+        serial = list(serial_doc2bow(Dictionary(existing), DOCUMENTS))
+        assert [missing for _, missing in results] == [missing for _, missing in serial]
+        missing = [token for _, m in results for token, _ in m]
+        assert len(missing) == len(set(missing))
+        assert set(missing) == set(expected.token2id) - set(Dictionary(existing).token2id)
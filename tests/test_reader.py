@@ -1,5 +1,6 @@
-from src.reader.reader import Reader
+from src.reader.reader import AsyncReader, Reader
 
+import asyncio
 import pytest
 
 class ListReader():
@@ -47,4 +48,56 @@ class TestReader():
             if elem is None:
                 break
             data += elem
-        assert data == expected
\ No newline at end of file
+        assert data == expected
+
+class AsyncListReader():
+    def __init__(self, data):
+        self.data = data
+
+    async def read(self):
+        if len(self.data) == 0:
+            return None
+        return self.data.pop(0)
+
+class TestAsyncReader():
+    """
+    Tests for the AsyncReader class.
+    """
+
+    @pytest.mark.parametrize(
+        "reader",
+        [
+            AsyncReader(None),
+            AsyncReader(AsyncListReader(None)),
+            AsyncReader(ListReader(["Hello"])),
+        ],
+    )
+    def test_read_invalid(self, reader):
+        """
+        Test that the AsyncReader catches underlying read() errors.
+        """
+        with pytest.raises(ValueError):
+            asyncio.run(reader.read())
+
+    @pytest.mark.parametrize(
+        "data, expected",
+        [
+            (["Hello"], "Hello"),
+            (["Hello", "World"], "HelloWorld"),
+        ],
+    )
+    def test_read(self, data, expected):
+        """
+        Test that the AsyncReader correctly reads data from the source.
+        """
+        reader = AsyncReader(AsyncListReader(data))
+
+        async def read_all():
+            data = ""
+            while True:
+                elem = await reader.read()
+                if elem is None:
+                    return data
+                data += elem
+
+        assert asyncio.run(read_all()) == expected
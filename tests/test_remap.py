@@ -0,0 +1,64 @@
+from src.dictionary.remap import DROPPED, compose_remaps, prune_dictionary, read_remap, remap_document, remap_matrix
+from src.dictionary.remap import write_remap
+
+import os
+import numpy as np
+import pytest
+from gensim.corpora import Dictionary
+from scipy.sparse import csr_matrix
+
+DOCUMENTS = [
+    ["the", "cat", "sat", "on", "the", "mat"],
+    ["the", "dog", "sat"],
+    ["a", "cat", "and", "a", "dog"],
+    ["the", "end"],
+]
+
+class TestRemap():
+    """
+    Tests for dictionary pruning remap tables.
+    """
+
+    @pytest.mark.parametrize(
+        "no_below, no_above, keep_n",
+        [(1, 1.0, 100), (2, 1.0, 100), (1, 0.5, 100), (2, 0.5, 2), (5, 1.0, 100)]
+    )
+    def test_prune_dictionary(self, no_below, no_above, keep_n):
+        """
+        Test that remapping documents converted before pruning matches converting them
+        with the pruned dictionary.
+        """
+        dictionary = Dictionary(DOCUMENTS)
+        bows = [dictionary.doc2bow(doc) for doc in DOCUMENTS]
+        size = len(dictionary)
+        remap = prune_dictionary(dictionary, no_below=no_below, no_above=no_above, keep_n=keep_n)
+        assert len(remap) == size
+        assert (remap != DROPPED).sum() == len(dictionary)
+        assert [remap_document(bow, remap) for bow in bows] == [dictionary.doc2bow(doc) for doc in DOCUMENTS]
+
+    def test_compose_remaps(self):
+        """
+        Test that composed remap tables apply both remaps.
+        """
+        first = np.array([0, DROPPED, 1, 2, 3])
+        second = np.array([DROPPED, 0, 1, 2])
+        assert compose_remaps(first, second).tolist() == [DROPPED, DROPPED, 0, 1, 2]
+        assert remap_document([(0, 1.0), (1, 2.0), (4, 3.0)], compose_remaps(first, second)) == [(2, 3.0)]
+
+    def test_remap_matrix(self):
+        """
+        Test that remapping matrix columns matches remapping the rows as documents.
+        """
+        remap = np.array([2, DROPPED, 0, 1])
+        matrix = csr_matrix(np.array([[1, 2, 0, 3], [0, 0, 4, 0], [0, 5, 0, 0]], dtype=np.float32))
+        remapped = remap_matrix(matrix, remap, 4)
+        assert remapped.shape == (3, 4)
+        assert remapped.toarray().tolist() == [[0, 3, 1, 0], [4, 0, 0, 0], [0, 0, 0, 0]]
+
+    def test_write_remap(self, tmpdir):
+        """
+        Test that remap tables round trip through disk.
+        """
+        path = os.path.join(tmpdir, "1.bin")
+        write_remap(path, [3, DROPPED, 0])
+        assert read_remap(path).tolist() == [3, DROPPED, 0]
@@ -0,0 +1,72 @@
+from src.analyzer.search import halving_budgets, successive_halving
+
+import math
+import pytest
+
+class TestSuccessiveHalving():
+    """
+    Tests for the successive halving search.
+    """
+
+    @pytest.mark.parametrize(
+        "num_candidates, num_docs, eta, expected",
+        [
+            (1, 100, 3, [100]),
+            (3, 90, 3, [30, 90]),
+            (9, 90, 3, [10, 30, 90]),
+            (10, 90, 3, [4, 10, 30, 90]),
+            (4, 100, 2, [25, 50, 100]),
+            (9, 5, 3, [1, 2, 5]),
+            (9, 2, 3, [1, 1, 2]),
+        ]
+    )
+    def test_budgets(self, num_candidates, num_docs, eta, expected):
+        """
+        Test the number of documents trained on at each rung.
+        """
+        assert halving_budgets(num_candidates, num_docs, eta) == expected
+
+    def test_search(self):
+        """
+        Test that only the best candidates keep training, continuing from their state.
+        """
+        calls = []
+
+        def train(candidate, state, start, end):
+            calls.append((candidate, start, end))
+            return (state or 0) + end - start
+
+        def score(candidate, state, end):
+            assert state == end
+            return -abs(candidate - 7.25) if candidate != 8 else math.nan
+
+        best, history = successive_halving(list(range(1, 10)), 90, train, score)
+        assert best == {7: (90, -0.25)}
+        assert [rung["documents"] for rung in history] == [10, 30, 90]
+        assert list(history[1]["scores"]) == [6, 7, 9]
+        assert calls[:9] == [(c, 0, 10) for c in range(1, 10)]
+        assert calls[9:] == [(6, 10, 30), (7, 10, 30), (9, 10, 30), (7, 30, 90)]
+
+    def test_search_small_corpus(self):
+        """
+        Test that candidates are not trained on empty samples when the corpus is
+        smaller than the number of rungs.
+        """
+        calls = []
+
+        def train(candidate, state, start, end):
+            calls.append((candidate, start, end))
+            return end
+
+        best, history = successive_halving([1, 2, 3, 4], 1, train, lambda c, state, end: c, eta=2)
+        assert best == {4: (1, 4)}
+        assert calls == [(1, 0, 1), (2, 0, 1), (3, 0, 1), (4, 0, 1)]
+        assert len(history) == 3
+
+    def test_invalid(self):
+        """
+        Test that invalid options are rejected.
+        """
+        assert successive_halving([], 10, None, None) == ({}, [])
+        with pytest.raises(ValueError):
+            successive_halving([1, 2], 10, None, None, eta=1)
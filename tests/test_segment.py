@@ -0,0 +1,94 @@
+from src.storage.segment import SegmentedCorpus, find_merge, merge_segments, remove_segment, segment_name, size_tier
+from src.storage.segment import write_segment
+
+import os
+import pytest
+
+class TestSegment():
+    """
+    Tests for the segment storage functions.
+    """
+
+    @pytest.mark.parametrize(
+        "num_docs, merge_factor, expected",
+        [
+            (0, 10, 0),
+            (9, 10, 0),
+            (10, 10, 1),
+            (999, 10, 2),
+            (1000, 10, 3),
+            (4, 2, 2),
+        ]
+    )
+    def test_size_tier(self, num_docs, merge_factor, expected):
+        """
+        Test that segments are assigned to the correct size tier.
+        """
+        assert size_tier(num_docs, merge_factor) == expected
+
+    @pytest.mark.parametrize(
+        "sizes, merge_factor, expected",
+        [
+            ([], 2, None),
+            ([1], 2, None),
+            ([1, 1], 2, (0, 2)),
+            ([4, 2, 1], 2, None),
+            ([4, 2, 1, 1], 2, (2, 4)),
+            ([5, 1, 1, 1], 3, (1, 4)),
+            ([1, 1, 12, 1, 1], 3, None),
+            ([1, 1, 1, 1], 3, (0, 3)),
+        ]
+    )
+    def test_find_merge(self, sizes, merge_factor, expected):
+        """
+        Test that the merge policy only merges adjacent segments in the same tier.
+        """
+        segments = [{"name": str(i), "num_docs": n} for i, n in enumerate(sizes)]
+        assert find_merge(segments, merge_factor) == expected
+
+    def test_write_and_merge(self, tmpdir):
+        """
+        Test that segments can be written, merged and streamed in order.
+        """
+        assert write_segment(tmpdir, "segments/empty.mm", []) is None
+        assert not os.path.exists(os.path.join(tmpdir, "segments", "empty.mm"))
+
+        first = write_segment(tmpdir, "segments/a.mm", [[(0, 1.0)], [(1, 2.0)]])
+        second = write_segment(tmpdir, "segments/b.mm", [[(0, 3.0), (2, 1.0)]])
+        assert first == {"name": "segments/a.mm", "num_docs": 2}
+
+        corpus = SegmentedCorpus(tmpdir, [first, second])
+        assert len(corpus) == 3
+        assert list(corpus) == [[(0, 1.0)], [(1, 2.0)], [(0, 3.0), (2, 1.0)]]
+
+        merged = merge_segments(tmpdir, "segments/c.mm", [first, second])
+        assert merged["num_docs"] == 3
+        assert list(SegmentedCorpus(tmpdir, [merged])) == list(corpus)
+
+    @pytest.mark.parametrize(
+        "filename, expected",
+        [
+            ("a.mm", "segments/a.mm"),
+            ("a.mm.index", "segments/a.mm"),
+            ("a.csr", "segments/a.csr"),
+            ("a.csr.ids", "segments/a.csr"),
+            ("a.csr.ids.tmp", None),
+            ("a.mm.tmp", None),
+            ("notes.txt", None),
+        ]
+    )
+    def test_segment_name(self, filename, expected):
+        """
+        Test that only the files of a segment are mapped to its name.
+        """
+        assert segment_name(filename) == expected
+
+    def test_remove_segment(self, tmpdir):
+        """
+        Test that removing a segment also removes its temporary files.
+        """
+        write_segment(tmpdir, "segments/a.csr", [[(0, 1.0)]], ids=["x"])
+        open(os.path.join(tmpdir, "segments", "a.csr.ids.tmp"), "w").close()
+        write_segment(tmpdir, "segments/b.mm", [[(0, 1.0)]])
+        remove_segment(tmpdir, "segments/a.csr")
+        assert sorted(os.listdir(os.path.join(tmpdir, "segments"))) == ["b.mm", "b.mm.index"]
@@ -0,0 +1,101 @@
+from src.dictionary.sketch import CountMinSketch, SketchDictionary, SpaceSaving
+
+import os
+import random
+import pytest
+from collections import Counter
+from gensim.corpora import HashDictionary
+
+def zipf_stream(n, vocab_size, seed=42):
+    rng = random.Random(seed)
+    vocab = ["w{}".format(i) for i in range(vocab_size)]
+    return rng.choices(vocab, weights=[1 / (i + 1) for i in range(vocab_size)], k=n)
+
+class TestSketch():
+    """
+    Tests for the bounded memory vocabulary sketches.
+    """
+
+    def test_count_min_sketch(self):
+        """
+        Test that count-min estimates are within the error bounds.
+        """
+        stream = zipf_stream(20000, 2000)
+        counts = Counter(stream)
+        sketch = CountMinSketch(width=500, depth=5)
+        keys = list(counts)
+        hashes = [SketchDictionary._token_hash(key) for key in keys]
+        sketch.update(hashes, [counts[key] for key in keys])
+        assert sketch.total == len(stream)
+
+        estimates = sketch.estimate(hashes)
+        errors = [estimate - counts[key] for key, estimate in zip(keys, estimates)]
+        assert min(errors) >= 0
+        within = sum(1 for error in errors if error <= sketch.epsilon * sketch.total)
+        assert within / len(keys) >= 1 - sketch.delta
+        assert sketch.estimate([SketchDictionary._token_hash("unseen")])[0] <= sketch.epsilon * sketch.total
+        assert abs(sketch.cardinality() - len(keys)) / len(keys) < 0.1
+
+    def test_space_saving(self):
+        """
+        Test that the heavy hitters include every frequent key with bounded error.
+        """
+        stream = zipf_stream(20000, 2000)
+        counts = Counter(stream)
+        summary = SpaceSaving(capacity=50)
+        for key in stream:
+            summary.update(key)
+        assert len(summary.counts) == 50
+
+        for key, count in counts.items():
+            if count > summary.max_error:
+                assert key in summary.counts
+        for key, count in summary.most_common():
+            assert counts[key] <= count <= counts[key] + summary.max_error
+            assert count - summary.errors[key] <= counts[key]
+        assert [key for key, _ in summary.most_common(3)] == [key for key, _ in counts.most_common(3)]
+
+    def test_sketch_dictionary(self, tmpdir):
+        """
+        Test that the sketch dictionary hashes ids like HashDictionary and tracks exact
+        document statistics.
+        """
+        documents = [["the", "cat", "sat", "on", "the", "mat"], ["the", "dog"], [], ["a", "cat"]]
+        sketch = SketchDictionary(documents, memory=2**16)
+        expected = HashDictionary(documents)
+        assert [sketch.doc2bow(doc) for doc in documents] == [expected.doc2bow(doc) for doc in documents]
+        assert len(sketch) == len(expected)
+        assert (sketch.num_docs, sketch.num_pos, sketch.num_nnz) == (4, 10, 9)
+        assert sketch.cf("the") == 3
+        assert sketch.df("the") == 2
+        assert sketch.df("unseen") == 0
+        assert sketch.most_common(2) == [("the", 3), ("cat", 2)]
+        assert sketch.num_unique() == 7
+
+        path = os.path.join(tmpdir, "sketch")
+        sketch.save(path)
+        loaded = SketchDictionary.load(path)
+        assert loaded.cf("cat") == 2
+        assert loaded.most_common(1) == [("the", 3)]
+        loaded.doc2bow(["the"], allow_update=True)
+        assert loaded.cf("the") == 4
+
+    @pytest.mark.parametrize("memory", [2**16, 2**20])
+    def test_memory_budget(self, memory):
+        """
+        Test that the sketches fit the memory budget and do not grow with the stream.
+        """
+        sketch = SketchDictionary(memory=memory)
+        size = sketch.cf_sketch.counts.nbytes + sketch.df_sketch.counts.nbytes
+        for i in range(200):
+            sketch.doc2bow(["token{}".format(i * 100 + j) for j in range(100)], allow_update=True)
+        assert sketch.cf_sketch.counts.nbytes + sketch.df_sketch.counts.nbytes == size
+        assert len(sketch.heavy_hitters.counts) <= sketch.heavy_hitters.capacity
+        assert size + sketch.heavy_hitters.capacity * 256 <= memory
+
+    def test_invalid_memory(self):
+        """
+        Test that a memory budget too small for the sketches is rejected.
+        """
+        with pytest.raises(ValueError):
+            SketchDictionary(memory=100)
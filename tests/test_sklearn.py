@@ -0,0 +1,117 @@
+from src.analyzer.engines.sklearn import SklearnEngine, MiniBatchNMF, squared_error
+
+import random
+import pytest
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.model_selection import HalvingGridSearchCV
+
+def random_texts(num_docs=90, doc_length=20, vocab_size=100, seed=0):
+    rng = random.Random(seed)
+    vocab = ["token{}".format(i) for i in range(vocab_size)]
+    return [" ".join(rng.choices(vocab, k=doc_length)) for _ in range(num_docs)]
+
+class TestSklearnEngine():
+    """
+    Tests for the SklearnEngine class.
+    """
+
+    def test_halving_lda(self):
+        """
+        Test searching the LDA topic range with successive halving.
+        """
+        vectorizer = CountVectorizer()
+        corpus = vectorizer.fit_transform(random_texts())
+        engine = SklearnEngine(vectorizer=vectorizer, min_topics=2, max_topics=10, search="halving", max_iter=2,
+                               random_state=1)
+        engine.fit(corpus)
+        assert isinstance(engine.grid_, HalvingGridSearchCV)
+        assert engine.model_.n_components == engine.grid_.best_params_["n_components"]
+        assert engine.model_.components_.shape == (engine.model_.n_components, corpus.shape[1])
+
+    def test_halving_nmf(self):
+        """
+        Test that the NMF halving search keeps the candidate with the lowest
+        reconstruction error at each rung.
+        """
+        vectorizer = CountVectorizer()
+        corpus = vectorizer.fit_transform(random_texts())
+        engine = SklearnEngine(engine="nmf", vectorizer=vectorizer, min_topics=2, max_topics=10, search="halving",
+                               max_iter=50, random_state=1)
+        engine.fit(corpus)
+        history = engine.search_
+        assert [rung["documents"] for rung in history] == [10, 30, 90]
+        for rung, survivors in zip(history, history[1:]):
+            ranked = sorted(rung["scores"], key=rung["scores"].get, reverse=True)
+            assert sorted(survivors["scores"]) == sorted(ranked[:len(survivors["scores"])])
+        assert history[-1]["scores"] == {engine.model_.n_components: -engine.model_.reconstruction_err_}
+
+    @pytest.mark.parametrize(
+        "engine",
+        [
+            "lda",
+            pytest.param("nmf", marks=pytest.mark.skipif(MiniBatchNMF is None, reason="requires MiniBatchNMF")),
+        ]
+    )
+    def test_online_update(self, engine):
+        """
+        Test that online updates advance every candidate model with partial_fit() and
+        score each batch before training on it.
+        """
+        vectorizer = CountVectorizer()
+        texts = random_texts(num_docs=150)
+        vectorizer.fit(texts)
+        corpus = vectorizer.transform(texts[:90])
+        options = {"max_iter": 2} if engine == "lda" else {"max_iter": 20, "batch_size": 30}
+        sklearn_engine = SklearnEngine(engine=engine, vectorizer=vectorizer, min_topics=2, max_topics=4, online=True,
+                                random_state=1, **options)
+        sklearn_engine.fit(corpus)
+        assert list(sklearn_engine.models_) == [2, 3, 4]
+        totals = {}
+        for k, model in sklearn_engine.models_.items():
+            if engine == "lda":
+                totals[k] = [model.score(corpus), corpus.sum()]
+            else:
+                totals[k] = [-squared_error(model, corpus), corpus.shape[0]]
+            assert sklearn_engine.scores_[k] == pytest.approx(totals[k][0] / totals[k][1])
+
+        for start in [90, 120]:
+            batch = vectorizer.transform(texts[start:start + 30])
+            models = dict(sklearn_engine.models_)
+            components = {k: model.components_.copy() for k, model in models.items()}
+            for k, model in models.items():
+                if engine == "lda":
+                    totals[k][0] += model.score(batch)
+                    totals[k][1] += batch.sum()
+                else:
+                    totals[k][0] -= squared_error(model, batch)
+                    totals[k][1] += batch.shape[0]
+            sklearn_engine.update(batch)
+            for k, model in sklearn_engine.models_.items():
+                assert model is models[k]
+                assert not np.allclose(model.components_, components[k])
+                assert sklearn_engine.scores_[k] == pytest.approx(totals[k][0] / totals[k][1])
+            assert sklearn_engine.model_ is sklearn_engine.models_[max(sklearn_engine.scores_, key=sklearn_engine.scores_.get)]
+        assert len(sklearn_engine.topics()) == sklearn_engine.model_.n_components
+
+    def test_squared_error(self):
+        """
+        Test the NMF reconstruction error against the dense reconstruction.
+        """
+        vectorizer = CountVectorizer()
+        corpus = vectorizer.fit_transform(random_texts())
+        engine = SklearnEngine(engine="nmf", vectorizer=vectorizer, min_topics=3, max_topics=3, max_iter=50,
+                               random_state=1)
+        engine.fit(corpus)
+        reconstruction = engine.model_.transform(corpus) @ engine.model_.components_
+        expected = np.square(corpus.toarray() - reconstruction).sum()
+        assert squared_error(engine.model_, corpus) == pytest.approx(expected)
+        assert squared_error(engine.model_, corpus.toarray()) == pytest.approx(expected)
+
+    @pytest.mark.parametrize("options", [{"search": "random"}, {"search": "halving", "halving_factor": 1}])
+    def test_invalid_options(self, options):
+        """
+        Test that the engine options are validated.
+        """
+        with pytest.raises(ValueError):
+            SklearnEngine(**options)
@@ -0,0 +1,139 @@
+from src.corpus import OnlineTextCorpus
+from src.pipeline.staged import Stage, StagedPipeline, ingest_pipeline
+from src.reader.reader import Reader
+
+import time
+import pytest
+import threading
+
+class ListReader(Reader):
+    def __init__(self, data, delay=0, error=None):
+        self.data = data
+        self.delay = delay
+        self.error = error
+
+    def read(self):
+        for item in self.data:
+            time.sleep(self.delay)
+            yield item
+        if self.error is not None:
+            raise self.error
+
+class RecordingAnalyzer():
+    def __init__(self):
+        self.updates = []
+
+    def update(self, documents):
+        self.updates.append(documents)
+
+def double(x):
+    return 2 * x
+
+def fail_on_three(x):
+    if x == 3:
+        raise RuntimeError("bad item")
+    return x
+
+class TestStagedPipeline():
+    """
+    Tests for the StagedPipeline class.
+    """
+
+    @pytest.mark.parametrize("parse_workers, executor", [(1, "thread"), (3, "thread"), (2, "process")])
+    def test_ingest(self, tmpdir, parse_workers, executor):
+        """
+        Test that documents are parsed, added to the corpus and passed to the analyzer
+        in batches, with failed documents dropped.
+        """
+        html = ["<h1>Doc " + str(i) + "</h1><p>shared text</p>" for i in range(10)] + [42]
+        corpus = OnlineTextCorpus(tmpdir)
+        analyzer = RecordingAnalyzer()
+        pipeline = ingest_pipeline(ListReader(html), corpus, analyzer=analyzer, parse_workers=parse_workers,
+                                   executor=executor, batch_size=4, batch_timeout=None)
+        metrics = pipeline.run()
+
+        assert metrics["read"] == 11
+        assert metrics["stages"]["parse"]["items"] == 11
+        assert metrics["stages"]["parse"]["dropped"] == 1
+        assert metrics["stages"]["corpus"]["items"] == 10
+        assert metrics["stages"]["corpus"]["batches"] == 3
+        assert metrics["stages"]["analyzer"]["items"] == 3
+        assert corpus.dictionary.num_docs == 10
+        assert sorted(len(batch) for batch in analyzer.updates) == [2, 4, 4]
+        assert all(stage["queue_depth"] == 0 for stage in metrics["stages"].values())
+
+    def test_order(self):
+        """
+        Test that single worker stages keep the stream in order.
+        """
+        results = []
+        stages = [Stage("double", double), Stage("collect", results.append)]
+        StagedPipeline(ListReader(list(range(100))), stages).run()
+        assert results == [2 * i for i in range(100)]
+
+    def test_batch_timeout(self):
+        """
+        Test that partial batches are flushed after the batch timeout.
+        """
+        batches = []
+        stages = [Stage("collect", batches.append, batch_size=100, batch_timeout=0.05)]
+        StagedPipeline(ListReader(list(range(6)), delay=0.03), stages).run()
+        assert sum(batches, []) == list(range(6))
+        assert len(batches) > 1
+
+    def test_backpressure(self):
+        """
+        Test that a stalled stage stops the reader once the queues are full.
+        """
+        release = threading.Event()
+
+        def blocked(x):
+            release.wait()
+            return x
+
+        stages = [Stage("first", double, queue_size=2), Stage("blocked", blocked, queue_size=3)]
+        pipeline = StagedPipeline(ListReader(list(range(100))), stages)
+        runner = threading.Thread(target=pipeline.run)
+        runner.start()
+        time.sleep(0.3)
+        metrics = pipeline.metrics()
+        # 1 item in the blocked stage, 3 queued for it, 1 in the first stage waiting to
+        # be queued and 2 queued for the first stage, plus 1 held by the reader.
+        assert metrics["read"] <= 1 + 3 + 1 + 2 + 1
+        assert metrics["stages"]["blocked"]["queue_depth"] == 3
+        release.set()
+        runner.join()
+        assert pipeline.metrics()["stages"]["blocked"]["items"] == 100
+
+    @pytest.mark.parametrize(
+        "reader, stages",
+        [
+            (ListReader(list(range(10))), [Stage("fail", fail_on_three, workers=2), Stage("double", double)]),
+            (ListReader(list(range(10)), error=OSError("disk gone")), [Stage("double", double, queue_size=1)]),
+        ]
+    )
+    def test_error(self, reader, stages):
+        """
+        Test that an error in the reader or a stage stops the pipeline and is raised.
+        """
+        with pytest.raises(ValueError):
+            StagedPipeline(reader, stages).run()
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [{"workers": 0}, {"executor": "fiber"}, {"batch_size": 0}, {"batch_timeout": 0}, {"queue_size": 0}]
+    )
+    def test_invalid_stage(self, kwargs):
+        """
+        Test that invalid stage options are rejected.
+        """
+        with pytest.raises(ValueError):
+            Stage("stage", double, **kwargs)
+
+    @pytest.mark.parametrize("reader, stages", [(None, [Stage("double", double)]), (ListReader([]), [])])
+    def test_invalid_init(self, reader, stages):
+        """
+        Test that a Reader and at least one stage are required.
+        """
+        with pytest.raises(ValueError):
+            StagedPipeline(reader, stages)
@@ -0,0 +1,119 @@
+from src.reader.reader import Reader
+from src.parser.html import HTMLParser
+from src.parser.tokenizer import Tokenizer
+
+import pickle
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+
+class StringReader(Reader):
+    def __init__(self, strings):
+        self.strings = strings
+
+    def read(self):
+        for s in self.strings:
+            yield s
+
+def strip_plural(token):
+    return token[:-1] if token.endswith("s") else token
+
+class TestTokenizer():
+    """
+    Tests for the Tokenizer class.
+    """
+
+    @pytest.mark.parametrize(
+        "options, text, expected",
+        [
+            ({}, "", []),
+            ({}, "The Quick brown fox", ["quick", "brown", "fox"]),
+            ({}, "Don't split well-known, 'quoted' words.", ["don't", "split", "well-known", "quoted", "words"]),
+            ({}, "a bb " + "c" * 16, ["bb"]),
+            ({"lowercase": False}, "The Quick fox", ["The", "Quick", "fox"]),
+            ({"stopwords": None}, "the fox", ["the", "fox"]),
+            ({"stopwords": {"fox"}}, "the fox", ["the"]),
+            ({"min_length": 1, "max_length": None}, "a " + "c" * 16, ["c" * 16]),
+            ({"pattern": r"[a-z]+"}, "fox2dog", ["fox", "dog"]),
+            ({"lemmatize": strip_plural}, "foxes dogs cats", ["foxe", "dog", "cat"]),
+            ({"lemmatize": lambda token: ""}, "foxes dogs", []),
+            ({"lemmatize": lambda token: "the"}, "foxes dogs", []),
+        ]
+    )
+    def test_tokenize(self, options, text, expected):
+        """
+        Test tokenizing, filtering and normalizing text.
+        """
+        tokenizer = Tokenizer(**options)
+        assert tokenizer.tokenize(text) == expected
+        assert tokenizer(text) == expected
+
+    def test_batch(self):
+        """
+        Test tokenizing batches and streams of texts with failed documents.
+        """
+        tokenizer = Tokenizer()
+        texts = ["quick fox", None, "brown dog"]
+        assert tokenizer.tokenize_batch(texts) == [["quick", "fox"], None, ["brown", "dog"]]
+        assert list(tokenizer.stream(iter(texts))) == [["quick", "fox"], ["brown", "dog"]]
+
+    def test_cache(self):
+        """
+        Test that each distinct token is normalized once and that repeated tokens are
+        interned.
+        """
+        calls = []
+
+        def lemmatize(token):
+            calls.append(token)
+            return token.upper()
+
+        tokenizer = Tokenizer(lemmatize=lemmatize, cache_size=2)
+        first, second = tokenizer.tokenize_batch(["fox dog fox", "dog"])
+        assert first == ["FOX", "DOG", "FOX"]
+        assert first[0] is first[2] and first[1] is second[0]
+        assert calls == ["fox", "dog"]
+        info = tokenizer.cache_info()
+        assert (info.hits, info.misses, info.currsize) == (2, 2, 2)
+
+        # The least recently used token is evicted first.
+        tokenizer.tokenize("cat dog")
+        assert calls == ["fox", "dog", "cat"]
+        tokenizer.tokenize("fox")
+        assert calls == ["fox", "dog", "cat", "fox"]
+        tokenizer.clear_cache()
+        assert tokenizer.cache_info().currsize == 0
+
+    def test_pickle(self):
+        """
+        Test that the tokenizer can be sent to worker processes.
+        """
+        tokenizer = Tokenizer(lemmatize=strip_plural)
+        tokenizer.tokenize("dogs")
+        copy = pickle.loads(pickle.dumps(tokenizer))
+        assert copy.tokenize("foxes dogs") == ["foxe", "dog"]
+        assert copy.cache_info().misses == 2
+        with ProcessPoolExecutor(1) as executor:
+            assert list(executor.map(tokenizer.tokenize, ["cats", "the dogs"])) == [["cat"], ["dog"]]
+
+    def test_parser(self):
+        """
+        Test tokenizing the output of an HTMLParser.
+        """
+        parser = HTMLParser(StringReader(["<h1>The Heading</h1><p>Some text</p>", None, "<p>More TEXT</p>"]), fast=True)
+        assert list(Tokenizer().stream(parser.parse())) == [["heading", "text"], ["text"]]
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {"min_length": 0},
+            {"min_length": 3, "max_length": 2},
+            {"cache_size": 0},
+            {"lemmatize": "lemma"},
+        ]
+    )
+    def test_invalid(self, options):
+        """
+        Test that invalid options are rejected.
+        """
+        with pytest.raises(ValueError):
+            Tokenizer(**options)
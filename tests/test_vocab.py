@@ -1,4 +1,5 @@
 from src.analyzer.vocab import VocabAnalyzer
+from src.dictionary.sketch import SketchDictionary
 
 import pytest
 from gensim.corpora import Dictionary
@@ -67,4 +68,29 @@ class TestVocabAnalyzer():
         Test that word_statistics() returns the correct results.
         """
         vocab = VocabAnalyzer(Dictionary(documents))
-        assert vocab.word_statistics(word) == expected
\ No newline at end of file
+        assert vocab.word_statistics(word) == expected
+
+    def test_sketch_statistics(self):
+        """
+        Test that statistics estimated from a sketch are within the error bounds.
+        """
+        documents = [["the", "quick", "brown", "fox"], ["the", "lazy", "dog"], ["the", "fox"]] * 50
+        expected = VocabAnalyzer(Dictionary(documents))
+        vocab = VocabAnalyzer(SketchDictionary(documents, memory=2**16))
+
+        stats = vocab.corpus_statistics()
+        exact = expected.corpus_statistics()
+        for key in ["num_docs", "num_words", "unique_words", "words_per_doc"]:
+            assert stats[key] == exact[key]
+        assert stats["rare_words"] is None
+        bounds = stats["error_bounds"]
+        expected_counts = dict(exact["most_common"])
+        assert set(dict(stats["most_common"])) == set(expected_counts)
+        for token, count in stats["most_common"]:
+            assert expected_counts[token] <= count <= expected_counts[token] + bounds["top_k_error"]
+
+        word = vocab.word_statistics("fox")
+        exact = expected.word_statistics("fox")
+        assert exact["corpus_count"] <= word["corpus_count"] <= exact["corpus_count"] + bounds["cf_error"]
+        assert exact["doc_count"] <= word["doc_count"] <= exact["doc_count"] + bounds["df_error"]
+        assert vocab.word_statistics("unseen") is None
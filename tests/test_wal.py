@@ -0,0 +1,71 @@
+from src.storage.wal import WriteAheadLog
+
+import os
+import pytest
+
+class TestWriteAheadLog():
+    """
+    Tests for the WriteAheadLog class.
+    """
+
+    def test_append_replay(self, tmpdir):
+        """
+        Test that appended records are replayed in order after reopening the log.
+        """
+        wal = WriteAheadLog(tmpdir)
+        assert [wal.append(r) for r in ["a", "b", "c"]] == [1, 2, 3]
+        wal.close()
+
+        wal = WriteAheadLog(tmpdir)
+        assert wal.last_seq == 3
+        assert list(wal.replay()) == [(1, "a"), (2, "b"), (3, "c")]
+        assert list(wal.replay(after=2)) == [(3, "c")]
+        assert wal.append("d") == 4
+
+    def test_truncate(self, tmpdir):
+        """
+        Test that truncate() discards log files covered by a checkpoint.
+        """
+        wal = WriteAheadLog(tmpdir)
+        wal.append("a")
+        wal.append("b")
+        wal.truncate(1)
+        assert list(wal.replay()) == [(1, "a"), (2, "b")]
+
+        wal.append("c")
+        wal.truncate(2)
+        assert list(wal.replay()) == [(3, "c")]
+        assert len(os.listdir(tmpdir)) == 1
+
+        wal.truncate(3)
+        assert list(wal.replay()) == []
+        assert wal.append("d") == 4
+
+    @pytest.mark.parametrize(
+        "torn",
+        [3, 12, -1]
+    )
+    def test_torn_tail(self, tmpdir, torn):
+        """
+        Test that a partially written or corrupt record at the tail is discarded.
+        """
+        wal = WriteAheadLog(tmpdir)
+        wal.append("a")
+        wal.append("b")
+        wal.close()
+
+        path = os.path.join(tmpdir, os.listdir(tmpdir)[0])
+        with open(path, 'r+b') as f:
+            data = f.read()
+            size = len(data)
+            if torn > 0:
+                f.write(b"\x00" * torn)
+            else:
+                f.seek(size - 1)
+                f.write(bytes([data[-1] ^ 0xff]))
+
+        wal = WriteAheadLog(tmpdir)
+        expected = [(1, "a"), (2, "b")] if torn > 0 else [(1, "a")]
+        assert list(wal.replay()) == expected
+        assert wal.append("c") == len(expected) + 1
+        assert list(wal.replay())[-1] == (len(expected) + 1, "c")